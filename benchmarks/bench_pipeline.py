@@ -0,0 +1,498 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import importlib.util
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Offline benchmark suite for the whole pipeline.
+# Every scenario runs against a local stand-in server (synthetic RSS feeds,
+# the recorded Voicy pages in fixtures/voicy/, a webhook sink, generated
+# audio), in its own child process so its peak RSS is its own. Each one
+# reports throughput, p50/p95 latency and peak RSS, and the run is compared
+# against benchmarks/baseline.json; a scenario more than --tolerance slower
+# (or bigger) than its baseline is reported as a regression (exit status 1).
+# Run with: python benchmarks/bench_pipeline.py [--only PREFIX] [--repeat N] [--update-baseline]
+# Baselines are machine-specific: record one with --update-baseline on the machine you compare on.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from bench_rss_stream_parser import build_synthetic_feed
+
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+FIXTURE_DIR = os.path.join(PROJECT_ROOT, 'fixtures', 'voicy')
+FEED_SIZES = (10, 100, 1000, 10000)
+VOICY_CHANNEL_PATH = '/channel/821320'
+DEFAULT_REPEAT = 5
+# Untimed first iterations (imports, connection setup, page cache)
+WARMUP_ITERATIONS = 1
+DEFAULT_TOLERANCE = 0.5
+# Differences below this are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.02
+MIN_REGRESSION_RSS_MB = 5.0
+RESULT_PREFIX = 'BENCH_RESULT:'
+SEED = 20250605
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves GET routes from `routes` ({path: (content type, body)}) and accepts any POST as a webhook."""
+    protocol_version = 'HTTP/1.1'
+    routes = {}
+    posts = 0
+    _lock = threading.Lock()
+
+    def do_GET(self):
+        route = self.routes.get(self.path.split('?', 1)[0])
+        if route is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        content_type, body = route
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', '0')))
+        with StandInHandler._lock:
+            StandInHandler.posts += 1
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def generated_pcm(seconds: int, sample_rate: int = 16000) -> bytes:
+    """16-bit mono 'speech': 4.5 s bursts of a noisy tone separated by 0.7 s pauses (deterministic)."""
+    rng = random.Random(SEED)
+    burst = array('h', (int(6000 * math.sin(2 * math.pi * 220 * i / sample_rate) + rng.randint(-800, 800))
+                        for i in range(int(4.5 * sample_rate)))).tobytes()
+    pause = bytes(int(0.7 * sample_rate) * 2)
+    body = (burst + pause) * (seconds // 5 + 1)
+    return body[:seconds * sample_rate * 2]
+
+def generated_wav(seconds: int, sample_rate: int = 16000) -> bytes:
+    import io
+    import wave
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(generated_pcm(seconds, sample_rate))
+    return buffer.getvalue()
+
+def generated_transcript(chars: int) -> str:
+    """Japanese-looking sentences from a fixed vocabulary (deterministic)."""
+    rng = random.Random(SEED)
+    subjects = ['今日のテーマ', '朝のランニング', '新しい仕事', '読んだ本', '週末の予定', 'リスナーからの質問']
+    predicates = ['について話します', 'がとても楽しかったです', 'を続けるコツを考えました', 'で気づいたことがあります',
+                  'はまだ迷っています', 'に答えてみます']
+    sentences = []
+    length = 0
+    while length < chars:
+        sentence = f"{rng.choice(subjects)}{rng.choice(predicates)}。"
+        sentences.append(sentence)
+        length += len(sentence)
+    return ''.join(sentences)
+
+def _fresh_dir(tmp_dir: str, name: str) -> str:
+    path = os.path.join(tmp_dir, name)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+# --- Scenarios ---------------------------------------------------------------
+# Each takes (server URL, scratch dir, repeat) and returns (latencies in
+# seconds, units handled per iteration, unit name), or a string giving the
+# reason it was skipped.
+
+def bench_check_new_episodes(base_url: str, tmp_dir: str, repeat: int, item_count: int):
+    """First check of a feed: the whole feed is streamed, parsed and recorded as baseline."""
+    import rss_checker
+    StandInHandler.routes['/feed.xml'] = ('application/rss+xml', build_synthetic_feed(item_count))
+    os.environ['STANDFM_RSS_URL'] = f'{base_url}/feed.xml'
+    latencies = []
+    for iteration in range(repeat):
+        run_dir = _fresh_dir(tmp_dir, f'check{iteration}')
+        rss_checker.LEDGER_FILE = os.path.join(run_dir, 'ledger.sqlite3')
+        rss_checker.FEED_CACHE_FILE = os.path.join(run_dir, 'feed_cache.json')
+        rss_checker.LAST_CHECK_FILE = os.path.join(run_dir, 'last_check.json')
+        started = time.perf_counter()
+        episodes = rss_checker.check_new_episodes()
+        latencies.append(time.perf_counter() - started)
+        assert len(episodes) == 1, len(episodes)
+    return latencies, item_count, 'feed items'
+
+def bench_check_new_episodes_incremental(base_url: str, tmp_dir: str, repeat: int, item_count: int):
+    """Later checks: one new episode on top of a known feed; parsing stops at the first known GUID."""
+    import rss_checker
+    os.environ['STANDFM_RSS_URL'] = f'{base_url}/feed.xml'
+    run_dir = _fresh_dir(tmp_dir, 'incremental')
+    rss_checker.LEDGER_FILE = os.path.join(run_dir, 'ledger.sqlite3')
+    rss_checker.FEED_CACHE_FILE = os.path.join(run_dir, 'feed_cache.json')
+    rss_checker.LAST_CHECK_FILE = os.path.join(run_dir, 'last_check.json')
+    StandInHandler.routes['/feed.xml'] = ('application/rss+xml', build_synthetic_feed(item_count))
+    rss_checker.check_new_episodes()
+    latencies = []
+    for iteration in range(repeat):
+        StandInHandler.routes['/feed.xml'] = ('application/rss+xml', build_synthetic_feed(item_count + iteration + 1))
+        started = time.perf_counter()
+        episodes = rss_checker.check_new_episodes()
+        latencies.append(time.perf_counter() - started)
+        assert len(episodes) == 1, len(episodes)
+    return latencies, 1, 'new episodes'
+
+def bench_rss_monitor_main(base_url: str, tmp_dir: str, repeat: int, item_count: int):
+    """One rss_monitor.main() run on a fresh state: fetch + feedparser, Voicy lookup, webhook delivery."""
+    import rss_monitor
+    StandInHandler.routes['/feed.xml'] = ('application/rss+xml', build_synthetic_feed(item_count))
+    with open(os.path.join(FIXTURE_DIR, 'channel_ssr.html'), 'rb') as f:
+        StandInHandler.routes[VOICY_CHANNEL_PATH] = ('text/html; charset=utf-8', f.read())
+    os.environ['MAKE_WEBHOOK_URL'] = f'{base_url}/webhook'
+    rss_monitor.STANDFM_RSS_URL = f'{base_url}/feed.xml'
+    rss_monitor.VOICY_CHANNEL_URL = f'{base_url}{VOICY_CHANNEL_PATH}'
+    rss_monitor.VOICY_SCRAPER_MODE = 'inprocess'
+    # The synthetic titles are not on the recorded page; matching is measured by voicy_index.resolve.
+    rss_monitor.VOICY_RESOLVE_MODE = 'latest'
+    latencies = []
+    for iteration in range(repeat):
+        run_dir = _fresh_dir(tmp_dir, f'monitor{iteration}')
+        rss_monitor.STATE_FILE_PATH = os.path.join(run_dir, 'state.json')
+        rss_monitor.FEED_CACHE_FILE_PATH = os.path.join(run_dir, 'feed_cache.json')
+        rss_monitor.LEDGER_FILE_PATH = os.path.join(run_dir, 'ledger.sqlite3')
+        rss_monitor.OUTBOX_FILE_PATH = os.path.join(run_dir, 'outbox.sqlite3')
+        rss_monitor.VOICY_INDEX_FILE_PATH = os.path.join(run_dir, 'voicy_index.sqlite3')
+        posts_before = StandInHandler.posts
+        started = time.perf_counter()
+        rss_monitor.main()
+        latencies.append(time.perf_counter() - started)
+        assert StandInHandler.posts == posts_before + 1
+    return latencies, item_count, 'feed items'
+
+def bench_voicy_scraper(base_url: str, tmp_dir: str, repeat: int, fixture: str):
+    """HTTP fast path of the Voicy lookup against a recorded channel page."""
+    from voicy_scraper import scrape_latest_voicy_episode, METHOD_HTTP
+    with open(os.path.join(FIXTURE_DIR, fixture), 'rb') as f:
+        StandInHandler.routes[VOICY_CHANNEL_PATH] = ('text/html; charset=utf-8', f.read())
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = scrape_latest_voicy_episode(f'{base_url}{VOICY_CHANNEL_PATH}')
+        latencies.append(time.perf_counter() - started)
+        assert result.url and result.method == METHOD_HTTP, result
+    return latencies, 1, 'lookups'
+
+def bench_voicy_index(base_url: str, tmp_dir: str, repeat: int, cold: bool):
+    """Title/date match of a stand.fm episode against the recorded listing, with a fresh (cold) or filled (warm) index."""
+    from voicy_index import VoicyEpisodeIndex, resolve_voicy_episode
+    with open(os.path.join(FIXTURE_DIR, 'channel_ssr.html'), 'rb') as f:
+        StandInHandler.routes[VOICY_CHANNEL_PATH] = ('text/html; charset=utf-8', f.read())
+    episode = {'guid': 'ep', 'title': '音声配信を続けるコツ', 'published': 'Wed, 04 Jun 2025 21:00:00 +0000'}
+    latencies = []
+    for iteration in range(repeat):
+        index_path = os.path.join(tmp_dir, f'index{iteration if cold else 0}.sqlite3')
+        with VoicyEpisodeIndex(index_path) as index:
+            started = time.perf_counter()
+            result = resolve_voicy_episode(f'{base_url}{VOICY_CHANNEL_PATH}', episode, index)
+            latencies.append(time.perf_counter() - started)
+        assert result.url and result.url.endswith('/6751234'), result
+    return latencies, 1, 'lookups'
+
+def bench_send_to_make_webhook(base_url: str, tmp_dir: str, repeat: int, count: int = 50):
+    """Sequential one-off webhook sends over the shared keep-alive session."""
+    from webhook_sender import send_to_make_webhook
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for i in range(count):
+            assert send_to_make_webhook(f'{base_url}/webhook', f'https://voicy.jp/channel/821320/{i}')
+        latencies.append(time.perf_counter() - started)
+    return latencies, count, 'requests'
+
+def bench_webhook_outbox(base_url: str, tmp_dir: str, repeat: int, count: int = 200):
+    """Enqueue + drain of queued events spread over four webhook URLs."""
+    from webhook_outbox import WebhookOutbox, WebhookDeliverer
+    latencies = []
+    for iteration in range(repeat):
+        run_dir = _fresh_dir(tmp_dir, f'outbox{iteration}')
+        with WebhookOutbox(os.path.join(run_dir, 'outbox.sqlite3')) as outbox:
+            deliverer = WebhookDeliverer(outbox)
+            started = time.perf_counter()
+            for i in range(count):
+                outbox.enqueue(f'{base_url}/webhook/{i % 4}', {'voicy_episode_url': f'https://voicy.jp/channel/821320/{i}'}, ref=str(i))
+            deliverer.drain()
+            latencies.append(time.perf_counter() - started)
+            deliverer.close()
+            assert outbox.pending_count() == 0
+    return latencies, count, 'events'
+
+def bench_audio_download(base_url: str, tmp_dir: str, repeat: int, seconds: int = 600):
+    """Streaming download + SHA-256 check of a generated 10-minute WAV."""
+    from audio_processor import download_audio
+    body = generated_wav(seconds)
+    StandInHandler.routes['/audio.wav'] = ('audio/wav', body)
+    latencies = []
+    for iteration in range(repeat):
+        run_dir = _fresh_dir(tmp_dir, f'download{iteration}')
+        started = time.perf_counter()
+        result = download_audio(f'{base_url}/audio.wav', os.path.join(run_dir, 'audio.wav'))
+        latencies.append(time.perf_counter() - started)
+        assert result['error'] is None and result['bytes'] == len(body), result
+    return latencies, len(body) / 1e6, 'MB'
+
+def bench_audio_segmenter(base_url: str, tmp_dir: str, repeat: int, seconds: int = 600):
+    """Streaming silence segmentation (PcmSegmenter) of generated 16 kHz PCM, fed in network-sized pieces."""
+    if importlib.util.find_spec('numpy') is None:
+        return 'numpy is not installed'
+    from audio_processor import PcmSegmenter, STREAM_READ_SIZE, WHISPER_SEGMENT_SECONDS, WHISPER_MAX_SEGMENT_SECONDS
+    pcm = generated_pcm(seconds)
+    latencies = []
+    for _ in range(repeat):
+        segmenter = PcmSegmenter(WHISPER_SEGMENT_SECONDS * 1000, WHISPER_MAX_SEGMENT_SECONDS * 1000)
+        started = time.perf_counter()
+        segments = []
+        for position in range(0, len(pcm), STREAM_READ_SIZE):
+            segments += segmenter.feed(pcm[position:position + STREAM_READ_SIZE])
+        segments += segmenter.flush()
+        latencies.append(time.perf_counter() - started)
+        assert sum(len(segment) for _, segment in segments) == len(pcm)
+    return latencies, seconds / 60, 'audio minutes'
+
+def bench_audio_split(base_url: str, tmp_dir: str, repeat: int, seconds: int = 3 * 3600):
+    """Silence split of a decoded 3-hour episode, read through memmap windows (peak RSS should not follow the length)."""
+    if importlib.util.find_spec('numpy') is None:
+        return 'numpy is not installed'
+    from audio_processor import split_pcm_at_silence, PCM_SUFFIX
+    path = os.path.join(tmp_dir, 'episode' + PCM_SUFFIX)
+    minute = generated_pcm(60)
+    with open(path, 'wb') as f:
+        for _ in range(seconds // 60):
+            f.write(minute)
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        ranges = split_pcm_at_silence(path)
+        latencies.append(time.perf_counter() - started)
+        assert ranges[-1][1] == seconds * 1000
+    return latencies, seconds / 60, 'audio minutes'
+
+def bench_transcribe(base_url: str, tmp_dir: str, repeat: int, seconds: int = 30):
+    """Whisper 'tiny' on 30 s of generated audio, one worker (needs whisper and ffmpeg)."""
+    if importlib.util.find_spec('whisper') is None or not shutil.which('ffmpeg'):
+        return 'whisper or ffmpeg is not installed'
+    from audio_processor import transcribe_audio
+    path = os.path.join(tmp_dir, 'speech.wav')
+    with open(path, 'wb') as f:
+        f.write(generated_wav(seconds))
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        transcribe_audio(path, model_name='tiny', workers=1, service=None)
+        latencies.append(time.perf_counter() - started)
+    return latencies, seconds / 60, 'audio minutes'
+
+def bench_summarize(base_url: str, tmp_dir: str, repeat: int, chars: int = 20000):
+    """Map-reduce summary of an hour-long-sized transcript with the offline extractive backend."""
+    from text_summarizer import summarize_transcript, ExtractiveBackend
+    transcript = generated_transcript(chars)
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = summarize_transcript(transcript, ExtractiveBackend())
+        latencies.append(time.perf_counter() - started)
+        assert result['summary']
+    return latencies, chars, 'transcript chars'
+
+def bench_pipeline(base_url: str, tmp_dir: str, repeat: int, episode_count: int = 8):
+    """main.py's staged pipeline on pending episodes: resolve, download, transcribe (if whisper), summarise, deliver."""
+    from episode_ledger import EpisodeLedger, STAGE_DETECTED
+    from text_summarizer import ExtractiveBackend
+    from transcript_cache import TranscriptCache
+    from webhook_outbox import WebhookOutbox, WebhookDeliverer
+    from main import Pipeline, build_stages
+    with open(os.path.join(FIXTURE_DIR, 'channel_ssr.html'), 'rb') as f:
+        StandInHandler.routes[VOICY_CHANNEL_PATH] = ('text/html; charset=utf-8', f.read())
+    StandInHandler.routes['/audio.wav'] = ('audio/wav', generated_wav(5))
+    feed = f'{base_url}/feed.xml'
+    latencies = []
+    for iteration in range(repeat):
+        run_dir = _fresh_dir(tmp_dir, f'pipeline{iteration}')
+        episodes = [{'guid': f'ep-{i}', 'title': f'Episode {i}', 'audio_url': f'{base_url}/audio.wav?ep={i}'}
+                    for i in range(episode_count)]
+        with EpisodeLedger(os.path.join(run_dir, 'ledger.sqlite3')) as ledger, \
+                WebhookOutbox(os.path.join(run_dir, 'outbox.sqlite3')) as outbox, \
+                TranscriptCache(os.path.join(run_dir, 'transcripts.sqlite3')) as transcript_cache:
+            ledger.record_many(feed, [(episode['guid'], episode) for episode in episodes], STAGE_DETECTED)
+            deliverer = WebhookDeliverer(outbox)
+            stages = build_stages(feed, outbox, f'{base_url}/webhook', transcript_cache, ExtractiveBackend(),
+                                  voicy_channel_url=f'{base_url}{VOICY_CHANNEL_PATH}', audio_dir=run_dir)
+            started = time.perf_counter()
+            stats = Pipeline(ledger, feed, stages, deliverer=deliverer, drain_seconds=0).run()
+            latencies.append(time.perf_counter() - started)
+            deliverer.close()
+            assert stats['completed'] == episode_count and outbox.pending_count() == 0, stats
+    return latencies, episode_count, 'episodes'
+
+SCENARIOS = {}
+for size in FEED_SIZES:
+    SCENARIOS[f'check_new_episodes[{size}]'] = (bench_check_new_episodes, {'item_count': size})
+for size in FEED_SIZES:
+    SCENARIOS[f'check_new_episodes_incremental[{size}]'] = (bench_check_new_episodes_incremental, {'item_count': size})
+for size in FEED_SIZES:
+    SCENARIOS[f'rss_monitor.main[{size}]'] = (bench_rss_monitor_main, {'item_count': size})
+SCENARIOS['voicy_scraper[ssr]'] = (bench_voicy_scraper, {'fixture': 'channel_ssr.html'})
+SCENARIOS['voicy_scraper[next_data]'] = (bench_voicy_scraper, {'fixture': 'channel_next_data.html'})
+SCENARIOS['voicy_index.resolve[cold]'] = (bench_voicy_index, {'cold': True})
+SCENARIOS['voicy_index.resolve[warm]'] = (bench_voicy_index, {'cold': False})
+SCENARIOS['send_to_make_webhook'] = (bench_send_to_make_webhook, {})
+SCENARIOS['webhook_outbox.drain'] = (bench_webhook_outbox, {})
+SCENARIOS['audio_download'] = (bench_audio_download, {})
+SCENARIOS['audio_segmenter'] = (bench_audio_segmenter, {})
+SCENARIOS['audio_split[3h]'] = (bench_audio_split, {})
+SCENARIOS['transcribe'] = (bench_transcribe, {})
+SCENARIOS['summarize'] = (bench_summarize, {})
+SCENARIOS['pipeline'] = (bench_pipeline, {})
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_one(name: str, repeat: int) -> dict:
+    """Runs one scenario in this process and returns its result."""
+    from log_setup import configure_logging
+    configure_logging(log_file=None, level='WARNING')
+    func, kwargs = SCENARIOS[name]
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tmp_dir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        outcome = func(f'http://127.0.0.1:{server.server_address[1]}', tmp_dir, repeat + WARMUP_ITERATIONS, **kwargs)
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if isinstance(outcome, str):
+        return {'name': name, 'skipped': outcome}
+    latencies, units, unit = outcome
+    latencies = latencies[WARMUP_ITERATIONS:]
+    ordered = sorted(latencies)
+    return {
+        'name': name,
+        'iterations': len(latencies),
+        'unit': unit,
+        'throughput': units * len(latencies) / max(sum(latencies), 1e-9),
+        'p50_seconds': _percentile(ordered, 0.50),
+        'p95_seconds': _percentile(ordered, 0.95),
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+def run_in_child(name: str, repeat: int) -> dict:
+    """Runs one scenario in a fresh interpreter so its imports and peak RSS do not leak into the others."""
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one', name, '--repeat', str(repeat)],
+                             capture_output=True, text=True, encoding='utf-8', cwd=PROJECT_ROOT)
+    for line in process.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    error = (process.stderr.strip().splitlines() or [f'exit status {process.returncode}'])[-1]
+    return {'name': name, 'error': error}
+
+def compare(result: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    """Returns the regressions of one scenario against its baseline entry (p50 and peak RSS; p95 of a few runs is too noisy)."""
+    if not baseline or 'p50_seconds' not in result or 'p50_seconds' not in baseline:
+        return []
+    regressions = []
+    if (result['p50_seconds'] > baseline['p50_seconds'] * (1 + tolerance)
+            and result['p50_seconds'] - baseline['p50_seconds'] > MIN_REGRESSION_SECONDS):
+        regressions.append(f"p50 {baseline['p50_seconds'] * 1000:.1f} -> {result['p50_seconds'] * 1000:.1f} ms")
+    if (result.get('peak_rss_mb') and baseline.get('peak_rss_mb')
+            and result['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance)
+            and result['peak_rss_mb'] - baseline['peak_rss_mb'] > MIN_REGRESSION_RSS_MB):
+        regressions.append(f"peak RSS {baseline['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the stand.fm -> Voicy pipeline.')
+    parser.add_argument('--only', action='append', default=[],
+                        help='Run only scenarios whose name starts with this (repeatable).')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Iterations per scenario.')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed slowdown / growth against the baseline (0.5 = 50%%).')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline JSON file.')
+    parser.add_argument('--update-baseline', action='store_true', help='Store this run as the new baseline.')
+    parser.add_argument('--output', help='Also write this run\'s results to a JSON file.')
+    parser.add_argument('--list', action='store_true', help='List the scenarios and exit.')
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(SCENARIOS))
+        return 0
+    if args.run_one:
+        print(RESULT_PREFIX + json.dumps(run_one(args.run_one, max(1, args.repeat))))
+        return 0
+
+    names = [name for name in SCENARIOS if not args.only or any(name.startswith(prefix) for prefix in args.only)]
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baselines = {entry['name']: entry for entry in json.load(f)['results']}
+
+    print(f"{'scenario':<40} {'throughput':>30} {'p50 ms':>10} {'p95 ms':>10} {'peak RSS MB':>12}  vs baseline")
+    results = []
+    regressed = []
+    for name in names:
+        result = run_in_child(name, max(1, args.repeat))
+        results.append(result)
+        if 'skipped' in result or 'error' in result:
+            print(f"{name:<40} {'skipped: ' + result['skipped'] if 'skipped' in result else 'ERROR: ' + result['error']}")
+            continue
+        baseline = baselines.get(name)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            regressed.append((name, regressions))
+        verdict = 'REGRESSION' if regressions else (
+            f"p50 {result['p50_seconds'] / baseline['p50_seconds']:.2f}x" if baseline and baseline.get('p50_seconds') else 'no baseline')
+        rss = f"{result['peak_rss_mb']:.0f}" if result['peak_rss_mb'] is not None else '-'
+        print(f"{name:<40} {result['throughput']:>10.1f} {result['unit'] + '/s':<19} "
+              f"{result['p50_seconds'] * 1000:>10.1f} {result['p95_seconds'] * 1000:>10.1f} {rss:>12}  {verdict}")
+
+    report = {'python': sys.version.split()[0], 'platform': sys.platform, 'repeat': args.repeat, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.update_baseline:
+        # Keep the entries of scenarios that were not run this time.
+        merged = dict(baselines)
+        merged.update({result['name']: result for result in results if 'p50_seconds' in result})
+        report['results'] = [merged[name] for name in SCENARIOS if name in merged]
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline written to {args.baseline}")
+    for name, regressions in regressed:
+        print(f"Regression in {name}: {'; '.join(regressions)}")
+    failed = [result['name'] for result in results if 'error' in result]
+    return 1 if regressed or failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
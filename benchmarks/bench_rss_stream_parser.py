@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import tracemalloc
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+# Compares feedparser with the incremental rss_stream_parser on a synthetic feed.
+# Run with: python benchmarks/bench_rss_stream_parser.py [item_count]
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import feedparser
+from rss_stream_parser import iter_feed_episodes
+from rss_checker import _get_guid, _extract_episode_data
+
+DEFAULT_ITEM_COUNT = 5000
+CHUNK_SIZE = 16 * 1024
+
+def build_synthetic_feed(item_count: int) -> bytes:
+    """Builds a stand.fm-like RSS 2.0 feed with item_count items, newest first."""
+    newest = datetime(2025, 6, 5, 21, 0, 12, tzinfo=timezone.utc)
+    description = "今日のテーマについて話しました。" * 20
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">',
+        '<channel><title>Synthetic stand.fm channel</title><link>https://stand.fm/channels/test</link>',
+    ]
+    for i in range(item_count, 0, -1):
+        published = format_datetime(newest - timedelta(days=item_count - i), usegmt=True)
+        parts.append(
+            f'<item><title>エピソード {i}</title>'
+            f'<link>https://stand.fm/episodes/{i:024x}</link>'
+            f'<guid isPermaLink="true">https://stand.fm/episodes/{i:024x}</guid>'
+            f'<pubDate>{published}</pubDate>'
+            f'<description><![CDATA[{description}]]></description>'
+            f'<itunes:duration>00:15:00</itunes:duration>'
+            f'<enclosure url="https://cdncf.stand.fm/audios/{i:024x}.m4a" type="audio/mp4" length="1000000"/>'
+            f'</item>'
+        )
+    parts.append('</channel></rss>')
+    return ''.join(parts).encode('utf-8')
+
+def iter_chunks(body: bytes):
+    for offset in range(0, len(body), CHUNK_SIZE):
+        yield body[offset:offset + CHUNK_SIZE]
+
+def run_feedparser(body: bytes, stop_guid):
+    """The previous check_new_episodes() path: parse everything, then walk to the GUID."""
+    feed = feedparser.parse(body)
+    episodes = []
+    for entry in feed.entries:
+        if _get_guid(entry) == stop_guid:
+            break
+        episode = _extract_episode_data(entry)
+        if episode:
+            episodes.append(episode)
+    return episodes
+
+def run_stream_parser(body: bytes, stop_guid):
+    return list(iter_feed_episodes(iter_chunks(body), stop_guid=stop_guid))
+
+def measure(func, body, stop_guid):
+    """Returns (episode count, seconds, peak traced memory in bytes)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    episodes = func(body, stop_guid)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(episodes), elapsed, peak
+
+def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ITEM_COUNT
+    body = build_synthetic_feed(item_count)
+    print(f"Synthetic feed: {item_count} items, {len(body) / 1024 / 1024:.1f} MB")
+
+    scenarios = [
+        ("no new episode (stop at item 1)", f"https://stand.fm/episodes/{item_count:024x}"),
+        ("3 new episodes (stop at item 4)", f"https://stand.fm/episodes/{item_count - 3:024x}"),
+        ("GUID not in feed (full walk)", None),
+    ]
+    print(f"{'scenario':<36} {'parser':<12} {'items':>6} {'time ms':>10} {'peak MB':>9}")
+    for label, stop_guid in scenarios:
+        for name, func in (("feedparser", run_feedparser), ("stream", run_stream_parser)):
+            count, elapsed, peak = measure(func, body, stop_guid)
+            print(f"{label:<36} {name:<12} {count:>6} {elapsed * 1000:>10.1f} {peak / 1024 / 1024:>9.1f}")
+
+if __name__ == '__main__':
+    main()
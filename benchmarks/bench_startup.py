@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Import-time budget for the entry points.
+# Most scheduled runs find no new episode, so what they pay is mostly
+# interpreter start-up plus imports. Each entry point is imported in a fresh
+# interpreter with -X importtime; the run fails if its cumulative import time
+# (best of --repeat) exceeds its budget, or if a heavy module that only a
+# working stage needs (feedparser, BeautifulSoup, httpx, Selenium, Whisper /
+# torch, numpy) is loaded at start-up.
+# Run with: python benchmarks/bench_startup.py [--repeat N] [--budget-scale 1.5]
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src')
+# Cumulative import time budget in milliseconds. A dev box measures about
+# 150 (rss_monitor), 160-190 (main) and 115 (rss_checker); a slower laptop
+# 222 and 248. The budgets leave roughly 1.6x over the slower machine so
+# only a real regression fails.
+ENTRY_POINT_BUDGETS_MS = {
+    'rss_monitor': 400,
+    'main': 400,
+    'rss_checker': 300,
+}
+FORBIDDEN_AT_STARTUP = ('feedparser', 'bs4', 'httpx', 'selenium', 'whisper', 'torch', 'numpy')
+DEFAULT_REPEAT = 5
+TOP_IMPORTS = 5
+
+def measure_import(module: str) -> tuple[float, list[tuple[float, str]]]:
+    """Imports module in a fresh interpreter; returns (cumulative ms, [(self ms, name), ...] slowest first)."""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             capture_output=True, text=True, cwd=SRC_DIR)
+    if process.returncode != 0:
+        raise RuntimeError(f"importing {module} failed: {process.stderr.strip().splitlines()[-1]}")
+    cumulative = None
+    self_times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        self_times.append((int(self_us) / 1000, name.strip()))
+        if name.strip() == module:
+            cumulative = int(cumulative_us) / 1000
+    return cumulative, sorted(self_times, reverse=True)
+
+def heavy_modules_loaded(module: str) -> list[str]:
+    """Names from FORBIDDEN_AT_STARTUP that importing module pulls in."""
+    code = (f'import sys, json, {module}\n'
+            f'print(json.dumps([name for name in {FORBIDDEN_AT_STARTUP!r} if name in sys.modules]))')
+    process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=SRC_DIR)
+    if process.returncode != 0:
+        raise RuntimeError(f"importing {module} failed: {process.stderr.strip().splitlines()[-1]}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time budget for the entry points.')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Fresh interpreters per entry point (best is kept).')
+    parser.add_argument('--budget-scale', type=float, default=float(os.environ.get('IMPORT_BUDGET_SCALE', '1.0')),
+                        help='Multiplies every budget (e.g. 2 on a slow CI runner).')
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'entry point':<14} {'import ms':>10} {'budget ms':>10}  slowest imports (self ms)")
+    for module, budget in ENTRY_POINT_BUDGETS_MS.items():
+        budget *= args.budget_scale
+        runs = [measure_import(module) for _ in range(max(1, args.repeat))]
+        best, slowest = min(runs, key=lambda run: run[0])
+        top = ', '.join(f"{name} {ms:.0f}" for ms, name in slowest[:TOP_IMPORTS])
+        print(f"{module:<14} {best:>10.0f} {budget:>10.0f}  {top}")
+        if best > budget:
+            failures.append(f"{module} imports in {best:.0f} ms (budget {budget:.0f} ms)")
+        heavy = heavy_modules_loaded(module)
+        if heavy:
+            failures.append(f"{module} loads {', '.join(heavy)} at start-up; import them where they are used")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
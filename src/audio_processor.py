@@ -1 +1,1179 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from transcript_cache import TranscriptCache, cache_key
+from metrics import observe, timed
 
+# Audio download for episodes found by rss_checker (the feed's audio enclosure).
+# Enclosures are streamed to "<name>.part" in fixed-size chunks (and hashed by
+# reading the file back chunk by chunk), so memory use does not depend on the
+# episode length. An interrupted
+# transfer resumes with an HTTP Range request (guarded by If-Range, so a
+# changed file is fetched from scratch), and the file is only renamed to its
+# final name once its size matches Content-Length and its SHA-256 matches the
+# expected value (when one is known).
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUDIO_DOWNLOAD_DIR = os.environ.get("AUDIO_DOWNLOAD_DIR", os.path.join(PROJECT_ROOT, "data", "audio"))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 30  # Per connect / per read, not for the whole file
+DOWNLOAD_MAX_ATTEMPTS = 5
+MAX_PARALLEL_DOWNLOADS = int(os.environ.get("AUDIO_MAX_PARALLEL_DOWNLOADS", "4"))
+USER_AGENT = "standfm-voicy-automation/1.0 (+audio download)"
+PART_SUFFIX = ".part"
+PART_META_SUFFIX = ".part.json"  # Validators of the partial download, for If-Range
+
+logger = logging.getLogger(__name__)
+
+_session = None # Shared requests.Session (keep-alive pool), created on first use
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed or fails verification."""
+
+def get_session(pool_size: int = MAX_PARALLEL_DOWNLOADS) -> requests.Session:
+    """Returns a module-wide requests.Session whose connection pool fits pool_size parallel downloads."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+        _session.headers.update({"User-Agent": USER_AGENT})
+    return _session
+
+def audio_filename(episode: dict) -> str:
+    """Stable file name for an episode's audio: a GUID hash plus the enclosure's extension."""
+    extension = os.path.splitext(urlsplit(episode["audio_url"]).path)[1].lower() or ".mp3"
+    guid = episode.get("guid") or episode["audio_url"]
+    return hashlib.sha256(guid.encode("utf-8")).hexdigest()[:16] + extension
+
+def _hash_file(path: str, hasher, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+    """Feeds an existing file into a hashlib object chunk by chunk."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            hasher.update(chunk)
+
+def _load_part_meta(meta_path: str) -> dict:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def _save_part_meta(meta_path: str, meta: dict):
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+def _remove_quietly(*paths: str):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _content_range_total(content_range: str | None) -> int | None:
+    """Total size from a 'bytes start-end/total' (or 'bytes */total') Content-Range header."""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+def _content_range_start(content_range: str | None) -> int | None:
+    try:
+        return int(content_range.split()[1].split("-")[0])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def _transfer_once(url: str, part_path: str, meta_path: str, session: requests.Session,
+                   chunk_size: int, timeout: float) -> int | None:
+    """
+    Makes one request and appends whatever arrives to the .part file.
+
+    Returns:
+        The expected total size in bytes, or None if the server did not say.
+
+    Raises:
+        requests.exceptions.RequestException: On network errors (the caller retries).
+        DownloadError: On responses that retrying will not fix.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    meta = _load_part_meta(meta_path) if offset else {}
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        # Only resume if the file is still the one we started; otherwise the server sends it whole.
+        validator = meta.get("etag") or meta.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416 and offset:
+            total = _content_range_total(response.headers.get("Content-Range"))
+            if total == offset:
+                return total # The previous attempt had already received everything
+            logger.info(f"Range not satisfiable for {url}; restarting the download.")
+            _remove_quietly(part_path, meta_path)
+            raise requests.exceptions.ConnectionError("stale partial download discarded")
+        if response.status_code not in (200, 206):
+            error = DownloadError(f"Unexpected HTTP status {response.status_code} for {url}")
+            if response.status_code >= 500 or response.status_code == 429:
+                raise requests.exceptions.HTTPError(str(error), response=response)
+            raise error
+
+        if response.status_code == 206 and _content_range_start(response.headers.get("Content-Range")) == offset:
+            total = _content_range_total(response.headers.get("Content-Range"))
+            mode = "ab"
+            logger.info(f"Resuming {url} at byte {offset}.")
+        else:
+            # 200: the server ignored the range or the file changed; start over.
+            content_length = response.headers.get("Content-Length")
+            total = int(content_length) if content_length and content_length.isdigit() else None
+            mode = "wb"
+            _save_part_meta(meta_path, {"url": url, "etag": response.headers.get("ETag"),
+                                        "last_modified": response.headers.get("Last-Modified")})
+
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+    return total
+
+@timed("audio_download", failed=lambda result: bool(result["error"]))
+def download_audio(url: str, dest_path: str, expected_sha256: str | None = None,
+                   session: requests.Session | None = None, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                   timeout: float = DOWNLOAD_TIMEOUT_SECONDS, max_attempts: int = DOWNLOAD_MAX_ATTEMPTS) -> dict:
+    """
+    Streams one audio file to dest_path, resuming and verifying it.
+
+    Args:
+        url: The enclosure URL.
+        dest_path: Final file path. The data is written to dest_path + ".part"
+                   and only renamed once complete and verified.
+        expected_sha256: Optional hex digest the finished file must match.
+        session: requests.Session to use (defaults to the shared pooled one).
+        chunk_size: Bytes per read; memory use is bounded by this, not the file size.
+        timeout: Connect/read timeout in seconds.
+        max_attempts: Requests per download before giving up; each retry resumes.
+
+    Returns:
+        A dict with 'url', 'path' (None on failure), 'bytes', 'sha256',
+        'resumed' (True if any bytes came from an earlier attempt or run),
+        'elapsed' and 'error' (None on success). Does not raise.
+    """
+    started = time.perf_counter()
+    session = session or get_session()
+    part_path = dest_path + PART_SUFFIX
+    meta_path = dest_path + PART_META_SUFFIX
+    result = {"url": url, "path": None, "bytes": 0, "sha256": None, "resumed": False, "elapsed": 0.0, "error": None}
+
+    if os.path.exists(dest_path):
+        # Already downloaded by an earlier run; only re-verify when a checksum is known.
+        digest = None
+        if expected_sha256:
+            hasher = hashlib.sha256()
+            _hash_file(dest_path, hasher, chunk_size)
+            digest = hasher.hexdigest()
+        if not expected_sha256 or digest == expected_sha256:
+            result.update(path=dest_path, bytes=os.path.getsize(dest_path), sha256=digest,
+                          elapsed=time.perf_counter() - started)
+            return result
+        logger.warning(f"Existing {dest_path} does not match the expected checksum; downloading again.")
+        _remove_quietly(dest_path)
+
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+    result["resumed"] = os.path.exists(part_path) and os.path.getsize(part_path) > 0
+    total = None
+    for attempt in range(1, max_attempts + 1):
+        try:
+            total = _transfer_once(url, part_path, meta_path, session, chunk_size, timeout)
+            received = os.path.getsize(part_path)
+            if total is None or received >= total:
+                break
+            # The body ended early without an exception (e.g. the server closed the connection).
+            raise requests.exceptions.ChunkedEncodingError(f"received {received} of {total} bytes")
+        except requests.exceptions.RequestException as e:
+            if attempt == max_attempts:
+                result.update(error=f"Gave up after {attempt} attempts: {e}", elapsed=time.perf_counter() - started)
+                logger.error(f"Download of {url} failed: {result['error']}")
+                return result
+            result["resumed"] = result["resumed"] or os.path.exists(part_path)
+            delay = min(30.0, 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            logger.warning(f"Download of {url} interrupted ({e}); resuming in {delay:.1f}s (attempt {attempt}/{max_attempts}).")
+            time.sleep(delay)
+        except (DownloadError, OSError) as e:
+            result.update(error=str(e), elapsed=time.perf_counter() - started)
+            logger.error(f"Download of {url} failed: {e}")
+            return result
+
+    # Verify before publishing the file under its final name.
+    received = os.path.getsize(part_path)
+    hasher = hashlib.sha256()
+    _hash_file(part_path, hasher, chunk_size)
+    digest = hasher.hexdigest()
+    if total is not None and received != total:
+        result["error"] = f"Size mismatch: expected {total} bytes, got {received}"
+    elif expected_sha256 and digest != expected_sha256:
+        result["error"] = f"Checksum mismatch: expected {expected_sha256}, got {digest}"
+    if result["error"]:
+        _remove_quietly(part_path, meta_path)
+        result["elapsed"] = time.perf_counter() - started
+        logger.error(f"Download of {url} failed verification: {result['error']}")
+        return result
+
+    os.replace(part_path, dest_path)
+    _remove_quietly(meta_path)
+    result.update(path=dest_path, bytes=received, sha256=digest, elapsed=time.perf_counter() - started)
+    logger.info(f"Downloaded {url} -> {dest_path} ({received / 1e6:.1f} MB in {result['elapsed']:.1f}s).")
+    return result
+
+def download_episodes(episodes: list[dict], dest_dir: str = AUDIO_DOWNLOAD_DIR,
+                      max_workers: int = MAX_PARALLEL_DOWNLOADS) -> list[dict]:
+    """
+    Downloads the audio of several episodes in parallel over one pooled session.
+
+    Args:
+        episodes: Episode dicts as returned by rss_checker.check_new_episodes()
+                  (each needs 'audio_url'; 'guid' names the file). An optional
+                  'audio_sha256' is checked after download.
+        dest_dir: Directory for the audio files.
+        max_workers: Simultaneous downloads.
+
+    Returns:
+        One download_audio() result per episode (in input order), with the
+        episode's 'guid' added. Episodes without an audio URL get an error result.
+    """
+    session = get_session(max_workers)
+
+    def _download(episode: dict) -> dict:
+        if not episode.get("audio_url"):
+            return {"guid": episode.get("guid"), "url": None, "path": None, "bytes": 0, "sha256": None,
+                    "resumed": False, "elapsed": 0.0, "error": "episode has no audio enclosure"}
+        dest_path = os.path.join(dest_dir, audio_filename(episode))
+        result = download_audio(episode["audio_url"], dest_path, episode.get("audio_sha256"), session=session)
+        result["guid"] = episode.get("guid")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return list(executor.map(_download, episodes))
+
+# --- Transcription ---------------------------------------------------------
+# Whisper on a whole hour-long file is one long sequential decode. Instead the
+# audio is decoded once by ffmpeg into a cached raw 16 kHz mono int16 file
+# (AUDIO_PCM_DIR), cut into segments of about WHISPER_SEGMENT_SECONDS at
+# silences, and the segments are transcribed by a process pool in which every
+# worker loads the model once. The PCM file is only ever read through
+# numpy.memmap windows: the silence scan maps a minute at a time, and a worker
+# is sent (path, start, end) and maps just its segment, so no process holds
+# the whole episode and peak memory does not grow with its length.
+# Segment timestamps are shifted by the segment's offset and stitched back in
+# order. whisper, torch and numpy are imported lazily so downloading works
+# without them. When the resident service (transcription_service.py) is
+# listening on TRANSCRIBE_SERVICE_SOCKET, transcribe_audio() hands the file to
+# it instead, so the model is not loaded again for every episode.
+
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+WHISPER_LANGUAGE = os.environ.get("WHISPER_LANGUAGE", "ja")
+WHISPER_THREADS_PER_WORKER = int(os.environ.get("WHISPER_THREADS", "1"))
+WHISPER_WORKERS = int(os.environ.get("WHISPER_WORKERS", str(max(1, (os.cpu_count() or 1) // WHISPER_THREADS_PER_WORKER))))
+# Dynamic int8 quantisation of the model's Linear layers (CPU only); faster, slightly less accurate
+WHISPER_INT8 = os.environ.get("WHISPER_INT8", "").lower() in ("1", "true", "yes")
+WHISPER_SEGMENT_SECONDS = int(os.environ.get("WHISPER_SEGMENT_SECONDS", "120"))
+WHISPER_MAX_SEGMENT_SECONDS = int(os.environ.get("WHISPER_MAX_SEGMENT_SECONDS", "300"))
+WHISPER_SAMPLE_RATE = 16000      # What Whisper expects
+SILENCE_MIN_LEN_MS = 500         # A pause at least this long may become a segment boundary
+SILENCE_THRESH_BELOW_AVERAGE_DB = 16
+SILENCE_SEEK_STEP_MS = 20        # Level is measured per 20 ms frame; an hour of audio scans in well under a second
+SILENCE_SCAN_WINDOW_SECONDS = 60 # Audio mapped at a time by the silence scan
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+# Decoded 16 kHz mono int16 files, reused while the audio file is unchanged
+AUDIO_PCM_DIR = os.environ.get("AUDIO_PCM_DIR", os.path.join(PROJECT_ROOT, "data", "pcm"))
+# The oldest decoded files are deleted beyond this size (an hour of audio is about 115 MB)
+AUDIO_PCM_CACHE_MB = int(os.environ.get("AUDIO_PCM_CACHE_MB", "2048"))
+PCM_SUFFIX = ".s16le"
+_PCM_BYTES_PER_MS = WHISPER_SAMPLE_RATE * 2 // 1000
+# Unix socket of the resident transcription service; empty: always load the model in this process
+TRANSCRIBE_SERVICE_SOCKET = os.environ.get("TRANSCRIBE_SERVICE_SOCKET", os.path.join(PROJECT_ROOT, "data", "transcriber.sock"))
+# Start the service (in the background, for later runs too) when it is not running yet
+TRANSCRIBE_SERVICE_AUTOSTART = os.environ.get("TRANSCRIBE_SERVICE_AUTOSTART", "").lower() in ("1", "true", "yes")
+
+_worker_model = None # Loaded once per worker process by _init_transcription_worker()
+
+def plan_segments(nonsilent_ranges: list, total_ms: int, target_ms: int, max_ms: int) -> list[tuple[int, int]]:
+    """
+    Groups speech into (start_ms, end_ms) segments of roughly target_ms, cutting in the middle of pauses.
+
+    Args:
+        nonsilent_ranges: [start_ms, end_ms] speech ranges in order (detect_speech_ranges()).
+        total_ms: Length of the whole audio.
+        target_ms: A segment is closed at the first pause after it reaches this length.
+        max_ms: Hard limit; speech without a usable pause is cut here.
+
+    Returns:
+        Contiguous ranges covering [0, total_ms].
+    """
+    cut_points = [(previous_end + next_start) // 2
+                  for (_, previous_end), (next_start, _) in zip(nonsilent_ranges, nonsilent_ranges[1:])]
+    segments = []
+    start = 0
+    for cut in cut_points + [total_ms]:
+        while cut - start > max_ms:
+            segments.append((start, start + max_ms))
+            start += max_ms
+        if cut - start >= target_ms or cut == total_ms:
+            if cut > start:
+                segments.append((start, cut))
+            start = cut
+    return segments
+
+class AudioDecodeError(Exception):
+    """Raised when ffmpeg cannot decode an audio file."""
+
+def pcm_cache_path(audio_path: str, pcm_dir: str = AUDIO_PCM_DIR) -> str:
+    """Where decode_to_pcm() keeps the decoded audio; changes when the audio file is replaced."""
+    stat = os.stat(audio_path)
+    identity = f"{os.path.abspath(audio_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(pcm_dir, hashlib.sha256(identity.encode("utf-8")).hexdigest()[:24] + PCM_SUFFIX)
+
+def decode_to_pcm(audio_path: str, pcm_dir: str = AUDIO_PCM_DIR, cache_mb: int = AUDIO_PCM_CACHE_MB) -> str:
+    """
+    Decodes any ffmpeg-readable file once into a raw 16 kHz mono int16 file and returns its path.
+
+    ffmpeg writes straight to disk, so decoding does not hold the episode in
+    memory. A decoded file is reused as long as the audio file is unchanged;
+    beyond cache_mb the least recently used decoded files are deleted.
+
+    Raises:
+        AudioDecodeError: If ffmpeg fails.
+    """
+    import subprocess
+    pcm_path = pcm_cache_path(audio_path, pcm_dir)
+    if os.path.exists(pcm_path):
+        os.utime(pcm_path) # Most recently used
+        return pcm_path
+    os.makedirs(pcm_dir, exist_ok=True)
+    tmp_path = f"{pcm_path}.{os.getpid()}.tmp"
+    try:
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-y", "-i", audio_path,
+             "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(WHISPER_SAMPLE_RATE), tmp_path],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise AudioDecodeError(f"{FFMPEG_BINARY} not found; install ffmpeg or set FFMPEG_BINARY") from None
+    if result.returncode != 0:
+        _remove_quietly(tmp_path)
+        raise AudioDecodeError(f"ffmpeg exited with status {result.returncode} decoding {audio_path}: "
+                               f"{result.stderr.decode('utf-8', 'replace').strip()[-500:]}")
+    os.replace(tmp_path, pcm_path)
+    _trim_pcm_cache(pcm_dir, cache_mb * 1024 * 1024, keep=pcm_path)
+    return pcm_path
+
+def _trim_pcm_cache(pcm_dir: str, max_bytes: int, keep: str):
+    """Deletes the least recently used decoded files until the directory fits max_bytes (never `keep`)."""
+    entries = []
+    with os.scandir(pcm_dir) as scan:
+        for entry in scan:
+            if entry.name.endswith(PCM_SUFFIX) and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path != keep:
+            _remove_quietly(path) # Safe while mapped: the mapping keeps the data until it is closed
+            total -= size
+
+def remove_decoded_pcm(audio_path: str, pcm_dir: str = AUDIO_PCM_DIR):
+    """Deletes the decoded copy of an audio file, if any (call before deleting the audio file itself)."""
+    try:
+        _remove_quietly(pcm_cache_path(audio_path, pcm_dir))
+    except OSError:
+        pass
+
+def pcm_duration_ms(pcm_path: str) -> int:
+    return os.path.getsize(pcm_path) // _PCM_BYTES_PER_MS
+
+def pcm_window(pcm_path: str, start_ms: int, end_ms: int):
+    """Maps [start_ms, end_ms) of a decoded file as a read-only int16 array; nothing is read until it is used."""
+    import numpy as np
+    start = start_ms * WHISPER_SAMPLE_RATE // 1000
+    count = max(0, min(end_ms * WHISPER_SAMPLE_RATE // 1000, os.path.getsize(pcm_path) // 2) - start)
+    if count == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(pcm_path, dtype=np.int16, mode="r", offset=start * 2, shape=(count,))
+
+def pcm_frame_energies(pcm_path: str, frame_ms: int = SILENCE_SEEK_STEP_MS,
+                       window_seconds: int = SILENCE_SCAN_WINDOW_SECONDS):
+    """Mean square level of every frame_ms frame, mapping window_seconds of audio at a time."""
+    import numpy as np
+    frame_samples = frame_ms * WHISPER_SAMPLE_RATE // 1000
+    frame_count = os.path.getsize(pcm_path) // 2 // frame_samples
+    energies = np.empty(frame_count, dtype=np.float64)
+    frames_per_window = max(1, window_seconds * 1000 // frame_ms)
+    for first in range(0, frame_count, frames_per_window):
+        last = min(frame_count, first + frames_per_window)
+        window = pcm_window(pcm_path, first * frame_ms, last * frame_ms).reshape(last - first, frame_samples)
+        # float32 is exact enough for int16 squares summed over one frame; the window is unmapped after each pass.
+        floats = window.astype(np.float32)
+        energies[first:last] = np.einsum("ij,ij->i", floats, floats) / frame_samples
+        del window, floats
+    return energies
+
+def detect_speech_ranges(energies, frame_ms: int = SILENCE_SEEK_STEP_MS, min_silence_ms: int = SILENCE_MIN_LEN_MS,
+                         thresh_below_average_db: float = SILENCE_THRESH_BELOW_AVERAGE_DB) -> list:
+    """
+    Returns [start_ms, end_ms] speech ranges from per-frame levels.
+
+    A stretch is a pause where every min_silence_ms window in it is at least
+    thresh_below_average_db quieter than the whole file's average level.
+    """
+    import numpy as np
+    if len(energies) == 0:
+        return []
+    threshold = energies.mean() * 10 ** (-thresh_below_average_db / 10)
+    window = max(1, min_silence_ms // frame_ms)
+    if len(energies) < window:
+        return [[0, len(energies) * frame_ms]]
+    cumulative = np.concatenate(([0.0], np.cumsum(energies)))
+    quiet_window = (cumulative[window:] - cumulative[:-window]) / window <= threshold   # Window starting at each frame
+    del cumulative
+    # A frame is silent if any quiet window covers it: frame i is covered by the windows starting at i-window+1 .. i.
+    starts = np.concatenate(([0], np.cumsum(quiet_window, dtype=np.int32)))
+    last = len(quiet_window)
+    covering = (np.concatenate((starts[1:], np.full(window - 1, starts[last], dtype=np.int32)))
+                - np.concatenate((np.zeros(window - 1, dtype=np.int32), starts[:last])))
+    speech = np.concatenate(([0], (covering == 0).astype(np.int8), [0]))
+    del starts, covering
+    edges = np.flatnonzero(np.diff(speech))
+    return [[int(start) * frame_ms, int(end) * frame_ms] for start, end in zip(edges[::2], edges[1::2])]
+
+def split_pcm_at_silence(pcm_path: str, target_seconds: int = WHISPER_SEGMENT_SECONDS,
+                         max_seconds: int = WHISPER_MAX_SEGMENT_SECONDS) -> list[tuple[int, int]]:
+    """Returns (start_ms, end_ms) segments of a decoded file, split at pauses."""
+    speech = detect_speech_ranges(pcm_frame_energies(pcm_path))
+    return plan_segments(speech, pcm_duration_ms(pcm_path), target_seconds * 1000, max_seconds * 1000)
+
+def load_whisper_model(model_name: str = WHISPER_MODEL, threads: int = WHISPER_THREADS_PER_WORKER,
+                       int8: bool = WHISPER_INT8):
+    """Loads a Whisper model for CPU inference with the given torch thread count, optionally int8-quantised."""
+    import torch
+    import whisper
+    torch.set_num_threads(max(1, threads))
+    model = whisper.load_model(model_name, device="cpu")
+    if int8:
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def _init_transcription_worker(model_name: str, threads: int, int8: bool):
+    global _worker_model
+    _worker_model = load_whisper_model(model_name, threads, int8)
+
+def _transcribe_pcm(model, pcm16, offset_seconds: float, language: str | None) -> list[dict]:
+    """Transcribes one segment of 16 kHz mono int16 PCM (bytes or an int16 array / memmap window); timestamps are shifted by offset_seconds."""
+    import numpy as np
+    # The float32 conversion is the only copy; scaling happens in place.
+    samples = np.frombuffer(pcm16, dtype=np.int16).astype(np.float32)
+    samples *= 1 / 32768.0
+    # fp16 is GPU-only; conditioning on previous text mostly helps across windows we already split at pauses.
+    result = model.transcribe(samples, language=language, fp16=False, condition_on_previous_text=False)
+    return [{"start": round(segment["start"] + offset_seconds, 2),
+             "end": round(segment["end"] + offset_seconds, 2),
+             "text": segment["text"].strip()}
+            for segment in result.get("segments", []) if segment["text"].strip()]
+
+def _transcribe_segment_in_worker(index: int, pcm16: bytes, offset_seconds: float, language: str | None):
+    return index, _transcribe_pcm(_worker_model, pcm16, offset_seconds, language)
+
+def _transcribe_window_in_worker(index: int, pcm_path: str, start_ms: int, end_ms: int, language: str | None):
+    """Maps its own window of the decoded file, so only the path and two numbers cross the process boundary."""
+    return index, _transcribe_pcm(_worker_model, pcm_window(pcm_path, start_ms, end_ms), start_ms / 1000.0, language)
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    _hash_file(path, hasher)
+    return hasher.hexdigest()
+
+def transcription_params(model_name: str, language: str | None, int8: bool, segment_seconds: int) -> dict:
+    """The settings that change a transcript's content (worker and thread counts do not); part of the cache key."""
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        whisper_version = version("openai-whisper")
+    except PackageNotFoundError:
+        whisper_version = None
+    return {
+        "model": model_name,
+        "language": language,
+        "int8": bool(int8),
+        "segment_seconds": segment_seconds,
+        "max_segment_seconds": max(segment_seconds, WHISPER_MAX_SEGMENT_SECONDS),
+        "silence": [SILENCE_MIN_LEN_MS, SILENCE_THRESH_BELOW_AVERAGE_DB, SILENCE_SEEK_STEP_MS],
+        "whisper": whisper_version,
+    }
+
+def _transcribe_locally(audio_path: str, model_name: str, language: str | None, workers: int,
+                        threads_per_worker: int, int8: bool, segment_seconds: int, timings: dict) -> tuple:
+    """Decodes, splits and transcribes in this process (and its worker pool). Returns (segments, audio_seconds, segment_count, workers)."""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    import importlib.util
+    import multiprocessing
+    for module in ("numpy", "whisper"):
+        # Missing transcription extras are reported before ffmpeg runs for nothing.
+        if importlib.util.find_spec(module) is None:
+            raise ImportError(f"{module} is not installed", name=module)
+
+    phase_started = time.perf_counter()
+    pcm_path = decode_to_pcm(audio_path)
+    timings["decode"] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    ranges = split_pcm_at_silence(pcm_path, segment_seconds, max(segment_seconds, WHISPER_MAX_SEGMENT_SECONDS))
+    timings["split"] = time.perf_counter() - phase_started
+
+    workers = max(1, min(workers, len(ranges)))
+    logger.info(f"Transcribing {audio_path}: {len(ranges)} segments on {workers} worker(s) x {threads_per_worker} thread(s), "
+                f"model={model_name}{' int8' if int8 else ''}.")
+
+    phase_started = time.perf_counter()
+    by_index = {}
+    if workers == 1:
+        model = load_whisper_model(model_name, threads_per_worker, int8)
+        for index, (start_ms, end_ms) in enumerate(ranges):
+            by_index[index] = _transcribe_pcm(model, pcm_window(pcm_path, start_ms, end_ms), start_ms / 1000.0, language)
+    else:
+        # "spawn" keeps torch's thread pools out of a forked parent; each worker loads the model once.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_transcription_worker,
+                                 initargs=(model_name, threads_per_worker, int8)) as executor:
+            # Longest segments first so no worker is left with a long one at the end.
+            futures = [executor.submit(_transcribe_window_in_worker, index, pcm_path, start_ms, end_ms, language)
+                       for index, (start_ms, end_ms) in sorted(enumerate(ranges), key=lambda job: job[1][0] - job[1][1])]
+            for future in as_completed(futures):
+                index, segments = future.result()
+                by_index[index] = segments
+    timings["transcribe"] = time.perf_counter() - phase_started
+
+    segments = [segment for index in sorted(by_index) for segment in by_index[index]]
+    audio_seconds = ranges[-1][1] / 1000.0 if ranges else 0.0
+    return segments, audio_seconds, len(ranges), workers
+
+def _transcript(segments: list[dict], audio_seconds: float, segment_count: int, language: str | None) -> dict:
+    """The dict stored in the transcript cache."""
+    return {
+        # Japanese has no spaces between sentences; keep Whisper's segment text as is.
+        "text": "".join(segment["text"] for segment in segments) if (language or "").startswith("ja")
+                else " ".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "audio_seconds": audio_seconds,
+        "segment_count": segment_count,
+    }
+
+@timed("transcribe")
+def transcribe_audio(audio_path: str, model_name: str = WHISPER_MODEL, language: str | None = WHISPER_LANGUAGE,
+                     workers: int = WHISPER_WORKERS, threads_per_worker: int = WHISPER_THREADS_PER_WORKER,
+                     int8: bool = WHISPER_INT8, segment_seconds: int = WHISPER_SEGMENT_SECONDS,
+                     cache: TranscriptCache | None = None, audio_sha256: str | None = None,
+                     service: str | None = TRANSCRIBE_SERVICE_SOCKET, start_service: bool = TRANSCRIBE_SERVICE_AUTOSTART) -> dict:
+    """
+    Transcribes an audio file with Whisper, in parallel over silence-delimited segments.
+
+    Args:
+        audio_path: Any file ffmpeg can decode (e.g. a download_audio() result).
+        model_name: Whisper model size ("tiny", "base", "small", ...).
+        language: Spoken language code, or None to let Whisper detect it per segment.
+        workers: Worker processes, each holding its own copy of the model.
+                 workers * threads_per_worker should not exceed the core count.
+        threads_per_worker: torch threads per worker.
+        int8: Quantise the model's Linear layers to int8 (CPU).
+        segment_seconds: Target segment length; segments are cut at the first
+                         pause after this length.
+        cache: Transcript cache to look in first and store the result in.
+        audio_sha256: The file's SHA-256 if already known (download_audio()
+                      returns it); otherwise the file is hashed for the cache.
+        service: Socket of the resident transcription service. If it is
+                 listening with the same model, the file is transcribed there
+                 (workers and threads_per_worker are then the service's);
+                 otherwise, or with None, the model is loaded here.
+        start_service: Start the service in the background first if it is not running.
+
+    Returns:
+        A dict with 'text' (the stitched transcript), 'segments' ([{'start',
+        'end', 'text'}] in seconds from the start of the file), 'audio_seconds',
+        'segment_count', 'workers', 'cached', 'service' (True if the resident
+        service did the work) and 'timings' ({'decode', 'split', 'transcribe'},
+        or {'cache'} for a cache hit).
+    """
+    timings = {}
+    key = None
+    if cache is not None:
+        phase_started = time.perf_counter()
+        audio_sha256 = audio_sha256 or file_sha256(audio_path)
+        params = transcription_params(model_name, language, int8, segment_seconds)
+        key = cache_key(audio_sha256, params)
+        cached = cache.get(key)
+        if cached is not None:
+            timings["cache"] = time.perf_counter() - phase_started
+            logger.info(f"Transcript of {audio_path} served from cache in {timings['cache'] * 1000:.1f} ms.")
+            return dict(cached, workers=0, cached=True, service=False, timings=timings)
+
+    result = None
+    if service:
+        from transcription_service import ServiceUnavailable, ensure_service, transcribe_on_service
+        try:
+            if start_service:
+                ensure_service(service)
+            result = transcribe_on_service(os.path.abspath(audio_path), service, model_name, language, int8, segment_seconds)
+        except ServiceUnavailable as e:
+            logger.info(f"Transcription service not used ({e}); loading the model in this process.")
+        else:
+            timings.update(result["timings"])
+            result = (result["segments"], result["audio_seconds"], result["segment_count"], result["workers"])
+    used_service = result is not None
+    if result is None:
+        result = _transcribe_locally(audio_path, model_name, language, workers, threads_per_worker, int8,
+                                     segment_seconds, timings)
+    segments, audio_seconds, segment_count, workers = result
+
+    logger.info(f"Transcribed {audio_seconds / 60:.1f} min of audio in {timings['transcribe']:.1f}s "
+                f"({audio_seconds / max(timings['transcribe'], 1e-9):.1f}x real time{', on the service' if used_service else ''}).")
+    transcript = _transcript(segments, audio_seconds, segment_count, language)
+    if key is not None:
+        cache.put(key, audio_sha256, params, transcript)
+    for phase, seconds in timings.items():
+        observe("transcribe_phase", seconds, phase=phase)
+    return dict(transcript, workers=workers, cached=False, service=used_service, timings=timings)
+
+# --- Streaming transcription -----------------------------------------------
+# download -> transcribe one after another leaves the CPU idle during the
+# download and the network idle during transcription. stream_transcribe()
+# overlaps them: the HTTP body is piped into ffmpeg while it arrives, the
+# 16 kHz PCM coming out is cut into segments at pauses as it is read, and
+# each finished segment goes through a bounded queue to the transcription
+# workers. Transcribed segments are yielded in order as soon as every earlier
+# one is done, so a consumer (e.g. text_summarizer) can start before the
+# episode has finished downloading. The bounded queue is the backpressure:
+# when the workers fall behind, reading from ffmpeg and from the socket stops.
+# When the resident transcription service runs, its loaded model is worth
+# more than the overlap: the file is downloaded first and the segments the
+# service sends are yielded as they arrive.
+
+STREAM_QUEUE_SEGMENTS = int(os.environ.get("WHISPER_STREAM_QUEUE", "4"))  # Decoded segments waiting for a worker
+STREAM_FRAME_MS = 20
+STREAM_READ_SIZE = 64 * 1024
+
+class PcmSegmenter:
+    """
+    Cuts a stream of 16 kHz mono int16 PCM into segments at pauses.
+
+    Follows the same rule as plan_segments(): a segment is closed in the
+    middle of the first pause (at least SILENCE_MIN_LEN_MS quieter than the
+    average level so far minus SILENCE_THRESH_BELOW_AVERAGE_DB) after it has
+    reached target_ms, or hard-cut at max_ms.
+    """
+
+    def __init__(self, target_ms: int, max_ms: int, min_silence_ms: int = SILENCE_MIN_LEN_MS,
+                 thresh_below_average_db: float = SILENCE_THRESH_BELOW_AVERAGE_DB):
+        self.target_ms = target_ms
+        self.max_ms = max(target_ms, max_ms)
+        self.min_silence_ms = min_silence_ms
+        self.thresh_below_average_db = thresh_below_average_db
+        self._buffer = bytearray()
+        self._buffer_start_ms = 0    # Stream position of the first buffered byte
+        self._scanned_ms = 0         # Buffer position up to which frame levels have been looked at
+        self._silence_ms = 0         # Length of the quiet run ending at _scanned_ms
+        self._sum_squares = 0.0      # Whole-stream energy, for the running average level
+        self._samples = 0
+
+    def feed(self, pcm: bytes) -> list[tuple[float, bytes]]:
+        """Adds PCM and returns the (offset_seconds, pcm) segments that are complete now."""
+        import numpy as np
+        self._buffer += pcm
+        frame_bytes = STREAM_FRAME_MS * _PCM_BYTES_PER_MS
+        start = self._scanned_ms * _PCM_BYTES_PER_MS
+        frame_count = (len(self._buffer) - start) // frame_bytes
+        segments = []
+        if frame_count == 0:
+            return segments
+        frames = np.frombuffer(bytes(self._buffer[start:start + frame_count * frame_bytes]),
+                               dtype=np.int16).astype(np.float64).reshape(frame_count, -1)
+        energy = (frames ** 2).mean(axis=1)
+        for frame_energy in energy:
+            self._sum_squares += frame_energy * frames.shape[1]
+            self._samples += frames.shape[1]
+            self._scanned_ms += STREAM_FRAME_MS
+            average_energy = self._sum_squares / self._samples
+            # dB comparison done on energies: 10*log10(e) < 10*log10(avg) - thresh
+            if frame_energy < average_energy * 10 ** (-self.thresh_below_average_db / 10):
+                self._silence_ms += STREAM_FRAME_MS
+            else:
+                # Speech again: cut in the middle of the pause that just ended if the segment is long enough.
+                cut_ms = self._scanned_ms - STREAM_FRAME_MS - self._silence_ms // 2
+                long_pause = self._silence_ms >= self.min_silence_ms
+                self._silence_ms = 0
+                if long_pause and cut_ms >= self.target_ms:
+                    segments.append(self._take(cut_ms))
+                    continue
+            if self._scanned_ms >= self.max_ms:
+                segments.append(self._take(self.max_ms))
+        return segments
+
+    def flush(self) -> list[tuple[float, bytes]]:
+        """Returns whatever is left at the end of the stream as the last segment."""
+        if not self._buffer:
+            return []
+        return [self._take(len(self._buffer) // _PCM_BYTES_PER_MS + (1 if len(self._buffer) % _PCM_BYTES_PER_MS else 0))]
+
+    def _take(self, length_ms: int) -> tuple[float, bytes]:
+        cut = min(len(self._buffer), length_ms * _PCM_BYTES_PER_MS)
+        segment = (self._buffer_start_ms / 1000.0, bytes(self._buffer[:cut]))
+        del self._buffer[:cut]
+        self._buffer_start_ms += length_ms
+        self._scanned_ms = max(0, self._scanned_ms - length_ms)
+        return segment
+
+def _pump_response_to_ffmpeg(response: requests.Response, ffmpeg_stdin, errors: list, hasher=None):
+    """Writes the HTTP body into ffmpeg's stdin as it arrives (and into hasher, for the transcript cache key)."""
+    try:
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            if hasher is not None:
+                hasher.update(chunk)
+            ffmpeg_stdin.write(chunk)
+    except BrokenPipeError:
+        pass # ffmpeg went away; _read_segments reports it
+    except (requests.exceptions.RequestException, OSError, ValueError) as e:
+        errors.append(f"Download interrupted: {e}")
+    finally:
+        try:
+            ffmpeg_stdin.close()
+        except OSError:
+            pass
+
+def _read_segments(ffmpeg_stdout, segmenter: PcmSegmenter, segment_queue, stop, errors: list):
+    """Reads decoded PCM, cuts it into segments and puts (index, offset, pcm) on the queue; None marks the end."""
+    import queue
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                segment_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    index = 0
+    try:
+        while not stop.is_set():
+            pcm = ffmpeg_stdout.read(STREAM_READ_SIZE)
+            segments = segmenter.feed(pcm) if pcm else segmenter.flush()
+            for offset_seconds, segment_pcm in segments:
+                if not put((index, offset_seconds, segment_pcm)):
+                    return
+                index += 1
+            if not pcm:
+                break
+    except Exception as e:
+        errors.append(f"Decoding failed: {e}")
+    finally:
+        # Always unblock the consumer, even when stopping
+        try:
+            segment_queue.put_nowait(None)
+        except queue.Full:
+            put(None)
+
+def _stream_locally(source: str, from_file: bool, session: requests.Session, model_name: str, language: str | None,
+                    workers: int, threads_per_worker: int, int8: bool, segment_seconds: int, queue_segments: int,
+                    timeout: float, collected: list, start_seconds: float = 0.0, hasher=None):
+    """
+    The in-process half of stream_transcribe(): decodes source (a URL, or a local file from
+    start_seconds on) while it is read and yields its transcript segments in order.
+
+    Segments are also appended to collected. Returns (audio_seconds, segment_count) once the
+    stream is done.
+    """
+    import queue
+    import subprocess
+    import threading
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    started = time.perf_counter()
+    response = None
+    if from_file:
+        command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-ss", f"{start_seconds:.3f}", "-i", source]
+    else:
+        response = session.get(source, stream=True, timeout=timeout)
+        if response.status_code != 200:
+            response.close()
+            raise DownloadError(f"HTTP {response.status_code} for {source}")
+        command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", "pipe:0"]
+    try:
+        ffmpeg = subprocess.Popen(
+            command + ["-f", "s16le", "-ac", "1", "-ar", str(WHISPER_SAMPLE_RATE), "pipe:1"],
+            stdin=subprocess.DEVNULL if from_file else subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+    except OSError as e:
+        if response is not None:
+            response.close()
+        raise DownloadError(f"Cannot run {FFMPEG_BINARY}: {e}") from e
+    segmenter = PcmSegmenter(segment_seconds * 1000, max(segment_seconds, WHISPER_MAX_SEGMENT_SECONDS) * 1000)
+    segment_queue = queue.Queue(maxsize=max(1, queue_segments))
+    stop = threading.Event()
+    errors = []
+    threads = [threading.Thread(target=_read_segments, args=(ffmpeg.stdout, segmenter, segment_queue, stop, errors), daemon=True)]
+    if response is not None:
+        threads.append(threading.Thread(target=_pump_response_to_ffmpeg, args=(response, ffmpeg.stdin, errors, hasher),
+                                        daemon=True))
+    workers = max(1, workers)
+    if workers == 1:
+        # Same worker function, run on one thread of this process with the model loaded once.
+        executor = ThreadPoolExecutor(max_workers=1, initializer=_init_transcription_worker,
+                                      initargs=(model_name, threads_per_worker, int8))
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_transcription_worker,
+                                       initargs=(model_name, threads_per_worker, int8))
+    for thread in threads:
+        thread.start()
+    logger.info(f"Streaming transcription of {source} on {workers} worker(s), model={model_name}{' int8' if int8 else ''}.")
+
+    in_flight = {}   # future -> segment index
+    finished = {}    # segment index -> transcript segments, waiting for earlier ones
+    next_index = 0
+    source_done = False
+    first_yield = None
+    decoded_seconds = 0.0
+    try:
+        while True:
+            # Keep every worker busy while decoded segments are available.
+            while not source_done and len(in_flight) < workers:
+                try:
+                    item = segment_queue.get(timeout=None if not in_flight else 0.05)
+                except queue.Empty:
+                    break
+                if item is None:
+                    source_done = True
+                    break
+                index, offset_seconds, pcm16 = item
+                decoded_seconds = offset_seconds + len(pcm16) / _PCM_BYTES_PER_MS / 1000.0
+                in_flight[executor.submit(_transcribe_segment_in_worker, index, pcm16,
+                                          start_seconds + offset_seconds, language)] = index
+            if errors:
+                raise DownloadError(errors[0])
+            if not in_flight:
+                if source_done:
+                    break
+                continue
+            done, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                del in_flight[future]
+                index, segments = future.result()
+                finished[index] = segments
+            while next_index in finished:
+                for segment in finished.pop(next_index):
+                    if first_yield is None:
+                        first_yield = time.perf_counter() - started
+                        logger.info(f"First transcript segment of {source} after {first_yield:.1f}s.")
+                    collected.append(segment)
+                    yield segment
+                next_index += 1
+        if ffmpeg.wait() != 0:
+            raise DownloadError(f"ffmpeg exited with status {ffmpeg.returncode} decoding {source}")
+        logger.info(f"Streamed transcription of {source}: {next_index} segments in {time.perf_counter() - started:.1f}s.")
+    finally:
+        stop.set()
+        if response is not None:
+            response.close()
+        if ffmpeg.poll() is None:
+            ffmpeg.kill()
+        ffmpeg.wait()
+        executor.shutdown(wait=False, cancel_futures=True)
+        for thread in threads:
+            thread.join(timeout=5)
+    return start_seconds + decoded_seconds, next_index
+
+def stream_transcribe(audio_url: str, session: requests.Session | None = None, model_name: str = WHISPER_MODEL,
+                      language: str | None = WHISPER_LANGUAGE, workers: int = WHISPER_WORKERS,
+                      threads_per_worker: int = WHISPER_THREADS_PER_WORKER, int8: bool = WHISPER_INT8,
+                      segment_seconds: int = WHISPER_SEGMENT_SECONDS, queue_segments: int = STREAM_QUEUE_SEGMENTS,
+                      timeout: float = DOWNLOAD_TIMEOUT_SECONDS, cache: TranscriptCache | None = None,
+                      audio_sha256: str | None = None, service: str | None = TRANSCRIBE_SERVICE_SOCKET,
+                      start_service: bool = TRANSCRIBE_SERVICE_AUTOSTART, dest_dir: str = AUDIO_DOWNLOAD_DIR):
+    """
+    Transcribes an episode while it downloads, yielding transcript segments in order.
+
+    If the resident transcription service answers with the same model, the
+    file is downloaded to dest_dir first and the service's segments are
+    yielded as it sends them; the model is then not loaded here. Otherwise
+    the download is decoded and transcribed in this process while it
+    arrives. Should the service go away midway, the rest of the downloaded
+    file is transcribed here, from where the service stopped.
+
+    Args:
+        audio_url: The episode's audio enclosure URL.
+        session: requests.Session to download with (default: get_session()).
+        model_name, language, workers, threads_per_worker, int8, segment_seconds:
+            As for transcribe_audio().
+        queue_segments: Decoded segments that may wait for a free worker
+                        before reading from the network pauses.
+        timeout: Connect / read timeout of the download.
+        cache: Transcript cache. Looked up before anything is transcribed
+               when the audio's SHA-256 is known (audio_sha256, or the
+               downloaded file for the service); a complete transcript is
+               stored in it.
+        audio_sha256: The audio's SHA-256 if known (e.g. from the feed).
+        service, start_service: As for transcribe_audio().
+        dest_dir: Where the audio is downloaded to for the service.
+
+    Yields:
+        {'start', 'end', 'text'} dicts (seconds from the start of the episode),
+        in order, as soon as all earlier segments are transcribed.
+
+    Raises:
+        DownloadError: If the download or the decoding fails. Segments yielded
+                       before the failure stay valid.
+        TranscriptionServiceError: If the service ran the job and it failed.
+
+    Closing the generator early stops the download, ffmpeg and the workers.
+    """
+    session = session or get_session()
+    params = transcription_params(model_name, language, int8, segment_seconds)
+    cached = _cached_transcript(cache, audio_sha256, params)
+    if cached is not None:
+        yield from cached["segments"]
+        return
+
+    status = None
+    if service:
+        from transcription_service import ensure_service, ping
+        if start_service:
+            ensure_service(service)
+        status = ping(service)
+        if status is not None and (status.get("model"), status.get("int8")) != (model_name, bool(int8)):
+            logger.info(f"Transcription service not used (it runs model={status['model']!r}); loading the model here.")
+            status = None
+    if status is None:
+        # Nothing to hand the work to: overlap the download with transcription in this process.
+        hasher = hashlib.sha256() if cache is not None else None
+        segments = []
+        audio_seconds, segment_count = yield from _stream_locally(
+            audio_url, False, session, model_name, language, workers, threads_per_worker, int8, segment_seconds,
+            queue_segments, timeout, segments, hasher=hasher)
+        if hasher is not None:
+            digest = hasher.hexdigest()
+            cache.put(cache_key(digest, params), digest, params, _transcript(segments, audio_seconds, segment_count, language))
+        return
+
+    from transcription_service import ServiceUnavailable, iter_transcription
+    os.makedirs(dest_dir, exist_ok=True)
+    download = download_audio(audio_url, os.path.join(dest_dir, audio_filename({"audio_url": audio_url})), audio_sha256,
+                              session=session, timeout=timeout)
+    if download["error"]:
+        raise DownloadError(download["error"])
+    audio_path = download["path"]
+    cached = _cached_transcript(cache, download["sha256"], params) if not audio_sha256 else None
+    if cached is not None:
+        yield from cached["segments"]
+        return
+
+    segments = []
+    audio_seconds, segment_count = 0.0, 0
+    try:
+        for reply in iter_transcription(os.path.abspath(audio_path), service, model_name, language, int8, segment_seconds):
+            if reply["event"] == "started":
+                audio_seconds = reply["audio_seconds"]
+            elif reply["event"] == "segment":
+                segment_count += 1
+            for segment in reply.get("segments", []):
+                segments.append(segment)
+                yield segment
+    except ServiceUnavailable as e:
+        resume_seconds = segments[-1]["end"] if segments else 0.0
+        logger.info(f"Transcription service not used ({e}); transcribing {audio_path} in this process "
+                    f"from {resume_seconds:.1f}s.")
+        audio_seconds, local_segment_count = yield from _stream_locally(
+            audio_path, True, session, model_name, language, workers, threads_per_worker, int8, segment_seconds,
+            queue_segments, timeout, segments, start_seconds=resume_seconds)
+        segment_count += local_segment_count
+    if cache is not None:
+        cache.put(cache_key(download["sha256"], params), download["sha256"], params,
+                  _transcript(segments, audio_seconds, segment_count, language))
+
+def _cached_transcript(cache: TranscriptCache | None, audio_sha256: str | None, params: dict) -> dict | None:
+    if cache is None or not audio_sha256:
+        return None
+    cached = cache.get(cache_key(audio_sha256, params))
+    if cached is not None:
+        logger.info(f"Streamed transcript of {audio_sha256[:12]} served from cache.")
+    return cached
+
+if __name__ == '__main__':
+    # python src/audio_processor.py               -> self-check of the downloader (local stand-in server
+    #                                                that supports Range and drops the first connection
+    #                                                midway) and of the segment planners
+    # python src/audio_processor.py <audio file>  -> transcribe a local file (needs whisper, numpy and ffmpeg)
+    # python src/audio_processor.py --stream <url> -> transcribe while downloading (on the service if it runs,
+    #                                                 else here: needs whisper and ffmpeg)
+    import sys
+    import wave
+    import shutil
+    import importlib.util
+    import tempfile
+    import threading
+    import tracemalloc
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from log_setup import configure_logging
+
+    configure_logging(log_file=None)
+    if len(sys.argv) > 2 and sys.argv[1] == "--stream":
+        with TranscriptCache() as transcript_cache:
+            for segment in stream_transcribe(sys.argv[2], cache=transcript_cache):
+                print(f"[{segment['start']:8.2f} - {segment['end']:8.2f}] {segment['text']}", flush=True)
+        raise SystemExit(0)
+    if len(sys.argv) > 1:
+        with TranscriptCache() as transcript_cache:
+            transcript = transcribe_audio(sys.argv[1], cache=transcript_cache)
+        for segment in transcript["segments"]:
+            print(f"[{segment['start']:8.2f} - {segment['end']:8.2f}] {segment['text']}")
+        print(f"--- {transcript['segment_count']} segments, {transcript['workers']} workers, timings {transcript['timings']} ---")
+        raise SystemExit(0)
+
+    # Segment planning: cut at the first pause after the target length, hard-cut speech without pauses.
+    speech = [[0, 50_000], [50_800, 130_000], [131_000, 200_000], [201_000, 900_000]]
+    planned = plan_segments(speech, 900_000, target_ms=120_000, max_ms=300_000)
+    assert planned[0] == (0, 130_500) and planned[-1][1] == 900_000
+    assert all(end - start <= 300_000 for start, end in planned)
+    assert all(a[1] == b[0] for a, b in zip(planned, planned[1:]))
+
+    # The streaming segmenter applies the same rule to PCM fed in small pieces (numpy comes with whisper).
+    if importlib.util.find_spec("numpy") is not None:
+        def pcm(ms: int, amplitude: int) -> bytes:
+            return (amplitude.to_bytes(2, "little", signed=True) + (-amplitude).to_bytes(2, "little", signed=True)) * (ms * _PCM_BYTES_PER_MS // 4)
+        stream = pcm(3000, 8000) + pcm(800, 0) + pcm(4000, 8000) + pcm(1000, 0) + pcm(12000, 8000) + pcm(300, 0)
+        stream_segmenter = PcmSegmenter(target_ms=3500, max_ms=10000)
+        streamed = []
+        for position in range(0, len(stream), 4000):
+            streamed += stream_segmenter.feed(stream[position:position + 4000])
+        streamed += stream_segmenter.flush()
+        # The 800 ms pause comes too early; the 1000 ms pause ends the first segment; the rest is hard-cut.
+        assert [offset for offset, _ in streamed] == [0.0, 8.3, 18.3]
+        assert b"".join(segment for _, segment in streamed) == stream
+
+        # A decoded file is split the same way, reading it through 1 s memmap windows.
+        with tempfile.TemporaryDirectory() as pcm_dir:
+            pcm_path = os.path.join(pcm_dir, "episode" + PCM_SUFFIX)
+            with open(pcm_path, "wb") as f:
+                f.write(stream)
+            speech = detect_speech_ranges(pcm_frame_energies(pcm_path, window_seconds=1))
+            assert speech == [[0, 3000], [3800, 7800], [8800, 21100]], speech
+            assert [start for start, _ in plan_segments(speech, pcm_duration_ms(pcm_path), 3500, 10000)] == [0, 8300, 18300]
+            window = pcm_window(pcm_path, 8300, 8400)
+            assert window.tobytes() == stream[8300 * _PCM_BYTES_PER_MS:8400 * _PCM_BYTES_PER_MS]
+            del window
+
+            # Splitting a long episode only holds one scan window and the per-frame levels, not the audio.
+            with open(pcm_path, "ab") as f:
+                for _ in range(85):
+                    f.write(stream)
+            tracemalloc.start()
+            started = time.perf_counter()
+            long_ranges = split_pcm_at_silence(pcm_path)
+            split_seconds = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            pcm_bytes = os.path.getsize(pcm_path)
+            print(f"Split {pcm_bytes / _PCM_BYTES_PER_MS / 60000:.0f} min of PCM ({pcm_bytes / 2**20:.0f} MB) into "
+                  f"{len(long_ranges)} segments in {split_seconds * 1000:.0f} ms, peak Python memory {peak / 2**20:.1f} MB")
+            assert long_ranges[0][0] == 0 and long_ranges[-1][1] == pcm_duration_ms(pcm_path)
+            assert all(a[1] == b[0] for a, b in zip(long_ranges, long_ranges[1:]))
+            assert peak < 16 * 2**20 < pcm_bytes / 2
+
+        if shutil.which(FFMPEG_BINARY):
+            # ffmpeg decodes once; the second call reuses the decoded file.
+            with tempfile.TemporaryDirectory() as pcm_dir:
+                wav_path = os.path.join(pcm_dir, "episode.wav")
+                with wave.open(wav_path, "wb") as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(2)
+                    wav.setframerate(WHISPER_SAMPLE_RATE)
+                    wav.writeframes(stream)
+                decoded = decode_to_pcm(wav_path, pcm_dir)
+                assert decode_to_pcm(wav_path, pcm_dir) == decoded and pcm_duration_ms(decoded) == 21100
+                remove_decoded_pcm(wav_path, pcm_dir)
+                assert not os.path.exists(decoded)
+    audio_body = os.urandom(8 * 1024 * 1024)  # Stand-in for a long episode
+    audio_sha256 = hashlib.sha256(audio_body).hexdigest()
+    audio_etag = '"' + audio_sha256[:16] + '"'
+    audio_view = memoryview(audio_body)  # The server slices without copying, so tracemalloc only sees the client
+
+    class StandInAudioHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        drop_next = True # Cut the first response off after 3 MB
+
+        def do_GET(self):
+            start = 0
+            range_header = self.headers.get("Range")
+            if range_header and self.headers.get("If-Range", audio_etag) == audio_etag:
+                start = int(range_header.split("=")[1].split("-")[0])
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(audio_body) - 1}/{len(audio_body)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("ETag", audio_etag)
+            self.send_header("Content-Length", str(len(audio_body) - start))
+            self.end_headers()
+            if StandInAudioHandler.drop_next:
+                StandInAudioHandler.drop_next = False
+                self.wfile.write(audio_view[start:start + 3 * 1024 * 1024])
+                self.close_connection = True
+                return
+            self.wfile.write(audio_view[start:])
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInAudioHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tracemalloc.start()
+        first = download_audio(f"{base_url}/episode.mp3", os.path.join(tmp_dir, "episode.mp3"), audio_sha256)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Interrupted + resumed download: {first['bytes']} bytes, resumed={first['resumed']}, "
+              f"peak Python memory {peak / 1024:.0f} KiB, error={first['error']}")
+        assert first["error"] is None and first["resumed"] and first["sha256"] == audio_sha256
+        assert peak < 4 * DOWNLOAD_CHUNK_SIZE + 1024 * 1024  # Bounded by the chunk size, not the 8 MB file
+
+        episodes = [{"guid": f"ep-{i}", "audio_url": f"{base_url}/ep{i}.mp3", "audio_sha256": audio_sha256} for i in range(4)]
+        started = time.perf_counter()
+        results = download_episodes(episodes, tmp_dir)
+        print(f"Parallel download of {len(results)} episodes in {time.perf_counter() - started:.2f}s")
+        assert all(result["error"] is None for result in results)
+
+        bad = download_audio(f"{base_url}/episode.mp3", os.path.join(tmp_dir, "bad.mp3"), "0" * 64)
+        assert bad["error"] and bad["error"].startswith("Checksum mismatch") and not os.path.exists(os.path.join(tmp_dir, "bad.mp3.part"))
+
+        # A cached transcript of the same audio is returned without decoding (no whisper/numpy needed here).
+        with TranscriptCache(os.path.join(tmp_dir, "transcripts.sqlite3")) as transcript_cache:
+            params = transcription_params(WHISPER_MODEL, WHISPER_LANGUAGE, WHISPER_INT8, WHISPER_SEGMENT_SECONDS)
+            transcript_cache.put(cache_key(audio_sha256, params), audio_sha256, params,
+                                 {"text": "テスト。", "segments": [], "audio_seconds": 1.0, "segment_count": 1})
+            hit = transcribe_audio(first["path"], cache=transcript_cache)
+            assert hit["cached"] and hit["text"] == "テスト。" and hit["timings"]["cache"] < 1.0
+            print(f"Cached transcript (file hashed for the key) in {hit['timings']['cache'] * 1000:.1f} ms")
+
+    server.shutdown()
+    print("--- audio_processor.py self-check passed ---")
@@ -0,0 +1,355 @@
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import date, datetime
+import requests
+import rss_checker
+from feed_fetcher import get_session, FETCH_TIMEOUT_SECONDS, STREAM_CHUNK_SIZE
+from rss_stream_parser import iter_feed_episodes
+from voicy_scraper import METHOD_INDEX, VOICY_CHANNEL_ID_PATTERN
+from voicy_index import VoicyEpisodeIndex, refresh_channel_index, match_many, parse_published, JST
+from webhook_outbox import WebhookOutbox, WebhookDeliverer, DEFAULT_OUTBOX_PATH
+from audio_processor import remove_decoded_pcm
+from log_setup import configure_logging
+from metrics import span, start_metrics_server, write_run_report
+from main import (
+    Pipeline, build_stages, parse_stage_workers, parse_stage_rates, VOICY_CHANNEL_URL, WEBHOOK_URL_ENV,
+    PIPELINE_WORKERS,
+)
+from episode_ledger import (
+    EpisodeLedger, STAGE_DETECTED, STAGE_SCRAPED, STAGE_DOWNLOADED, STAGE_TRANSCRIBED, STAGE_SENT,
+    STATUS_BASELINE, STATUS_SKIPPED, STATUS_FAILED,
+)
+
+# Catches up on a feed's history: every episode that was never delivered
+# (recorded as baseline when the feed was first seen, skipped because a newer
+# one superseded it, given up on, or not in the ledger at all), optionally
+# within a date range.
+# The whole feed is read once and the Voicy channel listing is crawled once;
+# all episodes are matched against that index in one pass, so resolving
+# thousands of URLs costs a few hundred listing pages instead of a request per
+# episode. The matched episodes then go through main.py's pipeline with a cap
+# on episodes in flight and per-stage rate limits. Every stage is
+# checkpointed in the ledger, so an interrupted backfill is resumed by running
+# the same command again.
+
+# Starts per minute by stage name; the hosts are shared with the hourly runs
+BACKFILL_RATES = os.environ.get("BACKFILL_RATES", "resolve=30,download=30,deliver=60")
+# Episodes between stages at once
+BACKFILL_MAX_ACTIVE = int(os.environ.get("BACKFILL_MAX_ACTIVE", "8"))
+# Listing pages crawled at most (Voicy shows about 10 episodes per page)
+BACKFILL_CRAWL_PAGES = int(os.environ.get("BACKFILL_CRAWL_PAGES", "500"))
+BACKFILL_PROGRESS_SECONDS = float(os.environ.get("BACKFILL_PROGRESS_SECONDS", "60"))
+# Sent statuses that backfill reopens; queued episodes are still in the outbox
+REOPEN_STATUSES = (STATUS_BASELINE, STATUS_SKIPPED, STATUS_FAILED)
+# Stages run with --urls-only
+URLS_ONLY_STAGES = ("resolve", "deliver")
+
+logger = logging.getLogger(__name__)
+
+def list_feed_episodes(feed_url: str, session: requests.Session | None = None) -> list[dict]:
+    """
+    Reads the whole feed (unconditionally, ignoring the hourly run's cache). Returns episode dicts, newest first.
+
+    Raises:
+        requests.RequestException: If the feed cannot be fetched.
+        xml.etree.ElementTree.ParseError: If it is not well-formed XML.
+    """
+    http = session or get_session()
+    with http.get(feed_url, stream=True, timeout=FETCH_TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+        return list(iter_feed_episodes(response.iter_content(STREAM_CHUNK_SIZE)))
+
+def in_date_range(episode: dict, since: date | None = None, until: date | None = None) -> bool:
+    """True if the episode was published between since and until (inclusive, Japan time). Undated episodes only pass without a range."""
+    if since is None and until is None:
+        return True
+    published = parse_published(episode.get("published"))
+    if published is None:
+        return False
+    day = published.astimezone(JST).date()
+    return (since is None or day >= since) and (until is None or day <= until)
+
+def select_missing(ledger: EpisodeLedger, feed: str, episodes: list[dict]) -> dict:
+    """
+    Sorts the feed's episodes by what backfill has to do with them.
+
+    Returns:
+        {'unknown': not in the ledger yet, 'reopen': sent as baseline /
+        skipped / failed, 'unfinished': detected but not sent}, each a list
+        of episode dicts oldest first. Delivered and queued episodes are left out.
+    """
+    sent = ledger.statuses(feed, STAGE_SENT)
+    detected = ledger.statuses(feed, STAGE_DETECTED)
+    groups = {"unknown": [], "reopen": [], "unfinished": []}
+    for episode in reversed(episodes):
+        guid = episode["guid"]
+        if guid not in detected:
+            groups["unknown"].append(episode)
+        elif guid not in sent:
+            groups["unfinished"].append(episode)
+        elif sent[guid] in REOPEN_STATUSES:
+            groups["reopen"].append(episode)
+    return groups
+
+def resolve_in_bulk(index: VoicyEpisodeIndex, voicy_channel_url: str, ledger: EpisodeLedger, feed: str,
+                    episodes: list[dict], session: requests.Session | None = None,
+                    max_pages: int = BACKFILL_CRAWL_PAGES) -> list[dict] | None:
+    """
+    Crawls the channel listing once and records the Voicy URL of every episode that matches.
+
+    Episodes that already have a URL are kept as they are. Returns the
+    episodes that did not match, or None if the listing could not be crawled
+    without a browser (the pipeline's resolve stage then handles each one).
+    """
+    scraped = ledger.statuses(feed, STAGE_SCRAPED)
+    unresolved = [episode for episode in episodes if episode["guid"] not in scraped]
+    if not unresolved:
+        return []
+    channel_id = VOICY_CHANNEL_ID_PATTERN.search(voicy_channel_url).group(1)
+    try:
+        with span("backfill_crawl"):
+            indexed = refresh_channel_index(index, voicy_channel_url, session, max_pages, full=True)
+    except requests.RequestException as e:
+        logger.warning(f"Could not crawl the Voicy listing: {e}")
+        indexed = None
+    if indexed is None and index.channel(channel_id) is None:
+        return None
+    logger.info(f"Voicy listing crawled: {indexed or 0} new episode(s) indexed.")
+    with span("backfill_match"):
+        matches = match_many(index, channel_id, unresolved)
+    ledger.record_many(feed, [(guid, {"voicy_url": match["url"], "method": METHOD_INDEX}) for guid, match in matches.items()],
+                       STAGE_SCRAPED)
+    unmatched = [episode for episode in unresolved if episode["guid"] not in matches]
+    logger.info(f"Matched {len(matches)} of {len(unresolved)} episode(s) to Voicy; {len(unmatched)} not on Voicy (yet).")
+    return unmatched
+
+def _drop_audio_after_transcription(stages: list) -> None:
+    """Makes the transcribe stage delete the downloaded file and its decoded PCM once it has a transcript (a backlog would fill the disk)."""
+    for stage in stages:
+        if stage.checkpoint != STAGE_TRANSCRIBED:
+            continue
+        transcribe = stage.run
+
+        def run(episode: dict, outputs: dict, transcribe=transcribe) -> dict | None:
+            payload = transcribe(episode, outputs)
+            audio = outputs.get(STAGE_DOWNLOADED) or {}
+            if payload is not None and audio.get("path"):
+                try:
+                    remove_decoded_pcm(audio["path"])
+                    os.remove(audio["path"])
+                except OSError:
+                    pass
+            return payload
+        stage.run = run
+
+def run_backfill(feed_url: str, ledger: EpisodeLedger, outbox: WebhookOutbox, webhook_url: str | None,
+                 since: date | None = None, until: date | None = None, voicy_channel_url: str = VOICY_CHANNEL_URL,
+                 voicy_index: VoicyEpisodeIndex | None = None, urls_only: bool = False, keep_audio: bool = False,
+                 workers: dict | None = None, rates: dict | None = None, max_active: int = BACKFILL_MAX_ACTIVE,
+                 crawl_pages: int = BACKFILL_CRAWL_PAGES, dry_run: bool = False, deliverer: WebhookDeliverer | None = None,
+                 transcript_cache=None, summary_backend=None, session: requests.Session | None = None,
+                 progress_seconds: float | None = BACKFILL_PROGRESS_SECONDS) -> dict:
+    """
+    Runs every missing episode of a feed (within since..until) through the pipeline.
+
+    Args:
+        voicy_index: Index to crawl into and match against (required unless dry_run).
+        urls_only: Only resolve and deliver the Voicy URL (no download,
+                   transcription or summary).
+        keep_audio: Keep the downloaded audio after transcription.
+        dry_run: Only count what is missing; the ledger is not changed.
+
+    Returns:
+        Pipeline.run()'s counts plus 'missing' (episodes selected) and
+        'unmatched' (left for a later backfill: not on Voicy yet).
+
+    Raises:
+        requests.RequestException / xml.etree.ElementTree.ParseError: If the feed cannot be read.
+    """
+    with span("backfill_feed"):
+        episodes = [episode for episode in list_feed_episodes(feed_url, session) if in_date_range(episode, since, until)]
+    groups = select_missing(ledger, feed_url, episodes)
+    missing = sorted(groups["unknown"] + groups["reopen"] + groups["unfinished"],
+                     key=lambda episode: episode.get("published") or "")
+    logger.info(f"{len(episodes)} episode(s) in range: {len(groups['unknown'])} new to the ledger, "
+                f"{len(groups['reopen'])} never delivered, {len(groups['unfinished'])} unfinished.")
+    if dry_run:
+        for episode in missing:
+            logger.info(f"Missing: {episode.get('published') or '-'} {episode['guid']} {episode.get('title')}")
+    if dry_run or not missing:
+        return {"missing": len(missing), "unmatched": 0}
+
+    ledger.record_many(feed_url, [(episode["guid"], episode) for episode in groups["unknown"]], STAGE_DETECTED)
+    ledger.reopen(feed_url, [episode["guid"] for episode in groups["reopen"]], STAGE_SENT, REOPEN_STATUSES)
+
+    unmatched = resolve_in_bulk(voicy_index, voicy_channel_url, ledger, feed_url, missing, session, crawl_pages)
+    if unmatched:
+        skipped = {episode["guid"] for episode in unmatched}
+        missing = [episode for episode in missing if episode["guid"] not in skipped]
+
+    stages = build_stages(feed_url, outbox, webhook_url, transcript_cache, summary_backend, workers,
+                          voicy_channel_url, voicy_index=voicy_index, rates=rates)
+    if urls_only:
+        stages = [stage for stage in stages if stage.name in URLS_ONLY_STAGES]
+    elif not keep_audio:
+        _drop_audio_after_transcription(stages)
+    pipeline = Pipeline(ledger, feed_url, stages, deliverer=deliverer, max_active=max_active,
+                        progress_seconds=progress_seconds)
+    stats = pipeline.run(missing)
+    stats.update(missing=len(missing) + len(unmatched or []), unmatched=len(unmatched or []))
+    return stats
+
+def _parse_day(value: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}") from None
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver every stand.fm episode that was never delivered "
+                                                 "(optionally within a date range). Run it again to resume.")
+    parser.add_argument("--since", type=_parse_day, help="Only episodes published on or after this day (YYYY-MM-DD, Japan time).")
+    parser.add_argument("--until", type=_parse_day, help="Only episodes published on or before this day.")
+    parser.add_argument("--feed", default=os.environ.get("STANDFM_RSS_URL"), help="RSS URL (default: STANDFM_RSS_URL).")
+    parser.add_argument("--voicy-channel", default=VOICY_CHANNEL_URL, help="Voicy channel URL (default: VOICY_CHANNEL_URL).")
+    parser.add_argument("--ledger", default=rss_checker.LEDGER_FILE, help="Episode ledger (default: main.py's).")
+    parser.add_argument("--outbox", default=DEFAULT_OUTBOX_PATH, help="Webhook outbox (default: main.py's).")
+    parser.add_argument("--urls-only", action="store_true", help="Only deliver the Voicy URLs; no download, transcription or summary.")
+    parser.add_argument("--keep-audio", action="store_true", help="Keep downloaded audio after it is transcribed.")
+    parser.add_argument("--workers", default=PIPELINE_WORKERS, help="Pool sizes per stage, e.g. download=4,transcribe=1.")
+    parser.add_argument("--rate", default=BACKFILL_RATES, help="Starts per minute per stage (default: BACKFILL_RATES).")
+    parser.add_argument("--max-active", type=int, default=BACKFILL_MAX_ACTIVE, help="Episodes in flight at once.")
+    parser.add_argument("--crawl-pages", type=int, default=BACKFILL_CRAWL_PAGES, help="Voicy listing pages crawled at most.")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the missing episodes; change nothing.")
+    args = parser.parse_args()
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env"))
+        args.feed = args.feed or os.environ.get("STANDFM_RSS_URL")
+    except ImportError:
+        pass
+    configure_logging()
+    if not args.feed:
+        logger.error("STANDFM_RSS_URL environment variable not set (or pass --feed).")
+        return 2
+
+    summary_backend = None
+    if not args.urls_only and not args.dry_run:
+        from text_summarizer import get_backend
+        summary_backend = get_backend()
+    metrics_server = start_metrics_server()
+    transcript_cache = None
+    try:
+        with EpisodeLedger(args.ledger) as ledger, WebhookOutbox(args.outbox) as outbox, VoicyEpisodeIndex() as voicy_index:
+            if not args.urls_only and not args.dry_run:
+                from transcript_cache import TranscriptCache
+                transcript_cache = TranscriptCache()
+            deliverer = WebhookDeliverer(outbox)
+            try:
+                stats = run_backfill(args.feed, ledger, outbox, os.environ.get(WEBHOOK_URL_ENV), args.since, args.until,
+                                     args.voicy_channel, voicy_index, args.urls_only, args.keep_audio,
+                                     parse_stage_workers(args.workers), parse_stage_rates(args.rate), args.max_active,
+                                     args.crawl_pages, args.dry_run, deliverer, transcript_cache, summary_backend)
+            except (requests.RequestException, SyntaxError) as e: # ParseError is a SyntaxError
+                logger.error(f"Could not read the feed: {e}")
+                return 2
+            finally:
+                deliverer.close()
+                if transcript_cache is not None:
+                    transcript_cache.close()
+    finally:
+        if hasattr(summary_backend, "close"):
+            summary_backend.close()
+        write_run_report("backfill")
+        if metrics_server is not None:
+            metrics_server.shutdown()
+    print(json.dumps(stats, ensure_ascii=False))
+    return 1 if stats.get("failed") else 0
+
+if __name__ == "__main__":
+    if "--self-check" not in sys.argv[1:]:
+        sys.exit(main())
+
+    # Offline self-check against a stand-in feed, Voicy listing and webhook: python src/backfill.py --self-check
+    import tempfile
+    import threading
+    from datetime import timedelta, timezone
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit, parse_qs
+    from email.utils import format_datetime
+
+    configure_logging(log_file=None)
+    episode_count, per_page = 45, 10
+    first_day = datetime(2024, 1, 1, 21, 0, tzinfo=timezone.utc)
+    days = [first_day + timedelta(days=i) for i in range(episode_count)]
+    # Voicy publishes the same episode the next morning, sometimes under a slightly different title.
+    cards = [(7000000 + i, f"【#{i}】配信{i}回目 のテーマについて話します", (day + timedelta(hours=9)).isoformat())
+             for i, day in enumerate(days)][::-1]
+    # Newest first, led by a stand.fm-only episode that is never on Voicy
+    items = f"<item><title>スタエフ限定の雑談</title><guid>only-standfm</guid><pubDate>{format_datetime(days[-1])}</pubDate></item>"
+    items += "".join(f"<item><title>配信{i}回目のテーマについて話します</title><guid>ep-{i}</guid>"
+                     f"<pubDate>{format_datetime(day)}</pubDate></item>" for i, day in reversed(list(enumerate(days))))
+    feed_body = f"<?xml version=\"1.0\"?><rss><channel>{items}</channel></rss>".encode("utf-8")
+    hits = {"listing": 0, "webhook": []}
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path == "/rss":
+                body, ctype = feed_body, "application/rss+xml"
+            else:
+                hits["listing"] += 1
+                page = int(parse_qs(parts.query).get("page", ["1"])[0])
+                body = "".join(f'<div class="story-item"><a class="story-item-content" href="/channel/821320/{story_id}">'
+                               f'<p class="story-item-title">{title}</p><time datetime="{published}"></time></a></div>'
+                               for story_id, title, published in cards[(page - 1) * per_page:page * per_page])
+                body, ctype = f"<html><body>{body}</body></html>".encode("utf-8"), "text/html; charset=utf-8"
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            hits["webhook"].append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    feed, channel, webhook = f"{base}/rss", f"{base}/channel/821320", f"{base}/hook"
+    with tempfile.TemporaryDirectory() as tmp, EpisodeLedger(os.path.join(tmp, "ledger.sqlite3")) as ledger, \
+            WebhookOutbox(os.path.join(tmp, "outbox.sqlite3")) as outbox, \
+            VoicyEpisodeIndex(os.path.join(tmp, "index.sqlite3")) as index:
+        deliverer = WebhookDeliverer(outbox)
+        options = dict(voicy_channel_url=channel, voicy_index=index, urls_only=True, deliverer=deliverer,
+                       rates={"deliver": 6000}, max_active=4, progress_seconds=None)
+        # The hourly run saw the feed first: everything but the newest episode is baseline.
+        ledger.detect_new(feed, list_feed_episodes(feed))
+        assert run_backfill(feed, ledger, outbox, webhook, dry_run=True, **options)["missing"] == episode_count + 1
+        assert len(ledger.pending(feed, STAGE_SENT)) == 1, "dry run changed the ledger"
+
+        # A date range first (interrupted halfway, as far as the ledger can tell) ...
+        first = run_backfill(feed, ledger, outbox, webhook, since=date(2024, 1, 11), until=date(2024, 1, 20), **options)
+        assert first["completed"] == 10 and first["unmatched"] == 0, first
+        assert hits["listing"] == episode_count // per_page + 2, hits # every page once, then the empty one
+        # ... then the rest: the delivered ones are not repeated and the stand.fm-only episode stays pending.
+        second = run_backfill(feed, ledger, outbox, webhook, **options)
+        assert second["completed"] == episode_count - 10 and second["unmatched"] == 1, second
+        urls = sorted(event["voicy_episode_url"] for event in hits["webhook"])
+        assert urls == sorted(f"https://voicy.jp/channel/821320/{7000000 + i}" for i in range(episode_count)), urls[:3]
+        # Nothing left but the unmatched one.
+        third = run_backfill(feed, ledger, outbox, webhook, **options)
+        assert third.get("completed", 0) == 0 and third["missing"] == 1, third
+        assert [episode["guid"] for episode in ledger.pending(feed, STAGE_SENT)] == ["only-standfm"]
+        deliverer.close()
+    server.shutdown()
+    print("--- backfill.py self-check passed ---")
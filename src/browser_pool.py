@@ -0,0 +1,377 @@
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+# Pool of warm headless Chrome sessions for voicy_scraper's browser fallback.
+# Instead of paying a full browser cold start per lookup, N drivers are kept
+# alive and each one serves many lookups, one tab at a time. A driver is
+# replaced when it fails a health check, has served max_pages_per_driver pages,
+# or its process tree grows past max_rss_mb.
+
+DEFAULT_POOL_SIZE = int(os.environ.get("VOICY_BROWSER_POOL_SIZE", "2"))
+DEFAULT_MAX_PAGES_PER_DRIVER = int(os.environ.get("VOICY_BROWSER_MAX_PAGES", "50"))
+DEFAULT_MAX_RSS_MB = int(os.environ.get("VOICY_BROWSER_MAX_RSS_MB", "800"))
+
+logger = logging.getLogger(__name__)
+
+def _children_by_parent() -> dict:
+    """Maps each pid to its child pids using /proc (Linux only)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name may contain spaces; the parent pid follows the closing ')'.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+def process_tree_rss_mb(pid: int) -> float | None:
+    """
+    Returns the resident memory of a process and all its descendants in MB.
+
+    Uses psutil when installed, otherwise /proc. Returns None where neither is
+    available (e.g. Windows without psutil), which disables memory eviction.
+    """
+    try:
+        import psutil
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except psutil.Error:
+            return None
+    except ImportError:
+        pass
+    if not os.path.isdir("/proc"):
+        return None
+    children = _children_by_parent()
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+class PooledDriver:
+    """A webdriver plus the bookkeeping the pool needs to decide when to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages_served = 0
+        self.created_at = time.monotonic()
+        self.base_handle = driver.current_window_handle
+
+    def is_healthy(self) -> bool:
+        """Cheap liveness probe: the session must answer a trivial script."""
+        try:
+            return self.driver.execute_script("return 1") == 1 and bool(self.driver.window_handles)
+        except Exception:
+            return False
+
+    def rss_mb(self) -> float | None:
+        service = getattr(self.driver, "service", None)
+        process = getattr(service, "process", None)
+        if process is None:
+            return None
+        return process_tree_rss_mb(process.pid)
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error while quitting pooled webdriver: {e}")
+
+class BrowserPool:
+    """
+    Keeps up to `size` warm webdrivers and hands out one tab at a time per driver.
+
+    Drivers are started lazily on first use, so a pool costs nothing when the
+    HTTP fast path always succeeds. Usage:
+
+        pool = BrowserPool(driver_factory=voicy_scraper.create_chrome_driver)
+        with pool.tab() as driver:
+            driver.get(url)
+        pool.close()
+    """
+
+    def __init__(self, driver_factory, size: int = DEFAULT_POOL_SIZE,
+                 max_pages_per_driver: int = DEFAULT_MAX_PAGES_PER_DRIVER,
+                 max_rss_mb: int | None = DEFAULT_MAX_RSS_MB):
+        self.driver_factory = driver_factory
+        self.size = max(1, size)
+        self.max_pages_per_driver = max(1, max_pages_per_driver)
+        self.max_rss_mb = max_rss_mb
+        self._idle = []          # PooledDriver instances ready for a lease
+        self._started = 0        # Live drivers, idle or leased
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._closed = False
+        self.stats = {"created": 0, "recycled_pages": 0, "recycled_unhealthy": 0, "recycled_memory": 0, "pages": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _acquire(self) -> PooledDriver:
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("BrowserPool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                self._condition.wait()
+        # Start the browser outside the lock so other leases are not blocked by a cold start.
+        try:
+            pooled = PooledDriver(self.driver_factory())
+        except Exception:
+            with self._condition:
+                self._started -= 1
+                self._condition.notify()
+            raise
+        self._count("created")
+        return pooled
+
+    def _retire(self, pooled: PooledDriver, reason: str):
+        logger.info(f"Recycling pooled webdriver after {pooled.pages_served} pages ({reason}).")
+        self._count(f"recycled_{reason}")
+        pooled.quit()
+        with self._condition:
+            self._started -= 1
+            self._condition.notify()
+
+    def _release(self, pooled: PooledDriver, failed: bool):
+        if self._closed:
+            pooled.quit()
+            with self._condition:
+                self._started -= 1
+            return
+        if failed and not pooled.is_healthy():
+            self._retire(pooled, "unhealthy")
+            return
+        if pooled.pages_served >= self.max_pages_per_driver:
+            self._retire(pooled, "pages")
+            return
+        if self.max_rss_mb:
+            rss = pooled.rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                self._retire(pooled, "memory")
+                return
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    @contextmanager
+    def tab(self):
+        """
+        Leases a driver, opens a fresh tab on it and yields the driver focused on that tab.
+
+        The tab is closed afterwards so every lookup starts from a clean page,
+        while the browser process itself stays warm for the next lookup.
+        """
+        pooled = self._acquire()
+        # Every idle driver may have died; the one started after them gets a health check too.
+        for _ in range(self.size):
+            if pooled.is_healthy():
+                break
+            self._retire(pooled, "unhealthy")
+            pooled = self._acquire()
+        else:
+            if not pooled.is_healthy():
+                self._retire(pooled, "unhealthy")
+                raise RuntimeError("BrowserPool could not get a healthy webdriver")
+        failed = False
+        try:
+            pooled.driver.switch_to.new_window("tab")
+            pooled.pages_served += 1
+            self._count("pages")
+            yield pooled.driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            try:
+                if pooled.driver.current_window_handle != pooled.base_handle:
+                    pooled.driver.close()
+                pooled.driver.switch_to.window(pooled.base_handle)
+            except Exception:
+                failed = True
+            self._release(pooled, failed)
+
+    def close(self):
+        """Quits every idle driver; leased drivers are quit when their lease ends."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            pooled.quit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+if __name__ == '__main__':
+    # Self-check with stand-in drivers (no Chrome needed): reuse, page recycling,
+    # unhealthy and memory retirement, close(), and warm leases against cold starts.
+    # Run with: python src/browser_pool.py
+    from log_setup import configure_logging
+    configure_logging(log_file=None)
+
+    COLD_START_SECONDS = 0.05
+
+    class StandInProcess:
+        pid = os.getpid()
+
+    class StandInService:
+        process = StandInProcess()
+
+    class StandInDriver:
+        """Just enough of a webdriver for the pool: tabs, a liveness script and quit()."""
+        started = []
+
+        def __init__(self):
+            time.sleep(COLD_START_SECONDS) # A browser cold start
+            self.handles = ["base"]
+            self.current_window_handle = "base"
+            self.alive = True
+            self.quit_called = False
+            self.service = StandInService()
+            self.switch_to = self
+            StandInDriver.started.append(self)
+
+        @property
+        def window_handles(self):
+            return list(self.handles)
+
+        def execute_script(self, script):
+            if not self.alive:
+                raise RuntimeError("session deleted")
+            return 1
+
+        def new_window(self, kind):
+            handle = f"tab-{len(self.handles)}"
+            self.handles.append(handle)
+            self.current_window_handle = handle
+
+        def window(self, handle):
+            self.current_window_handle = handle
+
+        def close(self):
+            self.handles.remove(self.current_window_handle)
+
+        def quit(self):
+            self.quit_called = True
+
+    # Reuse: sequential lookups share one warm driver; each gets a fresh tab that is closed afterwards.
+    pool = BrowserPool(StandInDriver, size=2, max_pages_per_driver=3, max_rss_mb=None)
+    for _ in range(3):
+        with pool.tab() as driver:
+            assert driver.current_window_handle != "base"
+        assert driver.handles == ["base"]
+    assert pool.stats["created"] == 1 and pool.stats["pages"] == 3
+    # ... and it is recycled after max_pages_per_driver pages.
+    assert pool.stats["recycled_pages"] == 1 and StandInDriver.started[0].quit_called
+    with pool.tab() as driver:
+        assert driver is StandInDriver.started[1]
+
+    # A lookup that fails on a dead session retires the driver; a driver that died while idle is replaced before use.
+    try:
+        with pool.tab() as driver:
+            driver.alive = False
+            raise RuntimeError("page crashed")
+    except RuntimeError:
+        pass
+    assert pool.stats["recycled_unhealthy"] == 1 and driver.quit_called
+    with pool.tab() as driver:
+        pass
+    driver.alive = False
+    with pool.tab() as replacement:
+        assert replacement is not driver and replacement.alive
+    assert pool.stats["recycled_unhealthy"] == 2
+
+    # A replacement that is dead on arrival is not handed out either.
+    class DeadOnArrivalDriver(StandInDriver):
+        def __init__(self):
+            super().__init__()
+            self.alive = False
+    dead_pool = BrowserPool(DeadOnArrivalDriver, size=1, max_rss_mb=None)
+    try:
+        with dead_pool.tab():
+            raise AssertionError("a dead driver was handed out")
+    except RuntimeError as e:
+        assert "healthy" in str(e)
+    assert dead_pool.stats["recycled_unhealthy"] == 2 and dead_pool._started == 0
+    dead_pool.close()
+
+    # Memory eviction: this process stands in for the browser tree and is well above a 1 MB cap.
+    memory_pool = BrowserPool(StandInDriver, size=1, max_rss_mb=1)
+    with memory_pool.tab() as driver:
+        pass
+    assert memory_pool.stats["recycled_memory"] == 1 and driver.quit_called
+    memory_pool.close()
+
+    # close() quits idle drivers, a lease still running quits its driver at the end, and no new lease starts.
+    with pool.tab() as leased:
+        idle_before = list(pool._idle)
+        pool.close()
+        assert all(pooled.driver.quit_called for pooled in idle_before) and not leased.quit_called
+    assert leased.quit_called and pool._started == 0
+    try:
+        with pool.tab():
+            pass
+        raise AssertionError("a closed pool handed out a driver")
+    except RuntimeError:
+        pass
+
+    # Warm leases from 2 drivers against a cold start per lookup, 4 threads x 10 lookups.
+    def lookups(lease, count: int):
+        for _ in range(count):
+            with lease() as driver:
+                driver.execute_script("return 1")
+
+    @contextmanager
+    def cold_tab():
+        driver = StandInDriver()
+        try:
+            yield driver
+        finally:
+            driver.quit()
+
+    timings = {}
+    for name, lease in (("cold", lambda: cold_tab), ("warm", None)):
+        warm_pool = BrowserPool(StandInDriver, size=2, max_rss_mb=None) if lease is None else None
+        lease = lease() if lease else warm_pool.tab
+        workers = [threading.Thread(target=lookups, args=(lease, 10)) for _ in range(4)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        timings[name] = time.perf_counter() - started
+        if warm_pool is not None:
+            assert warm_pool.stats["created"] == 2 and warm_pool.stats["pages"] == 40, warm_pool.stats
+            warm_pool.close()
+    print(f"40 lookups with a {COLD_START_SECONDS * 1000:.0f} ms cold start: cold {timings['cold']:.2f}s, "
+          f"warm pool of 2 {timings['warm']:.2f}s")
+    assert timings["warm"] < timings["cold"] / 2
+    print("--- browser_pool.py self-check passed ---")
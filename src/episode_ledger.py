@@ -0,0 +1,264 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Transactional ledger of every episode the pipeline has seen.
+# One row per (feed, episode GUID, pipeline stage); the unique index on those
+# three columns makes "have we seen this GUID?" an O(log n) B-tree lookup no
+# matter how many feeds and episodes accumulate. New-episode detection is a
+# set difference between the feed's GUIDs and the GUIDs already recorded as
+# detected, so a GUID disappearing from the feed no longer makes the whole
+# feed look new. Writes go through WAL-mode transactions, so a crash never
+# leaves a half-recorded run behind.
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LEDGER_PATH = os.environ.get(
+    "EPISODE_LEDGER_PATH", os.path.join(PROJECT_ROOT, "data", "episode_ledger.sqlite3")
+)
+
+# Pipeline stages, in order
+STAGE_DETECTED = "detected"
+STAGE_SCRAPED = "scraped"          # Voicy URL resolved
+STAGE_DOWNLOADED = "downloaded"    # Only used by the main.py pipeline, like the two below
+STAGE_TRANSCRIBED = "transcribed"
+STAGE_SUMMARIZED = "summarized"
+STAGE_SENT = "sent"
+
+# Row statuses
+STATUS_DONE = "done"
+STATUS_BASELINE = "baseline"     # Already in the feed when the ledger first saw it; never processed
+STATUS_SKIPPED = "skipped"       # Deliberately not processed (e.g. superseded by a newer episode)
+STATUS_QUEUED = "queued"         # Handed to the webhook outbox, delivery not confirmed yet
+STATUS_FAILED = "failed"         # The outbox gave up delivering it
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS episode_stages (
+    id INTEGER PRIMARY KEY,
+    feed TEXT NOT NULL,
+    guid TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_episode_stages_key ON episode_stages (feed, guid, stage);
+CREATE INDEX IF NOT EXISTS idx_episode_stages_stage ON episode_stages (feed, stage, id);
+"""
+
+# SQLite's default limit on bound parameters is 999 in older builds
+_MAX_PARAMS = 500
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+class EpisodeLedger:
+    """
+    SQLite-backed record of which episodes reached which pipeline stage.
+
+    Usage:
+        with EpisodeLedger() as ledger:
+            new_guids = ledger.detect_new(feed_url, guids_newest_first)
+            ...
+            ledger.record(feed_url, guid, STAGE_SENT, {"voicy_url": url})
+    """
+
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; transactions are opened explicitly in transaction().
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._depth = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        """Groups writes into one atomic commit. Nested calls join the outer transaction."""
+        with self._lock:
+            if self._depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute("COMMIT")
+
+    def record(self, feed: str, guid: str, stage: str, payload: dict | None = None, status: str = STATUS_DONE):
+        """Marks one episode as having reached a stage (insert or update)."""
+        self.record_many(feed, [(guid, payload)], stage, status)
+
+    def record_many(self, feed: str, items: list, stage: str, status: str = STATUS_DONE):
+        """Marks several (guid, payload) pairs as having reached a stage in one transaction."""
+        now = _utc_now()
+        rows = [(feed, guid, stage, status, json.dumps(payload, ensure_ascii=False) if payload is not None else None, now)
+                for guid, payload in items]
+        with self.transaction():
+            self._conn.executemany(
+                "INSERT INTO episode_stages (feed, guid, stage, status, payload, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (feed, guid, stage) DO UPDATE SET status = excluded.status, "
+                "payload = COALESCE(excluded.payload, episode_stages.payload), updated_at = excluded.updated_at",
+                rows,
+            )
+
+    def has_feed(self, feed: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM episode_stages WHERE feed = ? LIMIT 1", (feed,)).fetchone()
+        return row is not None
+
+    def is_known(self, feed: str, guid: str) -> bool:
+        """True if the episode was already detected (one index lookup)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM episode_stages WHERE feed = ? AND guid = ? AND stage = ?",
+                (feed, guid, STAGE_DETECTED),
+            ).fetchone()
+        return row is not None
+
+    def known_guids(self, feed: str, guids: list) -> set:
+        """Returns the subset of guids already detected for this feed."""
+        known = set()
+        guids = list(dict.fromkeys(guids))
+        with self._lock:
+            for start in range(0, len(guids), _MAX_PARAMS):
+                batch = guids[start:start + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT guid FROM episode_stages WHERE feed = ? AND stage = ? AND guid IN ({placeholders})",
+                    [feed, STAGE_DETECTED, *batch],
+                ).fetchall()
+                known.update(row["guid"] for row in rows)
+        return known
+
+    def detect_new(self, feed: str, episodes: list, legacy_last_guid: str | None = None) -> list:
+        """
+        Works out which episodes are new and records them as detected.
+
+        Args:
+            feed: Feed key (the RSS URL).
+            episodes: Episode dicts with at least a 'guid', newest first, as
+                      they appear in the feed.
+            legacy_last_guid: The GUID from the old JSON state file. Only used
+                              the first time a feed is seen, to decide where
+                              the already-processed part of the feed starts.
+
+        Returns:
+            The new episode dicts, newest first.
+
+        The first time a feed is seen, everything from legacy_last_guid down is
+        recorded as baseline; without a legacy GUID only the newest episode is
+        treated as new (the previous first-run behaviour).
+        """
+        episodes = [episode for episode in episodes if episode.get("guid")]
+        with self.transaction():
+            if not self.has_feed(feed):
+                guids = [episode["guid"] for episode in episodes]
+                split = guids.index(legacy_last_guid) if legacy_last_guid in guids else min(1, len(guids))
+                new_episodes, baseline = episodes[:split], episodes[split:]
+                baseline_items = [(episode["guid"], episode) for episode in baseline]
+                self.record_many(feed, baseline_items, STAGE_DETECTED, STATUS_BASELINE)
+                self.record_many(feed, baseline_items, STAGE_SENT, STATUS_BASELINE)
+            else:
+                known = self.known_guids(feed, [episode["guid"] for episode in episodes])
+                new_episodes = [episode for episode in episodes if episode["guid"] not in known]
+            # Record oldest first so pending() returns them in chronological order.
+            self.record_many(feed, [(episode["guid"], episode) for episode in reversed(new_episodes)], STAGE_DETECTED)
+        return new_episodes
+
+    def pending(self, feed: str, stage: str) -> list:
+        """
+        Returns episodes detected for this feed that have not reached `stage` yet, oldest first.
+
+        Each item is the payload recorded at detection (the episode dict).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.guid, d.payload FROM episode_stages d "
+                "WHERE d.feed = ? AND d.stage = ? AND NOT EXISTS ("
+                "  SELECT 1 FROM episode_stages s WHERE s.feed = d.feed AND s.guid = d.guid AND s.stage = ?"
+                ") ORDER BY d.id",
+                (feed, STAGE_DETECTED, stage),
+            ).fetchall()
+        return [json.loads(row["payload"]) if row["payload"] else {"guid": row["guid"]} for row in rows]
+
+    def statuses(self, feed: str, stage: str) -> dict:
+        """Returns {guid: status} of every episode of this feed that reached `stage` (one query)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT guid, status FROM episode_stages WHERE feed = ? AND stage = ?", (feed, stage)
+            ).fetchall()
+        return {row["guid"]: row["status"] for row in rows}
+
+    def reopen(self, feed: str, guids: list, stage: str,
+               statuses: tuple = (STATUS_BASELINE, STATUS_SKIPPED, STATUS_FAILED)) -> int:
+        """
+        Forgets `stage` for episodes where it ended in one of `statuses`, so pending(feed, stage) returns them again.
+
+        Used by backfill to process episodes that were recorded as baseline,
+        skipped as superseded, or given up on. Returns the number reopened.
+        """
+        guids = list(dict.fromkeys(guids))
+        reopened = 0
+        with self.transaction():
+            for start in range(0, len(guids), _MAX_PARAMS):
+                batch = guids[start:start + _MAX_PARAMS]
+                cursor = self._conn.execute(
+                    f"DELETE FROM episode_stages WHERE feed = ? AND stage = ? AND status IN ({','.join('?' * len(statuses))}) "
+                    f"AND guid IN ({','.join('?' * len(batch))})",
+                    [feed, stage, *statuses, *batch],
+                )
+                reopened += cursor.rowcount
+        return reopened
+
+    def stages(self, feed: str, guid: str) -> dict:
+        """Returns {stage: {'status', 'payload', 'updated_at'}} for one episode."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, status, payload, updated_at FROM episode_stages WHERE feed = ? AND guid = ?",
+                (feed, guid),
+            ).fetchall()
+        return {row["stage"]: {"status": row["status"],
+                               "payload": json.loads(row["payload"]) if row["payload"] else None,
+                               "updated_at": row["updated_at"]} for row in rows}
+
+    def close(self):
+        """Checkpoints the WAL into the main file (so it can be copied or committed) and closes."""
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+if __name__ == '__main__':
+    # Prints the recorded stages of the most recent episodes.
+    # Usage: python src/episode_ledger.py [ledger path]
+    import sys
+    ledger_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_LEDGER_PATH
+    with EpisodeLedger(ledger_path) as ledger:
+        with ledger._lock:
+            rows = ledger._conn.execute(
+                "SELECT feed, guid, stage, status, updated_at FROM episode_stages ORDER BY id DESC LIMIT 30"
+            ).fetchall()
+    for row in reversed(rows):
+        print(f"{row['updated_at']}  {row['stage']:<9} {row['status']:<9} {row['guid']}  ({row['feed']})")
@@ -0,0 +1,252 @@
+import os
+import json
+import hashlib
+import time
+import requests
+
+# Shared feed-fetch layer for rss_checker and rss_monitor.
+# Each caller keeps a small JSON cache next to its own state file that stores,
+# per feed URL, the validators from the last successful fetch:
+#   {"<feed url>": {"etag": ..., "last_modified": ..., "body_sha256": ..., "fetched_at": ...}}
+# The validators are sent back as If-None-Match / If-Modified-Since so an
+# unchanged feed costs a single 304 round trip and no XML parsing at all.
+
+FETCH_TIMEOUT_SECONDS = 30
+STREAM_CHUNK_SIZE = 16 * 1024
+USER_AGENT = "standfm-voicy-automation/1.0 (+feed_fetcher)"
+
+# Result statuses returned by fetch_feed()
+STATUS_NOT_MODIFIED = "not_modified"  # Server answered 304
+STATUS_UNCHANGED = "unchanged"        # 200, but body hash identical to the cached one
+STATUS_MODIFIED = "modified"          # 200 with a new body that needs parsing
+STATUS_ERROR = "error"
+
+_session = None
+
+def get_session() -> requests.Session:
+    """Returns a module-wide requests.Session so repeated fetches reuse connections."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers.update({"User-Agent": USER_AGENT})
+    return _session
+
+def load_feed_cache(cache_file: str) -> dict:
+    """Loads the validator cache from disk. Returns an empty dict if missing or corrupt."""
+    try:
+        if not os.path.exists(cache_file):
+            return {}
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+            return data if isinstance(data, dict) else {}
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_feed_cache(cache_file: str, url: str, validators: dict | None) -> None:
+    """
+    Stores the validators for a single feed URL in the cache file.
+
+    Callers should only do this after the fetched body has been processed
+    successfully; otherwise a crash between fetch and processing would make
+    the next run see a 304 and silently skip the new episode.
+    """
+    save_feed_cache_many(cache_file, {url: validators})
+
+def save_feed_cache_many(cache_file: str, validators_by_url: dict) -> None:
+    """Stores validators for several feed URLs with a single rewrite of the cache file."""
+    validators_by_url = {url: v for url, v in validators_by_url.items() if v}
+    if not validators_by_url:
+        return
+    cache = load_feed_cache(cache_file)
+    cache.update(validators_by_url)
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so an interrupted run never leaves a truncated cache.
+    tmp_path = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, cache_file)
+
+def build_conditional_headers(cached: dict | None) -> dict:
+    """Builds If-None-Match / If-Modified-Since headers from a cached validator entry."""
+    headers = {}
+    if not cached:
+        return headers
+    if cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+    return headers
+
+def validators_from_response(response_headers, body_sha256: str | None, cached: dict | None = None) -> dict:
+    """Builds the validator entry to cache from response headers and a body hash."""
+    cached = cached or {}
+    return {
+        'etag': response_headers.get('ETag') or cached.get('etag'),
+        'last_modified': response_headers.get('Last-Modified') or cached.get('last_modified'),
+        'body_sha256': body_sha256 or cached.get('body_sha256'),
+        'fetched_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+def parse_max_age(cache_control: str | None) -> int | None:
+    """Extracts max-age (seconds) from a Cache-Control header value."""
+    if not cache_control:
+        return None
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.strip().isdigit():
+            return int(value.strip())
+    return None
+
+def _iter_hashed_chunks(response, state: dict):
+    """Yields the response body in chunks while hashing it; marks the state when fully read."""
+    digest = hashlib.sha256()
+    for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+        digest.update(chunk)
+        yield chunk
+    state['body_sha256'] = digest.hexdigest()
+
+def fetch_feed(url: str, cache_file: str, timeout: float = FETCH_TIMEOUT_SECONDS, stream: bool = False) -> dict:
+    """
+    Fetches a feed with a conditional GET and compares the body against the cached hash.
+
+    Args:
+        url: The feed URL.
+        cache_file: Path of the JSON validator cache (kept next to the caller's state file).
+        timeout: Request timeout in seconds.
+        stream: If True, a 200 response is not read up front. The result carries
+                'chunks' (an iterator over the body) instead of 'body', and the
+                caller must call close_feed_stream() to get the validators. The
+                body hash shortcut cannot apply before parsing in this mode.
+
+    Returns:
+        A dict with:
+          'status': one of STATUS_NOT_MODIFIED, STATUS_UNCHANGED, STATUS_MODIFIED, STATUS_ERROR
+          'body': the raw feed bytes (only for STATUS_MODIFIED without stream, otherwise None)
+          'chunks': body iterator (only for STATUS_MODIFIED with stream, otherwise None)
+          'validators': the entry to pass to save_feed_cache() once the body was processed
+          'elapsed': wall time of the fetch in seconds
+          'error': error message for STATUS_ERROR, otherwise None
+    """
+    started = time.perf_counter()
+    cached = load_feed_cache(cache_file).get(url)
+    headers = build_conditional_headers(cached)
+
+    try:
+        response = get_session().get(url, headers=headers, timeout=timeout, stream=stream)
+    except requests.exceptions.RequestException as e:
+        return {'status': STATUS_ERROR, 'body': None, 'chunks': None, 'validators': None,
+                'elapsed': time.perf_counter() - started, 'error': str(e)}
+
+    if response.status_code == 304:
+        response.close()
+        # Refresh fetched_at (and any validator the server rotated) without touching the hash.
+        return {'status': STATUS_NOT_MODIFIED, 'body': None, 'chunks': None,
+                'validators': validators_from_response(response.headers, None, cached),
+                'elapsed': time.perf_counter() - started, 'error': None}
+
+    if response.status_code != 200:
+        response.close()
+        return {'status': STATUS_ERROR, 'body': None, 'chunks': None, 'validators': None,
+                'elapsed': time.perf_counter() - started,
+                'error': f"Unexpected HTTP status {response.status_code}"}
+
+    if stream:
+        stream_state = {'body_sha256': None}
+        return {'status': STATUS_MODIFIED, 'body': None,
+                'chunks': _iter_hashed_chunks(response, stream_state),
+                'validators': None, 'elapsed': time.perf_counter() - started, 'error': None,
+                '_response': response, '_stream_state': stream_state}
+
+    body = response.content
+    body_sha256 = hashlib.sha256(body).hexdigest()
+    validators = validators_from_response(response.headers, body_sha256)
+
+    # Servers that ignore conditional headers still let us skip parsing via the hash.
+    if cached and cached.get('body_sha256') == body_sha256:
+        return {'status': STATUS_UNCHANGED, 'body': None, 'chunks': None, 'validators': validators,
+                'elapsed': time.perf_counter() - started, 'error': None}
+
+    return {'status': STATUS_MODIFIED, 'body': body, 'chunks': None, 'validators': validators,
+            'elapsed': time.perf_counter() - started, 'error': None}
+
+def close_feed_stream(fetch_result: dict) -> dict | None:
+    """
+    Closes a streamed response and returns the validators to cache.
+
+    The body hash is only recorded when the stream was read to the end; a parser
+    that stopped early leaves it empty and relies on ETag / Last-Modified.
+    """
+    response = fetch_result.get('_response')
+    if response is None:
+        return fetch_result.get('validators')
+    response.close()
+    body_sha256 = fetch_result['_stream_state']['body_sha256']
+    fetch_result['validators'] = validators_from_response(response.headers, body_sha256)
+    return fetch_result['validators']
+
+if __name__ == '__main__':
+    # Self-check against a local stand-in HTTP server that honours ETag and Last-Modified.
+    # Run with: python src/feed_fetcher.py
+    import tempfile
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    feed_body = (
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Test</title>'
+        '<item><title>Episode 1</title><guid>https://stand.fm/episodes/1</guid></item>'
+        '</channel></rss>'
+    ).encode('utf-8')
+    etag = '"' + hashlib.sha256(feed_body).hexdigest()[:16] + '"'
+    last_modified = 'Thu, 05 Jun 2025 21:00:12 GMT'
+
+    class StandInFeedHandler(BaseHTTPRequestHandler):
+        honour_validators = True
+
+        def do_GET(self):
+            if self.honour_validators and (
+                self.headers.get('If-None-Match') == etag
+                or self.headers.get('If-Modified-Since') == last_modified
+            ):
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/rss+xml')
+            if self.honour_validators:
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+            self.send_header('Content-Length', str(len(feed_body)))
+            self.end_headers()
+            self.wfile.write(feed_body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInFeedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test_url = f"http://127.0.0.1:{server.server_address[1]}/rss"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_cache_file = os.path.join(tmp_dir, 'feed_cache.json')
+
+        first = fetch_feed(test_url, test_cache_file)
+        print(f"First fetch:  {first['status']} ({first['elapsed'] * 1000:.1f} ms)")
+        assert first['status'] == STATUS_MODIFIED
+        save_feed_cache(test_cache_file, test_url, first['validators'])
+
+        second = fetch_feed(test_url, test_cache_file)
+        print(f"Second fetch: {second['status']} ({second['elapsed'] * 1000:.1f} ms)")
+        assert second['status'] == STATUS_NOT_MODIFIED
+
+        # A server without validators falls back to the body hash comparison.
+        StandInFeedHandler.honour_validators = False
+        save_feed_cache(test_cache_file, test_url, {'etag': None, 'last_modified': None,
+                                                   'body_sha256': first['validators']['body_sha256']})
+        third = fetch_feed(test_url, test_cache_file)
+        print(f"Third fetch:  {third['status']} ({third['elapsed'] * 1000:.1f} ms)")
+        assert third['status'] == STATUS_UNCHANGED
+
+    server.shutdown()
+    print("--- feed_fetcher.py self-check passed ---")
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import random
+import time
+from urllib.parse import urlsplit
+import httpx
+from feed_fetcher import (
+    USER_AGENT, FETCH_TIMEOUT_SECONDS, STATUS_NOT_MODIFIED, STATUS_UNCHANGED, STATUS_MODIFIED,
+    STATUS_ERROR, load_feed_cache, build_conditional_headers, validators_from_response, parse_max_age,
+)
+
+# Concurrent conditional GETs for many feeds at once.
+# All feeds share one httpx.AsyncClient (one keep-alive connection pool); a
+# per-host semaphore keeps us polite towards stand.fm, and a small random
+# jitter spreads the requests so hundreds of feeds do not hit the host in the
+# same millisecond. Results have the same shape as feed_fetcher.fetch_feed(),
+# so callers can treat one feed and many feeds the same way.
+
+DEFAULT_PER_HOST_LIMIT = 4
+DEFAULT_JITTER_SECONDS = 1.0
+MAX_CONNECTIONS = 100
+
+def _check_url(url) -> str:
+    """
+    Returns the host of a feed URL, or raises httpx.InvalidURL if it cannot be fetched.
+
+    httpx accepts some of these (an empty host, a port above 65535) and only
+    fails deep inside the transport with an exception that is not an
+    httpx.HTTPError, so they are rejected before the request is made.
+    """
+    try:
+        parsed = httpx.URL(url)
+        netloc = urlsplit(url).netloc
+    except (TypeError, ValueError) as e:  # Not a string / malformed IPv6 host
+        raise httpx.InvalidURL(f"Invalid feed URL {url!r}: {e}") from e
+    if parsed.scheme not in ('http', 'https') or not parsed.host:
+        raise httpx.InvalidURL(f"Invalid feed URL {url!r}: expected http(s)://host/...")
+    if parsed.port is not None and not 0 < parsed.port < 65536:
+        raise httpx.InvalidURL(f"Invalid feed URL {url!r}: port {parsed.port} out of range")
+    return netloc
+
+async def _poll_one(client, url: str, cached: dict | None, host_limits: dict,
+                    per_host_limit: int, jitter_seconds: float) -> dict:
+    """Fetches one feed conditionally, waiting for a free slot on its host."""
+    # A malformed rss_url (typo in the config) must fail its own feed, not the whole pass.
+    try:
+        host = _check_url(url)
+    except httpx.InvalidURL as e:
+        return {'url': url, 'status': STATUS_ERROR, 'body': None, 'validators': None,
+                'elapsed': 0.0, 'error': str(e)}
+    if jitter_seconds > 0:
+        await asyncio.sleep(random.uniform(0, jitter_seconds))
+    semaphore = host_limits.setdefault(host, asyncio.Semaphore(per_host_limit))
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            response = await client.get(url, headers=build_conditional_headers(cached))
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            return {'url': url, 'status': STATUS_ERROR, 'body': None, 'validators': None,
+                    'elapsed': time.perf_counter() - started, 'error': str(e) or type(e).__name__}
+        elapsed = time.perf_counter() - started
+
+    max_age = parse_max_age(response.headers.get('Cache-Control'))
+    if response.status_code == 304:
+        return {'url': url, 'status': STATUS_NOT_MODIFIED, 'body': None,
+                'validators': validators_from_response(response.headers, None, cached),
+                'elapsed': elapsed, 'error': None, 'max_age': max_age}
+    if response.status_code != 200:
+        return {'url': url, 'status': STATUS_ERROR, 'body': None, 'validators': None,
+                'elapsed': elapsed, 'error': f"Unexpected HTTP status {response.status_code}"}
+
+    body = response.content
+    body_sha256 = hashlib.sha256(body).hexdigest()
+    validators = validators_from_response(response.headers, body_sha256)
+    if cached and cached.get('body_sha256') == body_sha256:
+        return {'url': url, 'status': STATUS_UNCHANGED, 'body': None, 'validators': validators,
+                'elapsed': elapsed, 'error': None, 'max_age': max_age}
+    return {'url': url, 'status': STATUS_MODIFIED, 'body': body, 'validators': validators,
+            'elapsed': elapsed, 'error': None, 'max_age': max_age}
+
+async def poll_feeds(urls: list[str], cache_file: str, per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+                     jitter_seconds: float = DEFAULT_JITTER_SECONDS,
+                     timeout: float = FETCH_TIMEOUT_SECONDS, unconditional_urls=()) -> list[dict]:
+    """
+    Polls many feeds concurrently with conditional GETs.
+
+    Args:
+        urls: Feed URLs. Duplicates are fetched once.
+        cache_file: The feed_fetcher validator cache shared by all feeds.
+        per_host_limit: Maximum simultaneous requests to any single host.
+        jitter_seconds: Each request starts after a random delay in [0, jitter_seconds].
+        timeout: Per-request timeout in seconds.
+        unconditional_urls: URLs to fetch without validators, e.g. to (re)learn
+                            a feed's publish history.
+
+    Returns:
+        One result dict per input URL, in input order, shaped like
+        feed_fetcher.fetch_feed() plus 'url' and 'max_age' (Cache-Control)
+        keys. The validators are not saved here; call
+        feed_fetcher.save_feed_cache_many() after processing.
+    """
+    cache = load_feed_cache(cache_file)
+    unique_urls = list(dict.fromkeys(urls))
+    host_limits = {}
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits, follow_redirects=True,
+                                 headers={"User-Agent": USER_AGENT}) as client:
+        results = await asyncio.gather(*(
+            _poll_one(client, url, None if url in unconditional_urls else cache.get(url),
+                      host_limits, per_host_limit, jitter_seconds)
+            for url in unique_urls
+        ))
+    by_url = dict(zip(unique_urls, results))
+    return [by_url[url] for url in urls]
+
+def poll_feeds_sync(urls: list[str], cache_file: str, **kwargs) -> list[dict]:
+    """Blocking wrapper around poll_feeds() for synchronous callers such as rss_monitor."""
+    return asyncio.run(poll_feeds(urls, cache_file, **kwargs))
+
+if __name__ == '__main__':
+    # Self-check against a local stand-in server whose feeds answer slowly.
+    # Run with: python src/feed_poller.py
+    import os
+    import tempfile
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs
+
+    feed_body = b'<?xml version="1.0"?><rss version="2.0"><channel><title>Test</title></channel></rss>'
+    etag = '"' + hashlib.sha256(feed_body).hexdigest()[:16] + '"'
+    feed_count, slowest_seconds = 12, 0.4
+    served = {'requests': 0, 'active': 0, 'max_active': 0}
+    served_lock = threading.Lock()
+
+    class SlowFeedHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with served_lock:
+                served['requests'] += 1
+                served['active'] += 1
+                served['max_active'] = max(served['max_active'], served['active'])
+            try:
+                time.sleep(float(parse_qs(urlsplit(self.path).query)['delay'][0]))
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/rss+xml')
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'max-age=300')
+                self.send_header('Content-Length', str(len(feed_body)))
+                self.end_headers()
+                self.wfile.write(feed_body)
+            finally:
+                with served_lock:
+                    served['active'] -= 1
+
+        def log_message(self, format, *args):
+            pass
+
+    class StandInServer(ThreadingHTTPServer):
+        request_queue_size = 64  # The default backlog of 5 drops connects and adds a 1 s SYN retry
+
+    server = StandInServer(('127.0.0.1', 0), SlowFeedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    # Delays spread up to slowest_seconds; one after the other they would take about half of feed_count * slowest_seconds.
+    slow_urls = [f"{base}/rss/{i}?delay={slowest_seconds * (i + 1) / feed_count:.3f}" for i in range(feed_count)]
+    broken_urls = ['', 'not a url', 'ftp://example.com/rss', 'http://[::1/rss', 'http://127.0.0.1:99999/rss']
+    urls = broken_urls[:2] + slow_urls + [slow_urls[0]] + broken_urls[2:]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_file = os.path.join(tmp_dir, 'feed_cache.json')
+        started = time.perf_counter()
+        results = poll_feeds_sync(urls, cache_file, per_host_limit=feed_count, jitter_seconds=0)
+        wall = time.perf_counter() - started
+        print(f"{feed_count} feeds answering in up to {slowest_seconds * 1000:.0f} ms: {wall * 1000:.0f} ms in total")
+        assert [result['url'] for result in results] == urls
+        assert all(result['status'] == STATUS_ERROR and result['error'] for result in results if result['url'] in broken_urls)
+        assert all(result['status'] == STATUS_MODIFIED and result['max_age'] == 300 for result in results if result['url'] in slow_urls)
+        assert served['requests'] == feed_count, served  # Broken URLs never reach the network, duplicates are fetched once
+        assert wall < slowest_seconds + 0.5, wall        # About the slowest feed, not the sum of all of them
+
+        # The per-host limit holds, at the cost of running in waves.
+        served['max_active'] = 0
+        results = poll_feeds_sync(slow_urls, cache_file, per_host_limit=3, jitter_seconds=0)
+        assert served['max_active'] <= 3 and all(result['status'] == STATUS_MODIFIED for result in results), served
+
+        # With validators saved, the next pass is conditional.
+        from feed_fetcher import save_feed_cache_many
+        save_feed_cache_many(cache_file, {result['url']: result['validators'] for result in results})
+        results = poll_feeds_sync(slow_urls + broken_urls, cache_file, per_host_limit=feed_count, jitter_seconds=0)
+        assert all(result['status'] == STATUS_NOT_MODIFIED for result in results[:feed_count]), results[0]
+        assert all(result['status'] == STATUS_ERROR for result in results[feed_count:])
+
+    server.shutdown()
+    print("--- feed_poller.py self-check passed ---")
@@ -0,0 +1,232 @@
+import os
+import sys
+import copy
+import json
+import atexit
+import queue
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+# One logging setup for every script in src/.
+# Library modules only do `logger = logging.getLogger(__name__)`; entry points
+# (the `__main__` blocks) call configure_logging() once. Callers only pay for
+# putting a record on an in-memory queue; a QueueListener thread formats the
+# records and writes them as JSON lines to a rotating file, plus a short
+# human-readable line to stderr (stdout stays free for machine-readable
+# output such as voicy_scraper's result line).
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LOG_FILE = os.environ.get("LOG_FILE", os.path.join(PROJECT_ROOT, "logs", "automation.jsonl"))
+DEFAULT_LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+# Per-module levels, e.g. LOG_LEVELS="voicy_scraper=DEBUG,webhook_outbox=WARNING"
+LOG_LEVELS_ENV = os.environ.get("LOG_LEVELS", "")
+# Size-based rotation by default; set LOG_ROTATE_WHEN (e.g. "midnight", "H") for time-based rotation
+LOG_ROTATE_MAX_BYTES = int(os.environ.get("LOG_ROTATE_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN")
+LOG_ROTATE_BACKUPS = int(os.environ.get("LOG_ROTATE_BACKUPS", "5"))
+# LOG_CONSOLE=0 turns the stderr copy off (rss_monitor sets it for the voicy_scraper child it runs)
+LOG_CONSOLE = os.environ.get("LOG_CONSOLE", "1") != "0"
+CONSOLE_FORMAT = "[%(asctime)s] %(levelname)s %(name)s: %(message)s"
+CONSOLE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Chatty third-party loggers; LOG_LEVELS can override these too.
+DEFAULT_MODULE_LEVELS = {
+    "httpx": "WARNING",
+    "httpcore": "WARNING",
+    "urllib3": "WARNING",
+    "selenium": "WARNING",
+}
+
+# Attributes every LogRecord has; anything else came in through `extra=` and is kept in the JSON line.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+class JsonLineFormatter(logging.Formatter):
+    """Formats a record as one JSON object: ts, level, logger, msg, any `extra` fields and exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+# msg % args of these types formats the same later on the listener thread
+_PLAIN_ARG_TYPES = (str, int, float, bool, type(None))
+
+class _MessageQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that does as little as possible in the caller.
+
+    A plain record (str message, args of immutable types, no exception) goes
+    on the queue as it is and is formatted by the listener. Otherwise msg %
+    args is merged now, before the args can change, and the traceback is
+    kept in exc_text so the JSON line gets its own "exc" field (the stock
+    prepare() formats it into the message).
+    """
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # SimpleQueue.put is thread-safe, so the handler lock is not needed.
+        rv = self.filter(record)
+        if rv:
+            self.emit(rv if isinstance(rv, logging.LogRecord) else record)
+        return rv
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if (record.exc_info is None and isinstance(record.msg, str)
+                and (not args or isinstance(args, tuple) and all(type(arg) in _PLAIN_ARG_TYPES for arg in args))):
+            return record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def parse_module_levels(spec: str) -> dict:
+    """Parses "name=LEVEL,name=LEVEL" into a dict. Malformed entries are ignored."""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def _file_handler(log_file: str) -> logging.Handler:
+    directory = os.path.dirname(log_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=LOG_ROTATE_WHEN, backupCount=LOG_ROTATE_BACKUPS, encoding="utf-8", utc=True
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_ROTATE_MAX_BYTES, backupCount=LOG_ROTATE_BACKUPS, encoding="utf-8"
+        )
+    handler.setFormatter(JsonLineFormatter())
+    return handler
+
+def configure_logging(log_file: str | None = DEFAULT_LOG_FILE, level: str = DEFAULT_LOG_LEVEL,
+                      module_levels: dict | None = None, console: bool = LOG_CONSOLE):
+    """
+    Routes all logging through a background queue to a rotating JSON-lines file and stderr.
+
+    Safe to call more than once; later calls replace the earlier setup.
+
+    Args:
+        log_file: JSON-lines log file, or None for console only.
+        level: Root level name (LOG_LEVEL).
+        module_levels: Extra {logger name: level name} overrides, applied
+                       after DEFAULT_MODULE_LEVELS and LOG_LEVELS.
+        console: Also write a readable line per record to stderr.
+    """
+    global _listener
+    shutdown_logging()
+
+    handlers = []
+    if log_file:
+        handlers.append(_file_handler(log_file))
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT, CONSOLE_DATE_FORMAT))
+        handlers.append(console_handler)
+
+    # Neither line shows the caller's file and line, thread or process; skip collecting
+    # them on every call (see "Optimization" in the logging HOWTO).
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_MessageQueueHandler(log_queue))
+    root.setLevel(level.upper())
+    for name, module_level in {**DEFAULT_MODULE_LEVELS, **parse_module_levels(LOG_LEVELS_ENV), **(module_levels or {})}.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread (also runs at interpreter exit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(shutdown_logging)
+
+if __name__ == '__main__':
+    # Compares the caller-side cost of a queued log call with the old open-append-close per line.
+    # The caller's cost is its own thread's CPU time; wall time in this tight loop also
+    # includes the listener formatting and writing the lines, which shares the GIL.
+    # Usage: python src/log_setup.py [path to a scratch log file]
+    import tempfile
+    import time
+
+    scratch = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.mkdtemp(), "bench.jsonl")
+    count, rounds = 10000, 3
+
+    def per_call_us(log_line) -> tuple[float, float]:
+        """Best of `rounds` (caller thread CPU, wall) microseconds per call."""
+        best = []
+        for _ in range(rounds):
+            started, started_cpu = time.perf_counter(), time.thread_time()
+            for i in range(count):
+                log_line(i)
+            best.append(((time.thread_time() - started_cpu) / count * 1e6, (time.perf_counter() - started) / count * 1e6))
+        return min(best)
+
+    def append_line(i: int):
+        with open(scratch + ".txt", "a", encoding="utf-8") as f:
+            f.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Polled feed {i}\n")
+    append_us, append_wall_us = per_call_us(append_line)
+
+    configure_logging(scratch, console=False)
+    bench_logger = logging.getLogger("log_setup.bench")
+    queued_us, queued_wall_us = per_call_us(
+        lambda i: bench_logger.info("Polled feed %d", i, extra={"feed": "bench", "status": "not_modified"}))
+    shutdown_logging()
+
+    with open(scratch, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    print(f"open-append-close: {append_us:.1f} us per line on the caller's thread ({append_wall_us:.1f} us wall); "
+          f"queued JSON logging: {queued_us:.1f} us per call ({queued_wall_us:.1f} us wall with the listener) "
+          f"({len(lines)} lines written to {scratch})")
+    print(lines[-1].strip())
+    assert len(lines) == count * rounds and json.loads(lines[-1])["msg"] == f"Polled feed {count - 1}"
+    assert queued_us <= append_us, (queued_us, append_us)
+
+    # Records with mutable args or a traceback are still merged in the caller.
+    configure_logging(scratch, console=False)
+    changing = ["before"]
+    bench_logger.info("Args %s", changing)
+    changing[0] = "after"
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        bench_logger.exception("Failed %d", 1)
+    shutdown_logging()
+    with open(scratch, "r", encoding="utf-8") as f:
+        tail = [json.loads(line) for line in f.readlines()[-2:]]
+    assert tail[0]["msg"] == "Args ['before']" and tail[1]["msg"] == "Failed 1" and "ValueError: boom" in tail[1]["exc"]
+    print("--- log_setup.py self-check passed ---")
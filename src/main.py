@@ -1 +1,697 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import rss_checker
+from audio_processor import (
+    download_audio, audio_filename, transcribe_audio, AUDIO_DOWNLOAD_DIR, MAX_PARALLEL_DOWNLOADS,
+    TRANSCRIBE_SERVICE_AUTOSTART,
+)
+from transcript_cache import TranscriptCache
+from text_summarizer import summarize_transcript, get_backend
+from voicy_scraper import scrape_latest_voicy_episode
+from voicy_index import VoicyEpisodeIndex, resolve_voicy_episode
+from webhook_sender import build_payload
+from webhook_outbox import WebhookOutbox, WebhookDeliverer, DEFAULT_OUTBOX_PATH, STATUS_SENT as OUTBOX_SENT, STATUS_DEAD as OUTBOX_DEAD
+from worker_leases import WorkerCoordinator, open_lease_store, WORKER_LEASES, WORKER_ID
+from log_setup import configure_logging
+from metrics import span, start_metrics_server, write_run_report
+from episode_ledger import (
+    EpisodeLedger, STAGE_SCRAPED, STAGE_DOWNLOADED, STAGE_TRANSCRIBED, STAGE_SUMMARIZED, STAGE_SENT,
+    STATUS_DONE, STATUS_SKIPPED, STATUS_QUEUED, STATUS_FAILED,
+)
 
+# End-to-end pipeline for the feed in STANDFM_RSS_URL:
+# detect (rss_checker) -> resolve the Voicy URL -> download -> transcribe ->
+# summarise -> deliver (webhook outbox).
+# Every stage has its own thread pool, and an episode is handed to the next
+# stage's pool as soon as it leaves the previous one, so a long transcription
+# only occupies the transcribe pool while other episodes are detected,
+# resolved and delivered. Each finished stage is checkpointed in the episode
+# ledger (one row per episode and stage, the stage's output as payload). A
+# failure stops only that episode; the next run resumes every unfinished
+# episode from its first missing checkpoint. Repeating a stage is harmless:
+# downloads resume, transcripts and summaries are cached, and the outbox
+# queues an episode only once.
+
+VOICY_CHANNEL_URL = os.environ.get("VOICY_CHANNEL_URL", "https://voicy.jp/channel/821320")
+# "match": the Voicy episode matching the stand.fm title and date (voicy_index); "latest": the newest one on the page
+VOICY_RESOLVE_MODE = os.environ.get("VOICY_RESOLVE_MODE", "match").lower()
+WEBHOOK_URL_ENV = "MAKE_WEBHOOK_URL"
+# How long a run keeps retrying webhook deliveries before leaving them in the outbox
+WEBHOOK_DRAIN_SECONDS = float(os.environ.get("WEBHOOK_DRAIN_SECONDS", "60"))
+# Pool size per stage name; PIPELINE_WORKERS overrides some of them (e.g. "download=2,summarize=4")
+DEFAULT_STAGE_WORKERS = {
+    "resolve": 2,
+    "download": MAX_PARALLEL_DOWNLOADS,
+    "transcribe": 1,   # transcribe_audio() already spreads one episode over WHISPER_WORKERS processes
+    "summarize": 2,
+    "deliver": 1,      # Enqueueing is one SQLite insert; the drain passes run here too
+}
+PIPELINE_WORKERS = os.environ.get("PIPELINE_WORKERS", "")
+# Episodes one run works on at once (0: no cap). With WORKER_LEASES it defaults to 4, so the
+# other workers find unclaimed episodes in a backlog instead of the first worker claiming all of them.
+PIPELINE_MAX_ACTIVE = int(os.environ.get("PIPELINE_MAX_ACTIVE", "0"))
+COORDINATED_MAX_ACTIVE = 4
+
+# Pseudo stage indexes of the scheduler's own jobs
+_DETECT = -1
+_DRAIN = -2
+
+logger = logging.getLogger(__name__)
+
+class PipelineError(Exception):
+    """Raised by a stage that could not produce its output; the episode is retried from that stage."""
+
+@dataclass
+class Stage:
+    """
+    One step of the pipeline.
+
+    Attributes:
+        name: Short name, used in logs and PIPELINE_WORKERS.
+        checkpoint: Ledger stage recorded when the step succeeds.
+        run: run(episode, outputs) -> payload, where outputs maps the
+             checkpoints of the earlier stages to their payloads. Returning
+             None records the stage as skipped (nothing to do for this
+             episode); raising leaves the episode at this stage.
+        workers: Size of the stage's thread pool.
+        status: Ledger status recorded on success.
+        reusable: Optional reusable(payload) -> bool; False makes a resumed
+                  episode repeat the stage (e.g. the downloaded file is gone)
+                  unless the next stage is already checkpointed.
+        rate_per_minute: Optional cap on how often the stage starts, across
+                         its workers (e.g. requests to a rate-limited host).
+    """
+    name: str
+    checkpoint: str
+    run: Callable[[dict, dict], dict | None]
+    workers: int = 1
+    status: str = STATUS_DONE
+    reusable: Callable[[dict], bool] | None = None
+    rate_per_minute: float | None = None
+
+def parse_stage_workers(spec: str) -> dict:
+    """Parses "download=2,transcribe=1" into {'download': 2, 'transcribe': 1}."""
+    workers = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, count = item.partition("=")
+        if not count.strip().isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid stage worker count: {item!r}")
+        workers[name.strip()] = int(count)
+    return workers
+
+def parse_stage_rates(spec: str) -> dict:
+    """Parses "resolve=30,deliver=60" (starts per minute) into {'resolve': 30.0, 'deliver': 60.0}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        try:
+            rates[name.strip()] = float(rate)
+        except ValueError:
+            raise ValueError(f"Invalid stage rate: {item!r}") from None
+        if rates[name.strip()] <= 0:
+            raise ValueError(f"Invalid stage rate: {item!r}")
+    return rates
+
+class RateLimiter:
+    """Spaces calls at least 60 / per_minute seconds apart, across threads."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the caller's slot comes up."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class Pipeline:
+    """
+    Moves the episodes of one feed through a list of stages, concurrently across episodes.
+
+    Usage:
+        with EpisodeLedger(path) as ledger:
+            stats = Pipeline(ledger, feed_url, build_stages(...), detect=check_new_episodes).run()
+    """
+
+    def __init__(self, ledger: EpisodeLedger, feed: str, stages: list[Stage], detect: Callable[[], list] | None = None,
+                 deliverer: WebhookDeliverer | None = None, drain_seconds: float = WEBHOOK_DRAIN_SECONDS,
+                 max_active: int | None = None, progress_seconds: float | None = None,
+                 coordinator: WorkerCoordinator | None = None):
+        """
+        Args:
+            ledger: Where detected episodes and stage checkpoints live.
+            feed: Feed key of the episodes in the ledger (the RSS URL).
+            stages: The steps after detection, in order. The last one's
+                    checkpoint decides which episodes are still unfinished.
+            detect: Optional callable that records new episodes as detected
+                    and returns them; it runs alongside the resumed episodes.
+            deliverer: Drains the webhook outbox after each queued delivery
+                       and at the end of the run, recording the outcomes.
+            drain_seconds: Retry budget of the final drain.
+            max_active: Optional cap on episodes between stages at once; the
+                        rest wait their turn (oldest first), so a backlog of
+                        thousands is not all downloaded before any of it is
+                        transcribed.
+            progress_seconds: If given, logs progress and an ETA this often.
+            coordinator: Optional worker_leases.WorkerCoordinator shared with
+                         pipelines on other hosts: an episode is only run
+                         while this worker holds its lease, detection only
+                         by the holder of the feed's lease, and the outbox is
+                         drained by one worker at a time.
+        """
+        self.ledger = ledger
+        self.feed = feed
+        self.stages = stages
+        self.detect = detect
+        self.deliverer = deliverer
+        self.drain_seconds = drain_seconds
+        self.max_active = max_active
+        self.progress_seconds = progress_seconds
+        self.coordinator = coordinator
+        self.stats = {"detected": 0, "resumed": 0, "completed": 0, "failed": 0}
+        self._drain_lock = threading.Lock()
+        self._limiters = {stage.name: RateLimiter(stage.rate_per_minute) for stage in stages if stage.rate_per_minute}
+
+    def resume_point(self, episode: dict) -> tuple[int, dict]:
+        """Returns (index of the first stage without a usable checkpoint, outputs of the stages before it)."""
+        recorded = self.ledger.stages(self.feed, episode["guid"])
+        outputs = {}
+        for index, stage in enumerate(self.stages):
+            row = recorded.get(stage.checkpoint)
+            if row is None:
+                return index, outputs
+            # An unusable output only matters while the next stage still needs it.
+            needed = index + 1 < len(self.stages) and self.stages[index + 1].checkpoint not in recorded
+            if (needed and row["status"] != STATUS_SKIPPED and stage.reusable is not None
+                    and not stage.reusable(row["payload"] or {})):
+                return index, outputs
+            outputs[stage.checkpoint] = row["payload"]
+        return len(self.stages), outputs
+
+    def _run_stage(self, stage: Stage, episode: dict, outputs: dict):
+        limiter = self._limiters.get(stage.name)
+        if limiter is not None:
+            limiter.wait()
+        started = time.perf_counter()
+        with span("pipeline_stage", stage=stage.name):
+            payload = stage.run(episode, outputs)
+        logger.info(f"[{stage.name}] {episode['guid']} {'skipped' if payload is None else 'done'} "
+                    f"in {time.perf_counter() - started:.2f}s.")
+        return payload
+
+    def _may_drain(self) -> bool:
+        """Only one worker drains the shared outbox at a time, so no event is POSTed twice."""
+        return self.coordinator is None or self.coordinator.claim("outbox")
+
+    def _drain(self, budget_seconds: float):
+        """Delivers due outbox events and records each outcome on the episode's sent checkpoint."""
+        with self._drain_lock:
+            results = self.deliverer.drain(budget_seconds)
+        for result in results:
+            if not result.get("ref") or result["status"] not in (OUTBOX_SENT, OUTBOX_DEAD):
+                continue
+            feed, guid = json.loads(result["ref"])
+            delivered = result["status"] == OUTBOX_SENT
+            self.ledger.record(feed, guid, STAGE_SENT, status=STATUS_DONE if delivered else STATUS_FAILED)
+            if delivered:
+                logger.info(f"Delivered {guid} to the webhook.")
+            else:
+                logger.error(f"Giving up delivering {guid} to the webhook: {result['error']}")
+
+    def run(self, episodes: list | None = None) -> dict:
+        """
+        Runs detection and every unfinished episode through the remaining stages.
+
+        Args:
+            episodes: Only run these (ledger episode dicts) instead of every
+                      unfinished episode of the feed.
+
+        Returns:
+            Counts for this run: 'detected', 'resumed' (started past the first
+            stage), 'completed', 'failed', plus 'elapsed' in seconds.
+        """
+        started = time.perf_counter()
+        executors = [ThreadPoolExecutor(max_workers=max(1, stage.workers), thread_name_prefix=f"pipeline-{stage.name}")
+                     for stage in self.stages]
+        detect_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-detect")
+        in_flight = {} # future -> (stage index or _DETECT / _DRAIN, episode, outputs)
+        scheduled = set() # GUIDs already moving through the pipeline in this run
+        waiting = deque() # episodes held back by max_active
+        active = set() # GUIDs between stages right now
+        admitted = 0
+        last_progress = time.perf_counter()
+
+        def schedule(index: int, episode: dict, outputs: dict):
+            future = executors[index].submit(self._run_stage, self.stages[index], episode, outputs)
+            in_flight[future] = (index, episode, outputs)
+
+        def admit(episodes: list):
+            nonlocal admitted
+            for episode in episodes:
+                if episode["guid"] in scheduled:
+                    continue
+                scheduled.add(episode["guid"])
+                admitted += 1
+                waiting.append(episode)
+            start_waiting()
+
+        def start_waiting():
+            nonlocal admitted
+            while waiting and (self.max_active is None or len(active) < self.max_active):
+                episode = waiting.popleft()
+                # Claimed only when it starts, so idle workers elsewhere pick up the rest of a backlog.
+                lease = f"episode:{self.feed}:{episode['guid']}"
+                if self.coordinator is not None and not self.coordinator.claim(lease):
+                    admitted -= 1
+                    continue
+                index, outputs = self.resume_point(episode)
+                if index >= len(self.stages):
+                    admitted -= 1
+                    if self.coordinator is not None:
+                        self.coordinator.release(lease)
+                    continue
+                active.add(episode["guid"])
+                if index:
+                    self.stats["resumed"] += 1
+                    logger.info(f"Resuming {episode['guid']} at {self.stages[index].name}.")
+                schedule(index, episode, outputs)
+
+        def finish(episode: dict):
+            active.discard(episode["guid"])
+            if self.coordinator is not None:
+                self.coordinator.release(f"episode:{self.feed}:{episode['guid']}")
+            start_waiting()
+
+        def log_progress():
+            finished = self.stats["completed"] + self.stats["failed"]
+            elapsed = time.perf_counter() - started
+            eta = f", about {elapsed / finished * (admitted - finished) / 60:.0f} min left" if finished else ""
+            logger.info(f"Progress: {finished}/{admitted} finished ({self.stats['failed']} failed), "
+                        f"{len(active)} in progress, {len(waiting)} waiting{eta}.")
+
+        try:
+            if self.detect is not None and (self.coordinator is None or self.coordinator.claim(f"feed:{self.feed}")):
+                in_flight[detect_executor.submit(self.detect)] = (_DETECT, None, None)
+            # Episodes left unfinished by earlier runs start right away, alongside detection.
+            admit(episodes if episodes is not None else self.ledger.pending(self.feed, self.stages[-1].checkpoint))
+            while in_flight:
+                done, _ = wait(in_flight, timeout=self.progress_seconds, return_when=FIRST_COMPLETED)
+                if self.progress_seconds and time.perf_counter() - last_progress >= self.progress_seconds:
+                    last_progress = time.perf_counter()
+                    log_progress()
+                for future in done:
+                    index, episode, outputs = in_flight.pop(future)
+                    if index == _DETECT:
+                        try:
+                            detected = future.result()
+                        except Exception as e:
+                            logger.error(f"Detection failed: {e}")
+                            continue
+                        self.stats["detected"] += len(detected)
+                        logger.info(f"Detected {len(detected)} new episode(s).")
+                        admit(detected)
+                        continue
+                    if index == _DRAIN:
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logger.error(f"Error while delivering webhook events: {e}")
+                        continue
+
+                    stage = self.stages[index]
+                    try:
+                        payload = future.result()
+                    except Exception as e:
+                        self.stats["failed"] += 1
+                        logger.error(f"[{stage.name}] {episode['guid']} failed: {e}. It resumes from this stage on the next run.")
+                        finish(episode)
+                        continue
+                    status = stage.status if payload is not None else STATUS_SKIPPED
+                    self.ledger.record(self.feed, episode["guid"], stage.checkpoint, payload, status)
+                    if status == STATUS_QUEUED and self.deliverer is not None and self._may_drain():
+                        in_flight[executors[index].submit(self._drain, 0)] = (_DRAIN, None, None)
+                    if index + 1 < len(self.stages):
+                        schedule(index + 1, episode, dict(outputs, **{stage.checkpoint: payload}))
+                    else:
+                        self.stats["completed"] += 1
+                        finish(episode)
+        finally:
+            detect_executor.shutdown(wait=True, cancel_futures=True)
+            for executor in executors:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        if self.coordinator is not None:
+            self.coordinator.release(f"feed:{self.feed}")
+        if self.deliverer is not None and self._may_drain():
+            # Retry anything the per-episode passes could not deliver yet, including earlier runs' events.
+            self._drain(self.drain_seconds)
+            still_pending = self.deliverer.outbox.pending_count()
+            if still_pending:
+                logger.info(f"{still_pending} webhook event(s) left in the outbox for a later retry.")
+        self.stats["elapsed"] = time.perf_counter() - started
+        logger.info(f"Pipeline finished in {self.stats['elapsed']:.1f}s: {self.stats['detected']} detected, "
+                    f"{self.stats['resumed']} resumed, {self.stats['completed']} completed, {self.stats['failed']} failed.")
+        return self.stats
+
+def build_stages(feed: str, outbox: WebhookOutbox, webhook_url: str | None, transcript_cache: TranscriptCache | None = None,
+                 summary_backend=None, workers: dict | None = None, voicy_channel_url: str = VOICY_CHANNEL_URL,
+                 audio_dir: str = AUDIO_DOWNLOAD_DIR, voicy_index: VoicyEpisodeIndex | None = None,
+                 rates: dict | None = None, start_transcriber: bool = TRANSCRIBE_SERVICE_AUTOSTART) -> list[Stage]:
+    """
+    Builds the resolve -> download -> transcribe -> summarize -> deliver stages.
+
+    Args:
+        feed: Feed key, used in the outbox ref that ties an event to its episode.
+        outbox: Where the deliver stage queues the webhook event.
+        webhook_url: Make.com webhook; without one delivery is skipped.
+        transcript_cache: Transcript cache passed to transcribe_audio().
+        summary_backend: text_summarizer backend (default: get_backend() per call).
+        workers: Pool sizes by stage name, on top of DEFAULT_STAGE_WORKERS.
+        voicy_channel_url: Channel the Voicy URL is resolved from.
+        audio_dir: Download directory.
+        voicy_index: If given, each episode is matched to its Voicy episode by
+                     title and date; otherwise the channel's newest episode is taken.
+        rates: Optional starts per minute by stage name (see parse_stage_rates()).
+        start_transcriber: Start the resident transcription service if it is
+                           not running, instead of loading the model per run.
+    """
+    workers = dict(DEFAULT_STAGE_WORKERS, **(workers or {}))
+    rates = rates or {}
+
+    def resolve(episode: dict, outputs: dict) -> dict:
+        if voicy_index is not None:
+            result = resolve_voicy_episode(voicy_channel_url, episode, voicy_index)
+        else:
+            result = scrape_latest_voicy_episode(voicy_channel_url)
+        if not result.url:
+            raise PipelineError(f"no Voicy URL found: {result.error}")
+        return {"voicy_url": result.url, "method": result.method}
+
+    def download(episode: dict, outputs: dict) -> dict | None:
+        if not episode.get("audio_url"):
+            return None
+        result = download_audio(episode["audio_url"], os.path.join(audio_dir, audio_filename(episode)),
+                                episode.get("audio_sha256"))
+        if result["error"]:
+            raise PipelineError(result["error"])
+        return {"path": result["path"], "bytes": result["bytes"], "sha256": result["sha256"]}
+
+    def transcribe(episode: dict, outputs: dict) -> dict | None:
+        audio = outputs.get(STAGE_DOWNLOADED)
+        if not audio:
+            return None
+        try:
+            transcript = transcribe_audio(audio["path"], cache=transcript_cache, audio_sha256=audio.get("sha256"),
+                                          start_service=start_transcriber)
+        except ImportError as e:
+            # whisper / numpy are optional; deliver the Voicy URL without a summary rather than never.
+            logger.warning(f"Cannot transcribe {episode['guid']} ({e}); continuing without a transcript.")
+            return None
+        return {"text": transcript["text"], "audio_seconds": transcript["audio_seconds"],
+                "segment_count": transcript["segment_count"], "cached": transcript["cached"]}
+
+    def summarize(episode: dict, outputs: dict) -> dict | None:
+        transcript = outputs.get(STAGE_TRANSCRIBED)
+        if not transcript or not transcript["text"].strip():
+            return None
+        result = summarize_transcript(transcript["text"], summary_backend)
+        return {"summary": result["summary"], "backend": result["backend"], "calls": result["calls"]}
+
+    def deliver(episode: dict, outputs: dict) -> dict | None:
+        if not webhook_url:
+            logger.warning(f"{WEBHOOK_URL_ENV} is not set. Skipping webhook call for {episode['guid']}.")
+            return None
+        voicy_url = outputs[STAGE_SCRAPED]["voicy_url"]
+        payload = build_payload(voicy_url)
+        summary = (outputs.get(STAGE_SUMMARIZED) or {}).get("summary")
+        if summary:
+            payload["summary"] = summary
+        outbox.enqueue(webhook_url, payload, ref=json.dumps([feed, episode["guid"]]))
+        return {"voicy_url": voicy_url, "summary": summary}
+
+    return [
+        Stage("resolve", STAGE_SCRAPED, resolve, workers["resolve"], rate_per_minute=rates.get("resolve")),
+        Stage("download", STAGE_DOWNLOADED, download, workers["download"],
+              reusable=lambda payload: bool(payload.get("path")) and os.path.exists(payload["path"]),
+              rate_per_minute=rates.get("download")),
+        Stage("transcribe", STAGE_TRANSCRIBED, transcribe, workers["transcribe"], rate_per_minute=rates.get("transcribe")),
+        Stage("summarize", STAGE_SUMMARIZED, summarize, workers["summarize"], rate_per_minute=rates.get("summarize")),
+        Stage("deliver", STAGE_SENT, deliver, workers["deliver"], status=STATUS_QUEUED, rate_per_minute=rates.get("deliver")),
+    ]
+
+def run_pipeline(detect: bool = True, workers: dict | None = None, coordinator: WorkerCoordinator | None = None,
+                 start_transcriber: bool = TRANSCRIBE_SERVICE_AUTOSTART) -> dict:
+    """
+    Runs the pipeline once for STANDFM_RSS_URL, using rss_checker's ledger. Returns Pipeline.run()'s counts.
+
+    With a coordinator, several of these runs (on other hosts sharing the
+    ledger and outbox) split the episodes between them.
+    """
+    feed_url = os.environ.get("STANDFM_RSS_URL")
+    if not feed_url:
+        logger.error("STANDFM_RSS_URL environment variable not set.")
+        return {}
+    summary_backend = get_backend()
+    voicy_index = VoicyEpisodeIndex() if VOICY_RESOLVE_MODE == "match" else None
+    with EpisodeLedger(rss_checker.LEDGER_FILE) as ledger, WebhookOutbox() as outbox, TranscriptCache() as transcript_cache:
+        deliverer = WebhookDeliverer(outbox)
+        try:
+            stages = build_stages(feed_url, outbox, os.environ.get(WEBHOOK_URL_ENV), transcript_cache,
+                                  summary_backend, workers, voicy_index=voicy_index, start_transcriber=start_transcriber)
+            max_active = PIPELINE_MAX_ACTIVE or (COORDINATED_MAX_ACTIVE if coordinator is not None else None)
+            pipeline = Pipeline(ledger, feed_url, stages, rss_checker.check_new_episodes if detect else None, deliverer,
+                                max_active=max_active, coordinator=coordinator)
+            return pipeline.run()
+        finally:
+            deliverer.close()
+            if hasattr(summary_backend, "close"):
+                summary_backend.close()
+            if voicy_index is not None:
+                voicy_index.close()
+
+def check_only() -> int:
+    """
+    Reports whether a pipeline run has work to do (rss_checker.CHECK_* status), without doing it.
+
+    Fetches STANDFM_RSS_URL conditionally and looks at the ledger and the
+    outbox only; no stage module does any work and nothing is recorded.
+    """
+    feed_url = os.environ.get("STANDFM_RSS_URL")
+    if not feed_url:
+        logger.error("STANDFM_RSS_URL environment variable not set.")
+        return rss_checker.CHECK_ERROR
+    with EpisodeLedger(rss_checker.LEDGER_FILE) as ledger:
+        new_episodes = rss_checker.peek_new_episodes(feed_url, ledger)
+        unfinished = ledger.pending(feed_url, STAGE_SENT)
+    queued = 0
+    if os.path.exists(DEFAULT_OUTBOX_PATH):
+        with WebhookOutbox() as outbox:
+            queued = outbox.pending_count()
+    if new_episodes is None:
+        logger.error("Check: could not fetch or parse the RSS feed.")
+        return rss_checker.CHECK_ERROR
+    logger.info(f"Check: {len(new_episodes)} new episode(s), {len(unfinished)} unfinished episode(s), "
+                f"{queued} queued webhook event(s).")
+    if new_episodes or unfinished or queued:
+        return rss_checker.CHECK_WORK_PENDING
+    return rss_checker.CHECK_NOTHING_TO_DO
+
+def main():
+    parser = argparse.ArgumentParser(description="Run new stand.fm episodes through detect -> resolve -> download -> "
+                                                 "transcribe -> summarize -> deliver, resuming unfinished ones.")
+    parser.add_argument("--workers", default=PIPELINE_WORKERS,
+                        help="Pool sizes per stage, e.g. download=2,transcribe=1 (default: PIPELINE_WORKERS).")
+    parser.add_argument("--no-detect", action="store_true",
+                        help="Do not check the feed; only resume episodes left unfinished by earlier runs.")
+    parser.add_argument("--check-only", action="store_true",
+                        help="Only check whether a run has work to do (exit 0: yes, 1: no, 2: feed error); changes nothing.")
+    parser.add_argument("--leases", default=WORKER_LEASES,
+                        help="Share episodes with pipelines on other hosts through this lease store: a SQLite path or "
+                             "redis:// URL (default: WORKER_LEASES; empty runs alone).")
+    parser.add_argument("--worker-id", default=WORKER_ID, help="Name of this worker in the lease store (default: WORKER_ID).")
+    parser.add_argument("--start-transcriber", action="store_true", default=TRANSCRIBE_SERVICE_AUTOSTART,
+                        help="Start the resident transcription service (transcription_service.py) if it is not running; "
+                             "it keeps the Whisper model loaded for later runs (default: TRANSCRIBE_SERVICE_AUTOSTART).")
+    args = parser.parse_args()
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env"))
+    except ImportError:
+        pass
+    configure_logging()
+    if args.check_only:
+        # A crash must not look like "nothing to do" (exit 1): the scheduler would skip the full run.
+        try:
+            return check_only()
+        except Exception:
+            logger.exception("Check failed")
+            return rss_checker.CHECK_ERROR
+    # Scrape /metrics while a long run is in progress (METRICS_PORT); the per-run report lands in logs/metrics/.
+    metrics_server = start_metrics_server()
+    coordinator = WorkerCoordinator(open_lease_store(args.leases), args.worker_id) if args.leases else None
+    try:
+        stats = run_pipeline(detect=not args.no_detect, workers=parse_stage_workers(args.workers), coordinator=coordinator,
+                             start_transcriber=args.start_transcriber)
+    finally:
+        if coordinator is not None:
+            coordinator.close()
+            coordinator.store.close()
+        write_run_report("pipeline")
+        if metrics_server is not None:
+            metrics_server.shutdown()
+    return 1 if not stats or stats["failed"] else 0
+
+if __name__ == "__main__":
+    if "--self-check" not in sys.argv[1:]:
+        sys.exit(main())
+
+    # Offline self-check of the scheduler with stand-in stages: python src/main.py --self-check
+    import tempfile
+    from episode_ledger import STAGE_DETECTED
+
+    configure_logging(log_file=None)
+    feed = "https://example.com/rss"
+    calls = {}
+    finished_at = {}
+    lock = threading.Lock()
+
+    def stand_in(name: str, seconds: dict | None = None, fail: set | None = None, skip: set | None = None):
+        def run(episode: dict, outputs: dict) -> dict | None:
+            guid = episode["guid"]
+            with lock:
+                calls.setdefault(name, []).append(guid)
+            time.sleep((seconds or {}).get(guid, 0.01))
+            if guid in (fail or set()):
+                raise PipelineError(f"{name} failed for {guid}")
+            with lock:
+                finished_at[(name, guid)] = time.perf_counter()
+            return None if guid in (skip or set()) else {"by": name, "seen": sorted(outputs)}
+        return run
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audio_files = {f"ep-{i}": os.path.join(tmp_dir, f"ep-{i}.mp3") for i in range(5)}
+
+        def stand_in_download(episode: dict, outputs: dict) -> dict:
+            stand_in("download")(episode, outputs)
+            with open(audio_files[episode["guid"]], "wb") as f:
+                f.write(b"audio")
+            return {"path": audio_files[episode["guid"]]}
+
+        def stages(fail: set) -> list[Stage]:
+            return [
+                Stage("resolve", STAGE_SCRAPED, stand_in("resolve"), 2),
+                Stage("download", STAGE_DOWNLOADED, stand_in_download, 2,
+                      reusable=lambda payload: os.path.exists(payload.get("path", ""))),
+                # ep-1 takes long; ep-2 fails the first time
+                Stage("transcribe", STAGE_TRANSCRIBED, stand_in("transcribe", {"ep-1": 1.0}, fail), 2),
+                Stage("summarize", STAGE_SUMMARIZED, stand_in("summarize", skip={"ep-3"}), 2),
+                Stage("deliver", STAGE_SENT, stand_in("deliver"), 1),
+            ]
+
+        def detect() -> list:
+            time.sleep(0.1)
+            new = [{"guid": "ep-3", "title": "New"}]
+            ledger.record_many(feed, [(episode["guid"], episode) for episode in new], STAGE_DETECTED)
+            return new
+
+        with EpisodeLedger(os.path.join(tmp_dir, "ledger.sqlite3")) as ledger:
+            # Three episodes left over from an earlier run, one newly detected during this one.
+            ledger.record_many(feed, [(f"ep-{i}", {"guid": f"ep-{i}", "title": f"Episode {i}"}) for i in range(3)], STAGE_DETECTED)
+            first = Pipeline(ledger, feed, stages(fail={"ep-2"}), detect).run()
+            assert first["detected"] == 1 and first["completed"] == 3 and first["failed"] == 1, first
+            # The long transcription of ep-1 did not hold back the other episodes.
+            assert finished_at[("deliver", "ep-0")] < finished_at[("transcribe", "ep-1")]
+            assert finished_at[("deliver", "ep-3")] < finished_at[("transcribe", "ep-1")]
+            assert ledger.stages(feed, "ep-3")[STAGE_SUMMARIZED]["status"] == STATUS_SKIPPED
+            assert STAGE_TRANSCRIBED not in ledger.stages(feed, "ep-2")
+            print(f"First run: {first}")
+
+            # ep-2 resumes at transcribe, reusing the earlier stages' checkpoints.
+            calls.clear()
+            second = Pipeline(ledger, feed, stages(fail=set())).run()
+            assert second["completed"] == 1 and second["resumed"] == 1 and second["failed"] == 0, second
+            assert calls["transcribe"] == ["ep-2"] and "resolve" not in calls and "download" not in calls
+            print(f"Second run: {second}")
+
+            # A checkpoint whose file has gone is repeated.
+            calls.clear()
+            ledger.record_many(feed, [("ep-4", {"guid": "ep-4"})], STAGE_DETECTED)
+            ledger.record(feed, "ep-4", STAGE_SCRAPED, {"by": "resolve"})
+            ledger.record(feed, "ep-4", STAGE_DOWNLOADED, {"path": os.path.join(tmp_dir, "missing.mp3")})
+            third = Pipeline(ledger, feed, stages(fail=set())).run()
+            assert third["completed"] == 1 and calls["download"] == ["ep-4"] and "resolve" not in calls, (third, calls)
+            assert parse_stage_workers("download=2, transcribe=1") == {"download": 2, "transcribe": 1}
+
+            # A backlog with max_active=2 and a rate-limited stage: never more than two episodes in
+            # flight, resolve starts spaced out, and a deleted download is not repeated once transcribed.
+            calls.clear()
+            os.remove(audio_files["ep-0"])
+            ledger.reopen(feed, ["ep-0"], STAGE_SENT, statuses=(STATUS_DONE,))
+            backlog = [(f"old-{i}", {"guid": f"old-{i}"}) for i in range(6)]
+            ledger.record_many(feed, backlog, STAGE_DETECTED)
+            active_now, peak = set(), [0]
+
+            def tracked(name: str):
+                def run(episode: dict, outputs: dict) -> dict:
+                    with lock:
+                        active_now.add(episode["guid"])
+                        peak[0] = max(peak[0], len(active_now))
+                        calls.setdefault(name, []).append((episode["guid"], time.monotonic()))
+                    time.sleep(0.02)
+                    if name == "deliver":
+                        with lock:
+                            active_now.discard(episode["guid"])
+                    return {"by": name}
+                return run
+
+            limited = [Stage("resolve", STAGE_SCRAPED, tracked("resolve"), 4, rate_per_minute=1200),
+                       Stage("download", STAGE_DOWNLOADED, tracked("download"), 4,
+                             reusable=lambda payload: os.path.exists(payload.get("path", ""))),
+                       Stage("transcribe", STAGE_TRANSCRIBED, tracked("transcribe"), 4),
+                       Stage("deliver", STAGE_SENT, tracked("deliver"), 4)]
+            fourth = Pipeline(ledger, feed, limited, max_active=2, progress_seconds=0.05).run()
+            assert fourth["completed"] == 7 and peak[0] <= 2, (fourth, peak)
+            assert [guid for guid, _ in calls["deliver"]] == ["ep-0"] + [f"old-{i}" for i in range(6)], calls["deliver"]
+            assert "ep-0" not in [guid for guid, _ in calls["download"]]
+            starts = sorted(started for _, started in calls["resolve"])
+            # Slots are 50 ms apart; a call that overslept its slot may be followed closer by the next one.
+            assert all(start - starts[0] >= 0.05 * k - 0.005 for k, start in enumerate(starts)), starts
+            assert ledger.reopen(feed, ["old-0"], STAGE_SENT) == 0
+            assert parse_stage_rates("resolve=30, deliver=0.5") == {"resolve": 30.0, "deliver": 0.5}
+
+            # Two workers sharing the ledger and a lease store split a backlog and never run an episode twice.
+            from worker_leases import SQLiteLeaseStore
+            calls.clear()
+            ledger.record_many(feed, [(f"shared-{i}", {"guid": f"shared-{i}"}) for i in range(12)], STAGE_DETECTED)
+            stores = [SQLiteLeaseStore(os.path.join(tmp_dir, "leases.sqlite3")) for _ in range(2)]
+            coordinators = [WorkerCoordinator(store, f"worker-{i}", ttl_seconds=5) for i, store in enumerate(stores)]
+            shared_stages = lambda: [Stage("resolve", STAGE_SCRAPED, stand_in("resolve", {f"shared-{i}": 0.05 for i in range(12)}), 2),
+                                     Stage("deliver", STAGE_SENT, stand_in("deliver"), 1)]
+            results = [None, None]
+            workers = [threading.Thread(target=lambda i=i: results.__setitem__(i, Pipeline(
+                           ledger, feed, shared_stages(), max_active=2, coordinator=coordinators[i]).run()))
+                       for i in range(2)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            assert sorted(calls["resolve"]) == sorted(f"shared-{i}" for i in range(12)), calls["resolve"]
+            assert results[0]["completed"] + results[1]["completed"] == 12 and min(r["completed"] for r in results) > 0, results
+            for coordinator in coordinators:
+                coordinator.close()
+                coordinator.store.close()
+    print("--- main.py self-check passed ---")
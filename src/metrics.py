@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import bisect
+import functools
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Timing spans for the pipeline's slow steps (feed fetch/parse, Voicy lookup,
+# webhook POST, download, transcription, summarisation).
+# Library modules wrap a step in `with span("name", label=value) as s:` or
+# decorate it with @timed; an exception, or s.fail(), records a failure.
+# Every span feeds a duration histogram and a success/failure counter in one
+# in-process registry, which entry points expose as a Prometheus text endpoint
+# (start_metrics_server(), METRICS_PORT) and write out as a per-run JSON
+# report (write_run_report()). Recording is a dict lookup and a few
+# additions under a lock, so spans are cheap enough to leave on everywhere.
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_PREFIX = "standfm"
+# Local /metrics endpoint, off unless a port is given
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_REPORT_DIR = os.environ.get("METRICS_REPORT_DIR", os.path.join(PROJECT_ROOT, "logs", "metrics"))
+# Upper bounds in seconds: from a feed check (tens of ms) to an hour-long transcription
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+# Recent durations kept per series for the report's percentiles
+REPORT_SAMPLES = 1024
+
+OUTCOME_SUCCESS = "success"
+OUTCOME_FAILURE = "failure"
+
+logger = logging.getLogger(__name__)
+
+class _Series:
+    """Histogram, counters and recent samples of one span name + label set."""
+
+    def __init__(self, buckets: tuple):
+        self.bucket_counts = [0] * (len(buckets) + 1) # The last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.outcomes = {OUTCOME_SUCCESS: 0, OUTCOME_FAILURE: 0}
+        self.samples = deque(maxlen=REPORT_SAMPLES)
+
+class MetricsRegistry:
+    """Thread-safe store of span series, keyed by (name, sorted labels)."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.started_at = time.time()
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, outcome: str = OUTCOME_SUCCESS, **labels):
+        """Records one finished span of `seconds`."""
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.buckets)
+            series.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            series.count += 1
+            series.total += seconds
+            series.min = seconds if series.min is None else min(series.min, seconds)
+            series.max = seconds if series.max is None else max(series.max, seconds)
+            series.outcomes[outcome] = series.outcomes.get(outcome, 0) + 1
+            series.samples.append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.started_at = time.time()
+
+    def render_prometheus(self) -> str:
+        """Returns every series in the Prometheus text exposition format."""
+        with self._lock:
+            items = sorted(self._series.items())
+            snapshot = [(name, labels, list(series.bucket_counts), series.count, series.total, dict(series.outcomes))
+                        for (name, labels), series in items]
+        lines = []
+        declared = set()
+        for name, labels, bucket_counts, count, total, outcomes in snapshot:
+            metric = f"{METRICS_PREFIX}_{name}"
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {metric}_seconds Duration of {name} spans.")
+                lines.append(f"# TYPE {metric}_seconds histogram")
+                lines.append(f"# HELP {metric}_total Finished {name} spans by outcome.")
+                lines.append(f"# TYPE {metric}_total counter")
+            cumulative = 0
+            for bound, bucket_count in zip([*self.buckets, "+Inf"], bucket_counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{metric}_seconds_bucket{_labels(labels, le=le)} {cumulative}")
+            lines.append(f"{metric}_seconds_sum{_labels(labels)} {total!r}")
+            lines.append(f"{metric}_seconds_count{_labels(labels)} {count}")
+            for outcome, outcome_count in sorted(outcomes.items()):
+                lines.append(f"{metric}_total{_labels(labels, outcome=outcome)} {outcome_count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> dict:
+        """Returns a JSON-serialisable summary: per series count, failures, total, min/max and p50/p95."""
+        with self._lock:
+            items = sorted(self._series.items())
+            spans = []
+            for (name, labels), series in items:
+                samples = sorted(series.samples)
+                spans.append({
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": series.count,
+                    "failures": series.outcomes.get(OUTCOME_FAILURE, 0),
+                    "total_seconds": series.total,
+                    "min_seconds": series.min,
+                    "max_seconds": series.max,
+                    "p50_seconds": _percentile(samples, 0.50),
+                    "p95_seconds": _percentile(samples, 0.95),
+                })
+        # Biggest total first: where the minutes actually went.
+        spans.sort(key=lambda entry: entry["total_seconds"], reverse=True)
+        return {"started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec="seconds"),
+                "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "spans": spans}
+
+def _labels(labels: tuple, **extra) -> str:
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + "}"
+
+def _percentile(sorted_samples: list, fraction: float) -> float | None:
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+REGISTRY = MetricsRegistry()
+
+class Span:
+    """Handle yielded by span(); call fail() to record a step that returned an error instead of raising."""
+
+    def __init__(self):
+        self.outcome = OUTCOME_SUCCESS
+
+    def fail(self):
+        self.outcome = OUTCOME_FAILURE
+
+@contextmanager
+def span(name: str, registry: MetricsRegistry | None = None, **labels):
+    """
+    Times the enclosed block as one `name` span.
+
+    Usage:
+        with span("feed_fetch", feed=url) as s:
+            result = fetch_feed(url)
+            if result["status"] == STATUS_ERROR:
+                s.fail()
+    """
+    handle = Span()
+    started = time.perf_counter()
+    try:
+        yield handle
+    except BaseException:
+        handle.fail()
+        raise
+    finally:
+        (registry or REGISTRY).observe(name, time.perf_counter() - started, handle.outcome, **labels)
+
+def timed(name: str, failed=None, **labels):
+    """Decorator form of span(); failed(result) -> True records a returned error as a failure."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels) as handle:
+                result = function(*args, **kwargs)
+                if failed is not None and failed(result):
+                    handle.fail()
+                return result
+        return wrapper
+    return decorate
+
+def observe(name: str, seconds: float, failed: bool = False, **labels):
+    """Records a duration measured elsewhere (e.g. the phase timings of a ScrapeResult)."""
+    REGISTRY.observe(name, seconds, OUTCOME_FAILURE if failed else OUTCOME_SUCCESS, **labels)
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST, registry: MetricsRegistry | None = None):
+    """
+    Serves GET /metrics (Prometheus text) and /metrics.json (the report) on a daemon thread.
+
+    Returns:
+        The server (call shutdown() to stop it), or None if port is 0.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    if not port:
+        return None
+    registry = registry or REGISTRY
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                body = registry.render_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/metrics.json":
+                body = json.dumps(registry.report(), ensure_ascii=False).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def write_run_report(run_name: str, report_dir: str = METRICS_REPORT_DIR, registry: MetricsRegistry | None = None) -> str | None:
+    """
+    Writes the registry's report to <report_dir>/<run_name>-<UTC timestamp>.json.
+
+    Returns:
+        The file path, or None if nothing was recorded or the file could not be written.
+    """
+    report = (registry or REGISTRY).report()
+    if not report["spans"]:
+        return None
+    report["run"] = run_name
+    path = os.path.join(report_dir, f"{run_name}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json")
+    try:
+        os.makedirs(report_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    except OSError as e:
+        logger.error(f"Could not write metrics report {path}: {e}")
+        return None
+    top = ", ".join(f"{entry['name']}={entry['total_seconds']:.1f}s" for entry in report["spans"][:5])
+    logger.info(f"Metrics report written to {path} ({top}).")
+    return path
+
+if __name__ == '__main__':
+    # Self-check: spans feed the histogram, counters, report and endpoint.
+    # Usage: python src/metrics.py
+    import urllib.request
+
+    registry = MetricsRegistry()
+    for seconds in (0.02, 0.2, 3.0):
+        registry.observe("feed_fetch", seconds)
+    try:
+        with span("voicy_lookup", registry, method="browser"):
+            raise RuntimeError("driver did not start")
+    except RuntimeError:
+        pass
+    with span("voicy_lookup", registry, method="http") as s:
+        s.fail()
+    assert timed("pipeline_stage", failed=lambda result: result is None)(lambda: None)() is None
+    assert REGISTRY.report()["spans"][0]["failures"] == 1
+    REGISTRY.reset()
+
+    text = registry.render_prometheus()
+    assert 'standfm_feed_fetch_seconds_bucket{le="0.025"} 1' in text
+    assert 'standfm_feed_fetch_seconds_bucket{le="+Inf"} 3' in text
+    assert 'standfm_voicy_lookup_total{method="browser",outcome="failure"} 1' in text
+    report = registry.report()
+    assert report["spans"][0]["name"] == "feed_fetch" and report["spans"][0]["p50_seconds"] == 0.2
+    assert sum(entry["failures"] for entry in report["spans"]) == 2
+
+    import socket
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        free_port = probe.getsockname()[1]
+    server = start_metrics_server(port=free_port, registry=registry)
+    with urllib.request.urlopen(f"http://127.0.0.1:{free_port}/metrics") as response:
+        assert response.read().decode("utf-8") == registry.render_prometheus()
+    server.shutdown()
+    print(text)
+    print("--- metrics.py self-check passed ---")
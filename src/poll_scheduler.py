@@ -0,0 +1,174 @@
+import os
+import random
+import time
+
+# Adaptive poll scheduling for rss_monitor's daemon mode.
+# Each feed's publish times (learned from entry published_parsed) are folded
+# into a 168-bin hour-of-week histogram. Around the hours a channel usually
+# publishes we poll every few minutes; elsewhere we back off until the next
+# likely publish window, up to max_interval. The feed's own <ttl> and the
+# response's Cache-Control max-age act as a lower bound on the interval.
+
+HOURS_PER_WEEK = 7 * 24
+MIN_INTERVAL_SECONDS = int(os.environ.get("RSS_MONITOR_MIN_INTERVAL", "120"))
+DEFAULT_INTERVAL_SECONDS = int(os.environ.get("RSS_MONITOR_DEFAULT_INTERVAL", "600"))
+MAX_INTERVAL_SECONDS = int(os.environ.get("RSS_MONITOR_MAX_INTERVAL", "3600"))
+MIN_HISTORY_FOR_PREDICTION = 3  # Fewer publish times than this: use DEFAULT_INTERVAL_SECONDS
+HOT_BIN_SHARE = 0.05            # A bin holding at least this share of (smoothed) publishes is "hot"
+HOT_HOUR_SHARE = 0.1            # Same for hour-of-day bins of channels that publish most days
+DAILY_PATTERN_MIN_WEEKDAYS = 4  # Publishing on this many distinct weekdays counts as a daily show
+MAX_HISTORY = 100               # Publish times remembered per feed
+JITTER_RATIO = 0.1              # +/-10% so many feeds do not stay in lockstep
+
+def hour_of_week(epoch_seconds: float) -> int:
+    """Returns the UTC hour-of-week bin (0 = Monday 00:00 UTC) for a timestamp."""
+    t = time.gmtime(epoch_seconds)
+    return t.tm_wday * 24 + t.tm_hour
+
+def merge_publish_history(history: list, new_times: list) -> list:
+    """Adds newly seen publish timestamps to a history list, keeping the newest MAX_HISTORY."""
+    merged = sorted(set(int(t) for t in list(history or []) + list(new_times or [])))
+    return merged[-MAX_HISTORY:]
+
+def _smoothed_shares(bin_indexes: list, bin_count: int) -> list:
+    """Share of publishes per bin, each publish also counting half towards its neighbours."""
+    weights = [0.0] * bin_count
+    for bin_index in bin_indexes:
+        weights[bin_index] += 1.0
+        weights[(bin_index - 1) % bin_count] += 0.5
+        weights[(bin_index + 1) % bin_count] += 0.5
+    total = sum(weights)
+    return [weight / total for weight in weights] if total else weights
+
+def hot_bins(history: list) -> set:
+    """
+    Returns the hour-of-week bins in which this feed is likely to publish.
+
+    Each publish time also counts half towards the neighbouring hours, so a
+    channel that publishes "around 6 o'clock" gets a window rather than a
+    single hour. Channels that publish on most weekdays are additionally
+    matched by hour of day, so a daily show is not diluted across 7 days.
+    """
+    if not history:
+        return set()
+    week_bins = [hour_of_week(published) for published in history]
+    weekly_shares = _smoothed_shares(week_bins, HOURS_PER_WEEK)
+    bins = {i for i, share in enumerate(weekly_shares) if share >= HOT_BIN_SHARE}
+
+    if len({bin_index // 24 for bin_index in week_bins}) >= DAILY_PATTERN_MIN_WEEKDAYS:
+        daily_shares = _smoothed_shares([bin_index % 24 for bin_index in week_bins], 24)
+        hot_hours = {hour for hour, share in enumerate(daily_shares) if share >= HOT_HOUR_SHARE}
+        bins.update(day * 24 + hour for day in range(7) for hour in hot_hours)
+    return bins
+
+def seconds_until_hot(now: float, bins: set) -> float | None:
+    """Seconds from now until the start of the next hot bin (0 if now is inside one)."""
+    if not bins:
+        return None
+    current = hour_of_week(now)
+    if current in bins:
+        return 0.0
+    into_hour = now % 3600
+    for hours_ahead in range(1, HOURS_PER_WEEK + 1):
+        if (current + hours_ahead) % HOURS_PER_WEEK in bins:
+            return hours_ahead * 3600 - into_hour
+    return None
+
+def next_poll_interval(history: list, now: float | None = None, ttl_minutes: int | None = None,
+                       max_age_seconds: int | None = None, consecutive_errors: int = 0) -> float:
+    """
+    Computes how long to wait before polling a feed again.
+
+    Args:
+        history: Epoch seconds of the feed's known publish times.
+        now: Current epoch time (defaults to time.time()).
+        ttl_minutes: The feed's <ttl>, if any.
+        max_age_seconds: Cache-Control max-age of the last response, if any.
+        consecutive_errors: Failed polls in a row; each one doubles the interval.
+
+    Returns:
+        Seconds until the next poll, between MIN_INTERVAL_SECONDS and MAX_INTERVAL_SECONDS.
+    """
+    now = time.time() if now is None else now
+    # Jitter spreads feeds apart; when waking up for a publish window it may
+    # only make us early, never late.
+    jitter = random.uniform(1 - JITTER_RATIO, 1 + JITTER_RATIO)
+    if len(history or []) < MIN_HISTORY_FOR_PREDICTION:
+        interval = DEFAULT_INTERVAL_SECONDS * jitter
+    else:
+        until_hot = seconds_until_hot(now, hot_bins(history))
+        if until_hot is None:
+            interval = DEFAULT_INTERVAL_SECONDS * jitter
+        elif until_hot == 0:
+            interval = MIN_INTERVAL_SECONDS * jitter
+        else:
+            # Sleep until the window opens, but never longer than MAX_INTERVAL_SECONDS
+            # so an off-schedule episode is still picked up within the hour.
+            interval = until_hot * min(jitter, 1.0)
+
+    # The server's own caching hints are a floor (capped so they cannot stall detection).
+    floor = max(int(ttl_minutes or 0) * 60, int(max_age_seconds or 0))
+    interval = max(interval, min(floor, MAX_INTERVAL_SECONDS))
+
+    if consecutive_errors:
+        interval = interval * (2 ** min(consecutive_errors, 5))
+
+    return min(max(interval, MIN_INTERVAL_SECONDS * (1 - JITTER_RATIO)), MAX_INTERVAL_SECONDS)
+
+if __name__ == '__main__':
+    # Self-check against a feed that has published daily at 21:00 UTC for a month.
+    random.seed(0)
+    hour, day = 3600, 24 * 3600
+    base = 1749157212  # Thu, 05 Jun 2025 21:00:12 GMT
+    sample_history = [base - i * day for i in range(30)]
+    low, high = 1 - JITTER_RATIO, 1 + JITTER_RATIO
+
+    # The window is the publish hour plus its neighbours, on every day of the week.
+    assert hot_bins(sample_history) == {d * 24 + h for d in range(7) for h in (20, 21, 22)}
+    # Too little history to predict from: DEFAULT_INTERVAL_SECONDS (+/- jitter) at any hour.
+    for _ in range(50):
+        wait = next_poll_interval(sample_history[:MIN_HISTORY_FOR_PREDICTION - 1], now=base + 12 * hour)
+        assert DEFAULT_INTERVAL_SECONDS * low <= wait <= DEFAULT_INTERVAL_SECONDS * high, wait
+
+    # Inside the window: poll every MIN_INTERVAL_SECONDS (+/- jitter).
+    for probe in (base, base - hour + 60, base + 2 * hour - 60):
+        for _ in range(50):
+            wait = next_poll_interval(sample_history, now=probe)
+            assert MIN_INTERVAL_SECONDS * low <= wait <= MIN_INTERVAL_SECONDS * high, (probe, wait)
+
+    # Just before the window: sleep until it opens, never past it.
+    probe = base - 12 - 90 * 60  # 19:30:00
+    for _ in range(50):
+        wait = next_poll_interval(sample_history, now=probe)
+        assert 30 * 60 * low <= wait <= 30 * 60, wait
+    # Far from the window: the sleep is capped at MAX_INTERVAL_SECONDS.
+    for probe in (base + 3 * hour, base + 12 * hour):
+        assert next_poll_interval(sample_history, now=probe) == MAX_INTERVAL_SECONDS
+
+    # <ttl> and max-age raise the interval inside the window, but only up to MAX_INTERVAL_SECONDS.
+    assert next_poll_interval(sample_history, now=base, ttl_minutes=15) >= 15 * 60
+    assert next_poll_interval(sample_history, now=base, max_age_seconds=900) >= 900
+    assert next_poll_interval(sample_history, now=base, ttl_minutes=20, max_age_seconds=900) >= 20 * 60
+    assert next_poll_interval(sample_history, now=base, ttl_minutes=24 * 60) == MAX_INTERVAL_SECONDS
+    assert next_poll_interval(sample_history, now=base, max_age_seconds=10 ** 9) == MAX_INTERVAL_SECONDS
+
+    # Errors double the interval, capped at 2**5 and at MAX_INTERVAL_SECONDS (no overflow for long outages).
+    for errors in range(1, 4):
+        wait = next_poll_interval(sample_history, now=base, consecutive_errors=errors)
+        assert MIN_INTERVAL_SECONDS * low * 2 ** errors <= wait <= MIN_INTERVAL_SECONDS * high * 2 ** errors, (errors, wait)
+    for errors in (5, 6, 50, 10_000):
+        wait = next_poll_interval(sample_history, now=base, consecutive_errors=errors)
+        assert min(MIN_INTERVAL_SECONDS * low * 2 ** 5, MAX_INTERVAL_SECONDS) <= wait <= min(MIN_INTERVAL_SECONDS * high * 2 ** 5, MAX_INTERVAL_SECONDS), (errors, wait)
+
+    # Walking a whole day: about one poll an hour outside the window, MIN spacing inside it.
+    probe, polls_in_window, polls_outside = base + 3 * hour, 0, 0
+    while probe < base + 3 * hour + day:
+        wait = next_poll_interval(sample_history, now=probe)
+        if hour_of_week(probe) % 24 in (20, 21, 22):
+            polls_in_window += 1
+        else:
+            polls_outside += 1
+        probe += wait
+    assert polls_outside <= 24 and polls_in_window >= 3 * hour / (MIN_INTERVAL_SECONDS * high), (polls_outside, polls_in_window)
+
+    print("--- poll_scheduler.py self-check passed ---")
@@ -1,13 +1,24 @@
 import os
 import json
-import feedparser
 import time
-from datetime import datetime, timezone
+import xml.etree.ElementTree as ET
+from feed_fetcher import fetch_feed, close_feed_stream, save_feed_cache, STATUS_MODIFIED, STATUS_ERROR
+from rss_stream_parser import iter_feed_episodes
+from episode_ledger import EpisodeLedger, STAGE_SENT
+from metrics import span
 
 # Path to the file storing the last checked episode's GUID
 # Assumes this script is in 'src/', and 'data/' is a sibling directory to 'src/'
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
 LAST_CHECK_FILE = os.path.join(DATA_DIR, 'last_check.json')
+# ETag / Last-Modified / body hash of the last fetched feed, kept next to the state file
+FEED_CACHE_FILE = os.path.join(DATA_DIR, 'feed_cache.json')
+# SQLite ledger of every detected episode; last_check.json is only read once to seed it
+LEDGER_FILE = os.path.join(DATA_DIR, 'episode_ledger.sqlite3')
+# Exit statuses of the entry points' --check-only fast path (like grep: 0 = something found)
+CHECK_WORK_PENDING = 0
+CHECK_NOTHING_TO_DO = 1
+CHECK_ERROR = 2
 
 def _get_guid(entry):
     """Extracts a unique identifier from an RSS entry."""
@@ -49,7 +60,7 @@ def _extract_episode_data(entry):
     }
 
 def _load_last_check():
-    """Loads the last processed episode GUID from the JSON file."""
+    """Loads the GUID from the legacy JSON state file (only used to seed the ledger once)."""
     try:
         if not os.path.exists(LAST_CHECK_FILE):
             return None 
@@ -59,81 +70,129 @@ def _load_last_check():
     except (FileNotFoundError, json.JSONDecodeError):
         return None
 
-def _save_last_check(new_guid):
-    """Saves the new latest processed episode GUID and timestamp to the JSON file."""
-    os.makedirs(DATA_DIR, exist_ok=True) # Ensure data directory exists
-    data = {
-        'last_processed_episode_guid': new_guid,
-        'last_checked_timestamp': datetime.now(timezone.utc).isoformat()
-    }
-    with open(LAST_CHECK_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-def check_new_episodes():
-    """
-    Checks the StandFM RSS feed for new episodes published since the last check.
-
-    Returns:
-        list: A list of dictionaries, each representing a new episode.
-              Episodes are sorted oldest-new to newest-new.
-              Returns an empty list if no new episodes or an error occurs.
-    """
-    rss_url = os.getenv("STANDFM_RSS_URL")
-    if not rss_url:
-        # print("Error: STANDFM_RSS_URL environment variable not set.")
-        return []
+def _collect_with_feedparser(body, stop_when):
+    """Walks a fully parsed feed (newest first) up to the first GUID stop_when accepts, using feedparser."""
+    import feedparser # Only needed for malformed feeds; keeps startup light
 
-    feed = feedparser.parse(rss_url)
+    feed = feedparser.parse(body)
 
     if feed.bozo:
         # print(f"Warning: RSS feed parsing may have issues. Bozo reason: {feed.bozo_exception}")
         pass # Depending on severity, might still try to process or return []
-    
-    if not feed.entries:
-        return []
-
-    last_known_guid = _load_last_check()
-    
-    newly_fetched_episodes_data = [] # Stores episode data dicts, newest from feed first
 
+    newly_fetched_episodes_data = []
     for entry in feed.entries: # feed.entries are usually newest first
         current_entry_guid = _get_guid(entry)
         if not current_entry_guid:
             continue # Skip entries without a GUID
 
-        if current_entry_guid == last_known_guid:
+        if stop_when is not None and stop_when(current_entry_guid):
             break 
         
         episode_data = _extract_episode_data(entry)
         if episode_data:
             newly_fetched_episodes_data.append(episode_data)
+    return newly_fetched_episodes_data
+
+def _collect_new_episodes(chunks, stop_when):
+    """
+    Streams the feed and collects episodes up to the first already-known one, newest first.
+
+    Stops pulling chunks once stop_when(guid) is True; with stop_when=None the
+    whole feed is read. Falls back to feedparser, which tolerates malformed
+    XML, if the incremental parser rejects the document.
+    """
+    received_chunks = [] # Raw bytes read so far, replayed into feedparser on a parse error
+
+    def _recording(source):
+        for chunk in source:
+            received_chunks.append(chunk)
+            yield chunk
+
+    try:
+        return list(iter_feed_episodes(_recording(chunks), stop_when=stop_when))
+    except ET.ParseError:
+        body = b''.join(received_chunks) + b''.join(chunks)
+        return _collect_with_feedparser(body, stop_when)
 
-    if not newly_fetched_episodes_data:
+def check_new_episodes():
+    """
+    Checks the StandFM RSS feed for new episodes published since the last check.
+
+    New episodes are those whose GUID the episode ledger has not recorded as
+    detected yet; they are recorded as detected before being returned.
+
+    Returns:
+        list: A list of dictionaries, each representing a new episode.
+              Episodes are sorted oldest-new to newest-new.
+              Returns an empty list if no new episodes or an error occurs.
+    """
+    rss_url = os.getenv("STANDFM_RSS_URL")
+    if not rss_url:
+        # print("Error: STANDFM_RSS_URL environment variable not set.")
         return []
 
-    actual_new_episodes_to_process = []
-    guid_to_save_as_last_processed = None
+    with span("feed_fetch", source="rss_checker") as fetch_span:
+        fetch_result = fetch_feed(rss_url, FEED_CACHE_FILE, stream=True)
+        if fetch_result['status'] == STATUS_ERROR:
+            fetch_span.fail()
+    if fetch_result['status'] != STATUS_MODIFIED:
+        # 304 Not Modified: nothing new, skip XML parsing entirely.
+        # On error there is nothing to cache and nothing to report either.
+        save_feed_cache(FEED_CACHE_FILE, rss_url, fetch_result['validators'])
+        return []
 
-    if last_known_guid is None:
-        # First run: process only the very latest episode from the feed.
-        # The latest is the first one in newly_fetched_episodes_data.
-        actual_new_episodes_to_process = [newly_fetched_episodes_data[0]]
-        guid_to_save_as_last_processed = newly_fetched_episodes_data[0]['guid']
-    else:
-        # Standard run: process all episodes found that are newer than last_known_guid.
-        # Reverse to get them in chronological order (oldest new first).
-        newly_fetched_episodes_data.reverse() 
-        actual_new_episodes_to_process = newly_fetched_episodes_data
-        # GUID to save is the GUID of the newest episode identified in this batch.
-        # After reversing, it's the last element if list is not empty.
-        if actual_new_episodes_to_process:
-             guid_to_save_as_last_processed = actual_new_episodes_to_process[-1]['guid']
-
-    if guid_to_save_as_last_processed:
-        _save_last_check(guid_to_save_as_last_processed)
-    
+    # The body is streamed, so this span covers reading it as well as parsing and the ledger update.
+    with span("feed_parse", source="rss_checker"), EpisodeLedger(LEDGER_FILE) as ledger:
+        # Once the ledger knows this feed, stop reading at the first episode it has seen.
+        # The first time, the whole feed is read so the back catalogue can be recorded as baseline.
+        stop_when = (lambda guid: ledger.is_known(rss_url, guid)) if ledger.has_feed(rss_url) else None
+        try:
+            # Stores episode data dicts, newest from feed first
+            newly_fetched_episodes_data = _collect_new_episodes(fetch_result['chunks'], stop_when)
+        finally:
+            # Stop reading the socket; only the head of the feed was needed.
+            validators = close_feed_stream(fetch_result)
+
+        # Set difference against the ledger, recorded atomically as 'detected'.
+        actual_new_episodes_to_process = ledger.detect_new(
+            rss_url, newly_fetched_episodes_data, legacy_last_guid=_load_last_check()
+        )
+
+    # Only remember the validators once the new GUIDs are safely stored.
+    save_feed_cache(FEED_CACHE_FILE, rss_url, validators)
+
+    # Reverse to get them in chronological order (oldest new first).
+    actual_new_episodes_to_process.reverse()
     return actual_new_episodes_to_process
 
+def peek_new_episodes(rss_url, ledger, feed_cache_file=FEED_CACHE_FILE):
+    """
+    Read-only check for episodes the ledger has not detected yet.
+
+    Fetches the feed conditionally and streams it only up to the first known
+    GUID, but records nothing and keeps the cached validators, so the run that
+    processes the episodes still sees the change.
+
+    Returns:
+        The new episodes, newest first (empty if the feed is unchanged), or
+        None if the feed could not be fetched or parsed.
+    """
+    with span("feed_fetch", source="peek") as fetch_span:
+        fetch_result = fetch_feed(rss_url, feed_cache_file)
+        if fetch_result['status'] == STATUS_ERROR:
+            fetch_span.fail()
+    if fetch_result['status'] == STATUS_ERROR:
+        return None
+    if fetch_result['status'] != STATUS_MODIFIED:
+        return []
+    stop_when = (lambda guid: ledger.is_known(rss_url, guid)) if ledger.has_feed(rss_url) else None
+    try:
+        episodes = _collect_new_episodes(iter([fetch_result['body']]), stop_when)
+    except Exception:
+        return None
+    return [episode for episode in episodes if not ledger.is_known(rss_url, episode['guid'])]
+
 if __name__ == '__main__':
     # This block is for testing the module directly.
     # It requires a .env file in the project root or environment variables set.
@@ -156,16 +215,12 @@ if __name__ == '__main__':
         print("Alternatively, ensure STANDFM_RSS_URL is set in your environment.")
 
     print(f"\n--- Running rss_checker.py test --- ")
-    print(f"Using last_check.json at: {LAST_CHECK_FILE}")
-
-    # Optional: For a clean test, you might want to remove last_check.json
-    # if os.path.exists(LAST_CHECK_FILE):
-    #     print(f"Temporarily removing {LAST_CHECK_FILE} for a first-run test.")
-    #     os.remove(LAST_CHECK_FILE)
+    print(f"Using episode ledger at: {LEDGER_FILE}")
 
-    # Optional: To simulate a specific last known GUID for testing subsequent runs
-    # _save_last_check("some_guid_that_is_not_the_latest_in_your_feed")
-    # _save_last_check("a_guid_of_an_episode_further_down_your_feed")
+    # Optional: For a clean first-run test, remove the ledger (and the legacy last_check.json)
+    # if os.path.exists(LEDGER_FILE):
+    #     print(f"Temporarily removing {LEDGER_FILE} for a first-run test.")
+    #     os.remove(LEDGER_FILE)
 
     new_episodes = check_new_episodes()
 
@@ -185,10 +240,12 @@ if __name__ == '__main__':
         else:
             print("\nNo new episodes found.")
 
-    print(f"\n--- Contents of {LAST_CHECK_FILE} after check --- ")
-    try:
-        with open(LAST_CHECK_FILE, 'r', encoding='utf-8') as f:
-            print(json.dumps(json.load(f), indent=2, ensure_ascii=False))
-    except FileNotFoundError:
-        print(f"{LAST_CHECK_FILE} not found (this is expected if no new episodes were processed and it was a first run or STANDFM_RSS_URL was not set).")
+    print(f"\n--- Pending episodes in {LEDGER_FILE} after check --- ")
+    rss_url_env = os.getenv("STANDFM_RSS_URL")
+    if rss_url_env and os.path.exists(LEDGER_FILE):
+        with EpisodeLedger(LEDGER_FILE) as ledger:
+            for episode in ledger.pending(rss_url_env, STAGE_SENT):
+                print(f"  {episode.get('published')}  {episode['guid']}  {episode.get('title')}")
+    else:
+        print(f"{LEDGER_FILE} not found (expected on a first run or when STANDFM_RSS_URL was not set).")
     print("--- rss_checker.py test finished ---")
@@ -1,13 +1,46 @@
-import feedparser
 import subprocess
+import argparse
+import calendar
+import logging
 import os
+import sys
 import json
-from datetime import datetime
-from webhook_sender import send_to_make_webhook # Import the new function
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from webhook_sender import build_payload
+from webhook_outbox import WebhookOutbox, WebhookDeliverer, STATUS_SENT as OUTBOX_SENT, STATUS_DEAD as OUTBOX_DEAD
+from voicy_scraper import (
+    scrape_latest_voicy_episode, scrape_many_voicy_channels, create_chrome_driver, ScrapeResult, SCRAPE_RESULT_STDOUT_PREFIX, METHOD_SUBPROCESS,
+)
+from feed_fetcher import fetch_feed, save_feed_cache, save_feed_cache_many, STATUS_MODIFIED, STATUS_ERROR
+from rss_checker import peek_new_episodes, CHECK_WORK_PENDING, CHECK_NOTHING_TO_DO, CHECK_ERROR
+from poll_scheduler import next_poll_interval, merge_publish_history
+from voicy_index import VoicyEpisodeIndex, resolve_voicy_episode
+from browser_pool import BrowserPool
+from worker_leases import WorkerCoordinator, open_lease_store, WORKER_LEASES, WORKER_ID
+from log_setup import configure_logging
+from metrics import span, timed, start_metrics_server, write_run_report
+from episode_ledger import (
+    EpisodeLedger, STAGE_SCRAPED, STAGE_SENT, STATUS_DONE, STATUS_SKIPPED, STATUS_QUEUED, STATUS_FAILED,
+)
+# feedparser and feed_poller (httpx / asyncio) are imported where they are used:
+# most hourly runs get a 304 and never need them. BeautifulSoup and Selenium are
+# likewise only loaded by voicy_scraper when a lookup actually runs.
 
 # Configuration
 STANDFM_RSS_URL = "https://stand.fm/rss/5fba3d73c64654659098efa4"
 VOICY_CHANNEL_URL = "https://voicy.jp/channel/821320"  # User's Voicy channel
+# "inprocess" (default) or "subprocess" to run voicy_scraper.py in its own interpreter
+VOICY_SCRAPER_MODE = os.environ.get("VOICY_SCRAPER_MODE", "inprocess").lower()
+# "match" (default): find the Voicy episode matching the stand.fm title and date (voicy_index);
+# "latest": take the newest episode on the channel page, as before
+VOICY_RESOLVE_MODE = os.environ.get("VOICY_RESOLVE_MODE", "match").lower()
+# How long a single run keeps retrying webhook deliveries before leaving them in the outbox
+WEBHOOK_DRAIN_SECONDS = float(os.environ.get("WEBHOOK_DRAIN_SECONDS", "60"))
+# Name under which the built-in feed above is scheduled in daemon mode; its state stays at the top level
+DEFAULT_FEED_NAME = "default"
 
 # Determine paths relative to this script's location
 # __file__ is the path to the current script (rss_monitor.py)
@@ -25,50 +58,258 @@ else:
 
 VOICY_SCRAPER_SCRIPT_PATH = os.path.join(SRC_DIR, "voicy_scraper.py")
 STATE_FILE_PATH = os.path.join(PROJECT_ROOT, "rss_monitor_state.json")
-LOG_FILE_PATH = os.path.join(PROJECT_ROOT, "rss_monitor_log.txt")
+# ETag / Last-Modified / body hash of the last fetched feed, kept next to the state file
+FEED_CACHE_FILE_PATH = os.path.join(PROJECT_ROOT, "rss_monitor_feed_cache.json")
+# SQLite ledger of detected / scraped / sent episodes, keyed by RSS URL (see episode_ledger)
+LEDGER_FILE_PATH = os.path.join(PROJECT_ROOT, "rss_monitor_ledger.sqlite3")
+# Webhook events waiting for (re)delivery (see webhook_outbox)
+OUTBOX_FILE_PATH = os.path.join(PROJECT_ROOT, "rss_monitor_outbox.sqlite3")
+# Cached Voicy episode listings used to match episodes (see voicy_index)
+VOICY_INDEX_FILE_PATH = os.path.join(PROJECT_ROOT, "rss_monitor_voicy_index.sqlite3")
+
+logger = logging.getLogger(__name__)
 
 def log_message(message):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    full_message = f"[{timestamp}] {message}\n"
-    # Print to console for immediate feedback if run manually
-    print(full_message.strip())
-    with open(LOG_FILE_PATH, "a", encoding="utf-8") as f:
-        f.write(full_message)
+    # Queued and written by log_setup's background thread; no file I/O on the polling path.
+    logger.info(message)
 
-def load_last_processed_guid():
+def load_state() -> dict:
+    """
+    Loads the whole state file.
+
+    Layout: {"publish_history": [...], "ttl_minutes": ...,
+             "feeds": {"<feed name>": {"publish_history": [...], ...}, ...}}
+    Which episodes were processed lives in the episode ledger; a
+    "last_processed_guid" left by older versions is only read to seed it.
+    """
     if os.path.exists(STATE_FILE_PATH):
         try:
             with open(STATE_FILE_PATH, "r", encoding="utf-8") as f:
                 state = json.load(f)
-                return state.get("last_processed_guid")
+                return state if isinstance(state, dict) else {}
         except json.JSONDecodeError:
             log_message(f"Error: Could not decode JSON from state file: {STATE_FILE_PATH}. Will treat as no last processed GUID.")
-            return None
+            return {}
         except Exception as e:
             log_message(f"Error loading state file {STATE_FILE_PATH}: {e}. Will treat as no last processed GUID.")
-            return None
-    return None
+            return {}
+    return {}
 
-def save_last_processed_guid(guid):
+def save_state(state: dict, feed_names: list | None = None):
+    """
+    Writes the state file (atomically).
+
+    With feed_names, only those feeds' entries are written into the current
+    file, so workers that own other feeds do not lose their updates; call it
+    inside _shared_files_lock() then.
+    """
+    if feed_names is not None:
+        merged = load_state()
+        for name in feed_names:
+            if name == DEFAULT_FEED_NAME:
+                merged.update({key: value for key, value in state.items() if key != "feeds"})
+            else:
+                merged.setdefault("feeds", {})[name] = _feed_state(state, name)
+        state = merged
+    tmp_path = f"{STATE_FILE_PATH}.{os.getpid()}.tmp"
     try:
-        with open(STATE_FILE_PATH, "w", encoding="utf-8") as f:
-            json.dump({"last_processed_guid": guid}, f, indent=2)
-        log_message(f"Successfully saved last processed GUID: {guid} to {STATE_FILE_PATH}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, STATE_FILE_PATH)
     except Exception as e:
         log_message(f"Error saving state file {STATE_FILE_PATH}: {e}")
 
-def run_voicy_scraper() -> str | None:  # Modified to return the Voicy URL or None
-    log_message(f"Attempting to run Voicy scraper for channel: {VOICY_CHANNEL_URL}")
-    fetched_voicy_url = None  # Initialize here
+def open_coordinator(leases: str = WORKER_LEASES, worker_id: str = WORKER_ID) -> WorkerCoordinator | None:
+    """A WorkerCoordinator on the lease store named by leases (see worker_leases), or None to run alone."""
+    if not leases:
+        return None
+    coordinator = WorkerCoordinator(open_lease_store(leases), worker_id)
+    log_message(f"Coordinating with other workers as {worker_id} ({leases}).")
+    return coordinator
+
+def close_coordinator(coordinator: WorkerCoordinator | None):
+    if coordinator is not None:
+        coordinator.close()
+        coordinator.store.close()
+
+@contextmanager
+def _shared_files_lock(coordinator: WorkerCoordinator | None):
+    """Serialises read-modify-write of the state and feed cache files across workers (a no-op when running alone)."""
+    if coordinator is None:
+        yield
+        return
+    with coordinator.holding("state-files"):
+        yield
+
+def _owned_feeds(feeds: list[dict], coordinator: WorkerCoordinator | None) -> list[dict]:
+    """The feeds this worker polls: all of them alone, otherwise its share (one lease per RSS URL)."""
+    if coordinator is None:
+        return feeds
+    owned = set(coordinator.claim_share([feed_config["rss_url"] for feed_config in feeds], "feed:"))
+    return [feed_config for feed_config in feeds if feed_config["rss_url"] in owned]
+
+def _may_drain(coordinator: WorkerCoordinator | None) -> bool:
+    """Only one worker drains the shared outbox at a time, so no event is POSTed twice."""
+    return coordinator is None or coordinator.claim("outbox")
+
+def load_last_processed_guid():
+    """Returns the GUID stored by versions before the episode ledger (used once for migration)."""
+    return load_state().get("last_processed_guid")
+
+def load_monitor_config(config_path: str) -> dict:
+    """
+    Loads the multi-feed configuration.
+
+    Expected layout (see monitor_config.example.json):
+        {"per_host_limit": 4, "jitter_seconds": 1.0,
+         "feeds": [{"name": "...", "rss_url": "...", "voicy_channel_url": "...",
+                    "webhook_url_env": "MAKE_WEBHOOK_URL"}, ...]}
+    A feed may give "webhook_url" directly instead of "webhook_url_env", and
+    "webhook_batch": true if its receiver accepts a JSON array of events.
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    feeds = config.get("feeds") or []
+    for feed_config in feeds:
+        missing = [key for key in ("name", "rss_url", "voicy_channel_url") if not feed_config.get(key)]
+        if missing:
+            raise ValueError(f"Feed entry {feed_config} in {config_path} is missing {', '.join(missing)}")
+    names = [feed_config["name"] for feed_config in feeds]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Feed names in {config_path} must be unique")
+    return config
+
+@timed("feed_parse", source="rss_monitor")
+def _parse_feed(body: bytes) -> dict:
+    """
+    Parses a feed body.
+
+    Returns:
+        A dict with 'latest_entry' (the newest entry or None), 'episodes'
+        (guid/title/published dicts of every entry with a GUID, newest first),
+        'publish_times' (epoch seconds of every entry's published_parsed) and
+        'ttl_minutes' (the channel's <ttl>, or None).
+    """
+    import feedparser
+
+    feed = feedparser.parse(body)
+    if feed.bozo:
+        # feed.bozo is true if the feed is not well-formed XML
+        # feed.bozo_exception contains the exception that feedparser raised
+        log_message(f"Warning: RSS feed may be malformed. Reason: {feed.bozo_exception}")
+        # Depending on the severity, you might want to stop or try to proceed
+    ttl = str(feed.feed.get("ttl", "")).strip()
+    return {
+        # Entries are usually sorted newest first by feedparser if not specified by the feed itself
+        "latest_entry": feed.entries[0] if feed.entries else None,
+        "episodes": [{"guid": entry.get("guid"), "title": entry.get("title", "(No Title)"),
+                      "published": entry.get("published", entry.get("updated"))}
+                     for entry in feed.entries if entry.get("guid")],
+        "publish_times": [calendar.timegm(entry.published_parsed) for entry in feed.entries
+                          if entry.get("published_parsed")],
+        "ttl_minutes": int(ttl) if ttl.isdigit() else None,
+    }
+
+def _take_latest_pending(ledger: EpisodeLedger, feed_url: str, label: str = "") -> dict | None:
+    """
+    Returns the newest detected episode of a feed that has not been sent yet.
+
+    As before, only the newest episode of a run is forwarded; older unsent
+    episodes are marked as skipped. An episode whose scrape or webhook failed
+    stays pending and is retried on the next run.
+    """
+    pending = ledger.pending(feed_url, STAGE_SENT)
+    if not pending:
+        return None
+    superseded = pending[:-1]
+    if superseded:
+        ledger.record_many(feed_url, [(episode["guid"], None) for episode in superseded], STAGE_SENT, STATUS_SKIPPED)
+        log_message(f"{label}Skipping {len(superseded)} older unsent episode(s) superseded by the newest one "
+                    f"(src/backfill.py --ledger {LEDGER_FILE_PATH} delivers them later).")
+    return pending[-1]
+
+def _deliver_episode(ledger: EpisodeLedger, outbox: WebhookOutbox, feed_url: str, episode: dict,
+                     scrape_result: ScrapeResult, webhook_url: str | None, webhook_label: str,
+                     label: str = "", batch: bool = False):
+    """
+    Records the scrape and queues the Voicy URL in the webhook outbox.
+
+    The episode is marked sent with status 'queued'; _drain_outbox() turns
+    that into 'done' (or 'failed') once the outbox knows the outcome.
+    """
+    if not scrape_result.url:
+        log_message(f"{label}Failed to obtain Voicy URL: {scrape_result.error}. Will retry on the next run.")
+        return
+    log_message(f"{label}Successfully obtained Voicy URL via {scrape_result.method}: {scrape_result.url}")
+    payload = {"voicy_url": scrape_result.url, "method": scrape_result.method}
+    ledger.record(feed_url, episode["guid"], STAGE_SCRAPED, payload)
+    if not webhook_url:
+        log_message(f"{webhook_label} is not set. Skipping webhook call.")
+        # Nothing to deliver to; do not keep the episode pending forever.
+        ledger.record(feed_url, episode["guid"], STAGE_SENT, payload, status=STATUS_SKIPPED)
+        return
+    # The ref ties the outbox event back to its ledger row (and de-duplicates re-queues after a crash).
+    outbox.enqueue(webhook_url, build_payload(scrape_result.url), ref=json.dumps([feed_url, episode["guid"]]), batch=batch)
+    ledger.record(feed_url, episode["guid"], STAGE_SENT, payload, status=STATUS_QUEUED)
+    log_message(f"{label}Queued Voicy URL for the Make.com webhook.")
+
+def _drain_outbox(ledger: EpisodeLedger, deliverer: WebhookDeliverer, budget_seconds: float):
+    """Delivers queued webhook events and records the outcome of each one in the ledger."""
+    results = deliverer.drain(budget_seconds)
+    for result in results:
+        if not result.get("ref") or result["status"] not in (OUTBOX_SENT, OUTBOX_DEAD):
+            continue
+        feed_url, guid = json.loads(result["ref"])
+        ledger.record(feed_url, guid, STAGE_SENT, status=STATUS_DONE if result["status"] == OUTBOX_SENT else STATUS_FAILED)
+        if result["status"] == OUTBOX_SENT:
+            log_message(f"Successfully sent Voicy URL for {guid} to Make.com webhook.")
+        else:
+            log_message(f"Failed to send Voicy URL for {guid} to Make.com webhook; giving up: {result['error']}")
+    still_pending = deliverer.outbox.pending_count()
+    if still_pending:
+        log_message(f"{still_pending} webhook event(s) left in the outbox for a later retry.")
+
+def run_voicy_scraper(episode: dict | None = None) -> ScrapeResult:
+    """
+    Looks up the Voicy episode URL for VOICY_CHANNEL_URL.
+
+    With VOICY_RESOLVE_MODE=match (default) and an episode, the Voicy episode
+    matching its title and publish date is looked up in the channel's listing;
+    otherwise the latest episode on the page is taken. Runs in-process by
+    default. Set VOICY_SCRAPER_MODE=subprocess to run voicy_scraper.py (latest
+    episode only) in its own interpreter instead (e.g. to isolate a misbehaving
+    ChromeDriver from the monitor).
+    """
+    if VOICY_SCRAPER_MODE == "subprocess":
+        return run_voicy_scraper_subprocess()
+
+    log_message(f"Attempting to look up Voicy episode in-process for channel: {VOICY_CHANNEL_URL}")
+    if VOICY_RESOLVE_MODE == "match" and episode is not None:
+        with VoicyEpisodeIndex(VOICY_INDEX_FILE_PATH) as index:
+            result = resolve_voicy_episode(VOICY_CHANNEL_URL, episode, index)
+    else:
+        result = scrape_latest_voicy_episode(VOICY_CHANNEL_URL)
+    timings = ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in result.timings.items())
+    log_message(f"Voicy lookup finished via {result.method} in {result.elapsed_seconds:.2f}s ({timings}).")
+    if result.error:
+        log_message(f"Voicy lookup error: {result.error}")
+    return result
+
+def run_voicy_scraper_subprocess() -> ScrapeResult:
+    """Isolation mode: runs voicy_scraper.py as a child process and reads its JSON result line."""
+    log_message(f"Attempting to run Voicy scraper subprocess for channel: {VOICY_CHANNEL_URL}")
+    started = time.perf_counter()
     try:
         env = os.environ.copy()
         env["TEST_VOICY_CHANNEL_URL"] = VOICY_CHANNEL_URL
         # Ensure PYTHONIOENCODING is set for the subprocess as well, if needed for voicy_scraper.py
         env["PYTHONIOENCODING"] = "utf-8"
+        # The child logs to the shared JSON log itself; keep its stderr for crashes only.
+        env["LOG_CONSOLE"] = "0"
 
-        log_message(f"Running command: python {VOICY_SCRAPER_SCRIPT_PATH} from CWD: {PROJECT_ROOT}")
+        log_message(f"Running command: {sys.executable} {VOICY_SCRAPER_SCRIPT_PATH} from CWD: {PROJECT_ROOT}")
         process = subprocess.Popen(
-            ["python", VOICY_SCRAPER_SCRIPT_PATH],
+            [sys.executable, VOICY_SCRAPER_SCRIPT_PATH],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
@@ -82,92 +323,398 @@ def run_voicy_scraper() -> str | None:  # Modified to return the Voicy URL or No
             log_message("Voicy scraper ran successfully.")
         else:
             log_message(f"Voicy scraper failed with exit code {process.returncode}.")
-        
-        if stdout:
-            log_message(f"Voicy scraper STDOUT:\n{stdout.strip()}")
-            # Try to find the Voicy URL in stdout
-            for line in stdout.strip().split('\n'):
-                if line.startswith("VOICY_EPISODE_URL:"):
-                    fetched_voicy_url = line.split("VOICY_EPISODE_URL:", 1)[1].strip()
-                    log_message(f"Extracted Voicy URL from stdout: {fetched_voicy_url}")
-                    break
         if stderr:
             log_message(f"Voicy scraper STDERR:\n{stderr.strip()}")
 
-        # Check the main log file of the scraper for confirmation
-        scraper_main_log = os.path.join(PROJECT_ROOT, "scraper_run_log.txt")
-        if os.path.exists(scraper_main_log):
-            with open(scraper_main_log, "r", encoding="utf-8") as f_log:
-                log_message(f"Content of {scraper_main_log} after run:\n{f_log.read().strip()}")
-        else:
-            log_message(f"{scraper_main_log} not found after scraper run.")
-        
-        return fetched_voicy_url # Return the extracted URL or None (if not found in stdout)
+        for line in (stdout or "").splitlines():
+            if line.startswith(SCRAPE_RESULT_STDOUT_PREFIX):
+                result = ScrapeResult.from_dict(json.loads(line[len(SCRAPE_RESULT_STDOUT_PREFIX):]))
+                log_message(f"Voicy scraper subprocess result: url={result.url}, method={result.method}, "
+                            f"elapsed={result.elapsed_seconds:.2f}s, error={result.error}")
+                return result
+
+        return ScrapeResult(None, METHOD_SUBPROCESS, time.perf_counter() - started,
+                            f"no result line in scraper output (exit code {process.returncode})")
 
     except subprocess.TimeoutExpired:
+        process.kill()
         log_message("Voicy scraper timed out after 5 minutes.")
-        return None # Ensure a return path if timeout occurs
+        return ScrapeResult(None, METHOD_SUBPROCESS, time.perf_counter() - started, "timed out after 5 minutes")
     except Exception as e:
         log_message(f"An error occurred while running Voicy scraper: {e}")
-        return None # Ensure a return path if an exception occurs
+        return ScrapeResult(None, METHOD_SUBPROCESS, time.perf_counter() - started, str(e))
+
+def _detect_default_feed(ledger: EpisodeLedger, coordinator: WorkerCoordinator | None = None) -> bool:
+    """Fetches STANDFM_RSS_URL and records new episodes in the ledger. Returns False on error."""
+    log_message(f"Fetching RSS feed from: {STANDFM_RSS_URL}")
+    with span("feed_fetch", source="rss_monitor") as fetch_span:
+        fetch_result = fetch_feed(STANDFM_RSS_URL, FEED_CACHE_FILE_PATH)
+        if fetch_result['status'] == STATUS_ERROR:
+            fetch_span.fail()
+    if fetch_result['status'] == STATUS_ERROR:
+        log_message(f"Error fetching RSS feed: {fetch_result['error']}")
+        return False
+    if fetch_result['status'] != STATUS_MODIFIED:
+        # 304 Not Modified or identical body hash: skip XML parsing completely.
+        log_message(f"RSS feed unchanged ({fetch_result['status']}, {fetch_result['elapsed'] * 1000:.0f} ms).")
+        with _shared_files_lock(coordinator):
+            save_feed_cache(FEED_CACHE_FILE_PATH, STANDFM_RSS_URL, fetch_result['validators'])
+        return True
+
+    try:
+        parsed = _parse_feed(fetch_result['body'])
+    except Exception as e:
+        log_message(f"Error parsing RSS feed: {e}")
+        return False
+
+    latest_entry = parsed["latest_entry"]
+    if latest_entry is None:
+        log_message("No entries found in RSS feed.")
+    elif not latest_entry.get("guid"):
+        log_message("Error: Could not find GUID for the latest entry in the RSS feed. Cannot determine if new.")
+    else:
+        log_message(f"Latest entry in RSS: GUID='{latest_entry.get('guid')}', Title='{latest_entry.get('title', '(No Title)')}', "
+                    f"PubDate='{latest_entry.get('published', latest_entry.get('updated', '(No Date)'))}'")
+
+    # Set difference against the ledger; the old JSON GUID only seeds a fresh ledger.
+    new_episodes = ledger.detect_new(STANDFM_RSS_URL, parsed["episodes"],
+                                     legacy_last_guid=load_last_processed_guid())
+    for episode in reversed(new_episodes):
+        log_message(f"New episode detected! GUID: {episode['guid']} (Title: {episode['title']}).")
+
+    # Remember the validators once the detected episodes are safely in the ledger.
+    with _shared_files_lock(coordinator):
+        save_feed_cache(FEED_CACHE_FILE_PATH, STANDFM_RSS_URL, fetch_result['validators'])
+    return True
 
-def main():
+def main(coordinator: WorkerCoordinator | None = None):
     log_message("--- RSS Monitor Started ---")
 
-    last_processed_guid = load_last_processed_guid()
-    log_message(f"Last processed GUID from state file: {last_processed_guid}")
+    with EpisodeLedger(LEDGER_FILE_PATH) as ledger, WebhookOutbox(OUTBOX_FILE_PATH) as outbox:
+        feed_ok = True
+        if not _owned_feeds([_default_feed_config()], coordinator):
+            log_message(f"The feed is being handled by worker {coordinator.store.owner('feed:' + STANDFM_RSS_URL)}.")
+        else:
+            feed_ok = _detect_default_feed(ledger, coordinator)
+
+            # Episodes whose scrape failed on an earlier run are retried here too.
+            episode = _take_latest_pending(ledger, STANDFM_RSS_URL)
+            if episode is None:
+                log_message("No new episode. Every detected episode has been handled.")
+            else:
+                log_message(f"Processing episode GUID: {episode['guid']} (Title: {episode.get('title')}).")
+                scrape_result = run_voicy_scraper(episode)
+                _deliver_episode(ledger, outbox, STANDFM_RSS_URL, episode, scrape_result,
+                                 os.environ.get("MAKE_WEBHOOK_URL"), "MAKE_WEBHOOK_URL environment variable")
+
+        # Deliver this run's event plus anything left over from earlier runs, even if the fetch failed.
+        if _may_drain(coordinator):
+            deliverer = WebhookDeliverer(outbox)
+            try:
+                _drain_outbox(ledger, deliverer, WEBHOOK_DRAIN_SECONDS)
+            finally:
+                deliverer.close()
+    log_message("--- RSS Monitor Finished ---" if feed_ok else "--- RSS Monitor Finished (Error) ---")
+
+def check_only(config_path: str | None = None) -> int:
+    """
+    Fast path for schedulers: reports whether a full run has anything to do, without doing it.
+
+    Only fetches the feeds (conditionally) and looks at the ledger and the
+    outbox; nothing is recorded, so the next full run still sees the change.
+    With a config file every feed listed there is checked, otherwise
+    STANDFM_RSS_URL.
+
+    Returns:
+        CHECK_WORK_PENDING if there is a new episode, an unsent episode or a
+        queued webhook event; CHECK_NOTHING_TO_DO otherwise; CHECK_ERROR if the
+        config could not be loaded or a feed could not be fetched or parsed.
+    """
+    if config_path:
+        try:
+            feeds = load_monitor_config(config_path).get("feeds") or []
+        except (OSError, ValueError) as e:
+            log_message(f"Check: could not load monitor config {config_path}: {e}")
+            return CHECK_ERROR
+    else:
+        feeds = [_default_feed_config()]
+    new_count = unsent_count = 0
+    failed = []
+    with EpisodeLedger(LEDGER_FILE_PATH) as ledger:
+        for feed_config in feeds:
+            feed_url = feed_config["rss_url"]
+            new_episodes = peek_new_episodes(feed_url, ledger, FEED_CACHE_FILE_PATH)
+            if new_episodes is None:
+                failed.append(feed_config["name"])
+            else:
+                new_count += len(new_episodes)
+            unsent_count += len(ledger.pending(feed_url, STAGE_SENT))
+    queued = 0
+    if os.path.exists(OUTBOX_FILE_PATH):
+        with WebhookOutbox(OUTBOX_FILE_PATH) as outbox:
+            queued = outbox.pending_count()
+    if failed:
+        log_message(f"Check: could not fetch or parse the RSS feed of {', '.join(failed)}.")
+        return CHECK_ERROR
+    log_message(f"Check: {new_count} new episode(s), {unsent_count} unsent episode(s), {queued} queued webhook event(s) "
+                f"across {len(feeds)} feed(s).")
+    return CHECK_WORK_PENDING if new_count or unsent_count or queued else CHECK_NOTHING_TO_DO
+
+def _feed_state(state: dict, feed_name: str) -> dict:
+    """Returns the mutable state dict of one feed; the default feed lives at the top level."""
+    if feed_name == DEFAULT_FEED_NAME:
+        return state
+    return state.setdefault("feeds", {}).setdefault(feed_name, {})
+
+def _default_feed_config() -> dict:
+    return {"name": DEFAULT_FEED_NAME, "rss_url": STANDFM_RSS_URL, "voicy_channel_url": VOICY_CHANNEL_URL}
+
+def process_feeds(feeds: list[dict], config: dict, state: dict, ledger: EpisodeLedger,
+                  outbox: WebhookOutbox, pool=None, unconditional_urls=(),
+                  coordinator: WorkerCoordinator | None = None) -> dict:
+    """
+    Runs one polling pass over the given feeds and handles any new episodes.
+
+    All feeds are polled concurrently (feed_poller), and Voicy lookups for the
+    feeds with a new episode share one browser pool. New episodes are recorded
+    in `ledger` (keyed by RSS URL) and unsent ones are retried even when the
+    feed itself is unchanged. Webhook events are only queued in `outbox`; the
+    caller drains it. Per-feed state in `state` is updated in place (the
+    caller saves it); feed validators are saved here (under the coordinator's
+    shared-files lock when several workers share them).
+
+    Returns:
+        A dict mapping feed name to {'status', 'max_age', 'ttl_minutes'} for scheduling.
+    """
+    from feed_poller import poll_feeds_sync, DEFAULT_PER_HOST_LIMIT, DEFAULT_JITTER_SECONDS
+
+    started = time.perf_counter()
+    with span("feed_poll"):
+        poll_results = poll_feeds_sync(
+            [feed_config["rss_url"] for feed_config in feeds], FEED_CACHE_FILE_PATH,
+            per_host_limit=int(config.get("per_host_limit", DEFAULT_PER_HOST_LIMIT)),
+            jitter_seconds=float(config.get("jitter_seconds", DEFAULT_JITTER_SECONDS)),
+            unconditional_urls=set(unconditional_urls),
+        )
+    log_message(f"Polled {len(feeds)} feeds in {time.perf_counter() - started:.2f}s.")
+
+    outcomes = {}
+    validators_to_save = {}
+    to_process = [] # (feed config, episode) - the newest unsent episode of each feed
+
+    for feed_config, result in zip(feeds, poll_results):
+        name = feed_config["name"]
+        feed_url = feed_config["rss_url"]
+        feed_state = _feed_state(state, name)
+        outcomes[name] = {"status": result['status'], "max_age": result.get('max_age'),
+                          "ttl_minutes": feed_state.get("ttl_minutes")}
+        if result['status'] == STATUS_ERROR:
+            log_message(f"[{name}] Error fetching RSS feed: {result['error']}")
+            continue
+        if result['status'] == STATUS_MODIFIED:
+            try:
+                parsed = _parse_feed(result['body'])
+            except Exception as e:
+                log_message(f"[{name}] Error parsing RSS feed: {e}")
+                outcomes[name]["status"] = STATUS_ERROR
+                continue
+            # Learn the channel's publishing rhythm for the daemon's scheduler.
+            feed_state["publish_history"] = merge_publish_history(feed_state.get("publish_history"), parsed["publish_times"])
+            feed_state["ttl_minutes"] = outcomes[name]["ttl_minutes"] = parsed["ttl_minutes"]
+
+            if parsed["latest_entry"] is not None and not parsed["latest_entry"].get("guid"):
+                log_message(f"[{name}] Error: Could not find GUID for the latest entry in the RSS feed.")
+            new_episodes = ledger.detect_new(feed_url, parsed["episodes"],
+                                             legacy_last_guid=feed_state.get("last_processed_guid"))
+            for episode in reversed(new_episodes):
+                log_message(f"[{name}] New episode detected! GUID: {episode['guid']} (Title: {episode['title']}).")
+        validators_to_save[result['url']] = result['validators']
+
+        episode = _take_latest_pending(ledger, feed_url, f"[{name}] ")
+        if episode is not None:
+            to_process.append((feed_config, episode))
+
+    if to_process:
+        if VOICY_RESOLVE_MODE == "match":
+            # One conditional listing request per episode; the pool is only used for pages that need a browser.
+            with VoicyEpisodeIndex(VOICY_INDEX_FILE_PATH) as index:
+                scrape_results = [resolve_voicy_episode(feed_config["voicy_channel_url"], episode, index, pool=pool)
+                                  for feed_config, episode in to_process]
+        else:
+            channel_urls = list(dict.fromkeys(feed_config["voicy_channel_url"] for feed_config, _ in to_process))
+            latest = scrape_many_voicy_channels(channel_urls, pool=pool)
+            scrape_results = [latest[feed_config["voicy_channel_url"]] for feed_config, _ in to_process]
+        for (feed_config, episode), scrape_result in zip(to_process, scrape_results):
+            name = feed_config["name"]
+            webhook_env = feed_config.get("webhook_url_env", "MAKE_WEBHOOK_URL")
+            webhook_url = feed_config.get("webhook_url") or os.environ.get(webhook_env)
+            _deliver_episode(ledger, outbox, feed_config["rss_url"], episode, scrape_result, webhook_url,
+                             f"[{name}] {webhook_env}", f"[{name}] ", batch=bool(feed_config.get("webhook_batch")))
+
+    # Remember the validators only after the feed bodies have been fully handled.
+    with _shared_files_lock(coordinator):
+        save_feed_cache_many(FEED_CACHE_FILE_PATH, validators_to_save)
+    log_message(f"{len(to_process)} episodes to deliver across {len(feeds)} feeds.")
+    return outcomes
 
+def main_multi(config_path: str, coordinator: WorkerCoordinator | None = None):
+    """
+    Monitors every feed listed in a config file in one run.
+
+    State is kept per feed name under "feeds" in the state file. With a
+    coordinator, only this worker's share of the feeds is polled (runs on
+    other hosts or overlapping runs take the rest).
+    """
+    log_message(f"--- RSS Monitor Started (multi-feed config: {config_path}) ---")
     try:
-        log_message(f"Fetching RSS feed from: {STANDFM_RSS_URL}")
-        feed = feedparser.parse(STANDFM_RSS_URL)
-    except Exception as e:
-        log_message(f"Error fetching or parsing RSS feed: {e}")
+        config = load_monitor_config(config_path)
+    except (OSError, ValueError) as e:
+        log_message(f"Error loading monitor config {config_path}: {e}")
         log_message("--- RSS Monitor Finished (Error) ---")
         return
-
-    if feed.bozo:
-        # feed.bozo is true if the feed is not well-formed XML
-        # feed.bozo_exception contains the exception that feedparser raised
-        log_message(f"Warning: RSS feed may be malformed. Reason: {feed.bozo_exception}")
-        # Depending on the severity, you might want to stop or try to proceed
-
-    if not feed.entries:
-        log_message("No entries found in RSS feed.")
+    feeds = config.get("feeds") or []
+    if not feeds:
+        log_message("No feeds configured.")
         log_message("--- RSS Monitor Finished ---")
         return
 
-    # Entries are usually sorted newest first by feedparser if not specified by the feed itself
-    latest_entry = feed.entries[0]
-    latest_guid = latest_entry.get("guid")
-    latest_title = latest_entry.get("title", "(No Title)")
-    latest_pubdate = latest_entry.get("published", latest_entry.get("updated", "(No Date)"))
-
-    log_message(f"Latest entry in RSS: GUID='{latest_guid}', Title='{latest_title}', PubDate='{latest_pubdate}'")
-
-    if latest_guid:
-        if latest_guid != last_processed_guid:
-            log_message(f"New episode detected! GUID: {latest_guid} (Title: {latest_title}). Previous GUID was: {last_processed_guid}.")
-            voicy_url = run_voicy_scraper()
-            if voicy_url:
-                log_message(f"Successfully obtained Voicy URL: {voicy_url}")
-                make_webhook_url = os.environ.get("MAKE_WEBHOOK_URL")
-                if make_webhook_url:
-                    log_message(f"Attempting to send Voicy URL to Make.com webhook.")
-                    if send_to_make_webhook(make_webhook_url, voicy_url):
-                        log_message("Successfully sent Voicy URL to Make.com webhook.")
-                    else:
-                        log_message("Failed to send Voicy URL to Make.com webhook.")
-                else:
-                    log_message("MAKE_WEBHOOK_URL environment variable not set. Skipping webhook call.")
-            else:
-                log_message("Failed to obtain Voicy URL from scraper.")
-            save_last_processed_guid(latest_guid) # Save new GUID regardless of webhook outcome, but after scraper attempt
-        else:
-            log_message("No new episode. Latest GUID matches the last processed GUID.")
+    owned = _owned_feeds(feeds, coordinator)
+    if coordinator is not None:
+        log_message(f"Polling {len(owned)} of {len(feeds)} feeds; other workers have the rest.")
+    state = load_state()
+    with EpisodeLedger(LEDGER_FILE_PATH) as ledger, WebhookOutbox(OUTBOX_FILE_PATH) as outbox:
+        if owned:
+            process_feeds(owned, config, state, ledger, outbox, coordinator=coordinator)
+            with _shared_files_lock(coordinator):
+                save_state(state, [feed_config["name"] for feed_config in owned] if coordinator else None)
+        if _may_drain(coordinator):
+            deliverer = WebhookDeliverer(outbox)
+            try:
+                _drain_outbox(ledger, deliverer, WEBHOOK_DRAIN_SECONDS)
+            finally:
+                deliverer.close()
+    log_message("--- RSS Monitor Finished ---")
+
+def run_daemon(config_path: str | None = None, coordinator: WorkerCoordinator | None = None):
+    """
+    Stays resident and polls each feed on its own adaptive schedule (see poll_scheduler).
+
+    Feeds come from the config file, or the built-in STANDFM_RSS_URL /
+    VOICY_CHANNEL_URL pair if no config is given. A warm browser pool is kept
+    for the whole lifetime of the daemon. SIGINT / SIGTERM stop it after the
+    current pass. With a coordinator, each pass polls only the due feeds this
+    worker holds the lease of; feeds move between daemons as they start and stop.
+    """
+    log_message("--- RSS Monitor Daemon Started ---")
+    if config_path:
+        config = load_monitor_config(config_path)
+        feeds = config.get("feeds") or []
     else:
-        log_message("Error: Could not find GUID for the latest entry in the RSS feed. Cannot determine if new.")
+        config = {}
+        feeds = [_default_feed_config()]
+    if not feeds:
+        log_message("No feeds configured.")
+        return
 
-    log_message("--- RSS Monitor Finished ---")
+    stop_event = threading.Event()
+    def _request_stop(signum, frame):
+        log_message(f"Received signal {signum}; stopping after the current pass.")
+        stop_event.set()
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
+    next_due = {feed_config["name"]: 0.0 for feed_config in feeds}
+    consecutive_errors = {feed_config["name"]: 0 for feed_config in feeds}
+    pool = BrowserPool(driver_factory=create_chrome_driver)
+    ledger = EpisodeLedger(LEDGER_FILE_PATH)
+    outbox = WebhookOutbox(OUTBOX_FILE_PATH)
+    deliverer = WebhookDeliverer(outbox)
+    try:
+        while not stop_event.is_set():
+            now = time.time()
+            due_feeds = [feed_config for feed_config in feeds if next_due[feed_config["name"]] <= now]
+            if coordinator is not None and due_feeds:
+                owned = _owned_feeds(due_feeds, coordinator)
+                for feed_config in due_feeds:
+                    if feed_config not in owned:
+                        # Another daemon polls it; look again after a heartbeat in case that one stops.
+                        next_due[feed_config["name"]] = now + coordinator.ttl_seconds / 3
+                due_feeds = owned
+            if due_feeds:
+                state = load_state()
+                # Feeds without a learned history are fetched in full once so the scheduler has data.
+                unconditional_urls = {feed_config["rss_url"] for feed_config in due_feeds
+                                      if not _feed_state(state, feed_config["name"]).get("publish_history")}
+                try:
+                    outcomes = process_feeds(due_feeds, config, state, ledger, outbox, pool, unconditional_urls, coordinator)
+                    with _shared_files_lock(coordinator):
+                        save_state(state, [feed_config["name"] for feed_config in due_feeds] if coordinator else None)
+                except Exception as e:
+                    log_message(f"Error during polling pass: {e}")
+                    outcomes = {feed_config["name"]: {"status": STATUS_ERROR} for feed_config in due_feeds}
+                for feed_config in due_feeds:
+                    name = feed_config["name"]
+                    outcome = outcomes.get(name, {})
+                    consecutive_errors[name] = consecutive_errors[name] + 1 if outcome.get("status") == STATUS_ERROR else 0
+                    wait = next_poll_interval(
+                        _feed_state(state, name).get("publish_history") or [],
+                        ttl_minutes=outcome.get("ttl_minutes"),
+                        max_age_seconds=outcome.get("max_age"),
+                        consecutive_errors=consecutive_errors[name],
+                    )
+                    next_due[name] = time.time() + wait
+                    log_message(f"[{name}] Next poll in {wait / 60:.1f} min.")
+            # One delivery pass per wake-up; failed events are retried on their own backoff schedule.
+            draining = _may_drain(coordinator)
+            if draining:
+                try:
+                    _drain_outbox(ledger, deliverer, 0)
+                except Exception as e:
+                    log_message(f"Error while delivering webhook events: {e}")
+            # Wake up for the next due feed or webhook retry (and at least every 5 minutes to notice signals on Windows).
+            wake_at = min([*next_due.values(), (outbox.next_attempt_at() if draining else None) or float("inf")])
+            stop_event.wait(min(max(wake_at - time.time(), 1.0), 300.0))
+    finally:
+        pool.close()
+        deliverer.close()
+        outbox.close()
+        ledger.close()
+        log_message("--- RSS Monitor Daemon Finished ---")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Watch stand.fm feeds and forward new Voicy episode URLs.")
+    parser.add_argument("--config", default=os.environ.get("RSS_MONITOR_CONFIG"),
+                        help="JSON file listing feed -> Voicy channel -> webhook mappings (multi-feed mode).")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Stay resident and poll each feed on an adaptive schedule instead of running once.")
+    parser.add_argument("--check-only", action="store_true",
+                        help="Only check whether a run has work to do (exit 0: yes, 1: no, 2: feed error); changes nothing.")
+    parser.add_argument("--leases", default=WORKER_LEASES,
+                        help="Share the feeds with other workers through this lease store: a SQLite path or redis:// URL "
+                             "(default: WORKER_LEASES; empty runs alone).")
+    parser.add_argument("--worker-id", default=WORKER_ID, help="Name of this worker in the lease store (default: WORKER_ID).")
+    args = parser.parse_args()
+    configure_logging()
+    if args.check_only:
+        # A crash must not look like "nothing to do" (exit 1): the scheduler would skip the full run.
+        try:
+            status = check_only(args.config)
+        except Exception:
+            logger.exception("Check failed")
+            status = CHECK_ERROR
+        sys.exit(status)
+    # METRICS_PORT serves /metrics while running (mostly useful with --daemon); a JSON report is written on exit.
+    metrics_server = start_metrics_server()
+    coordinator = open_coordinator(args.leases, args.worker_id)
+    try:
+        if args.daemon:
+            run_daemon(args.config, coordinator)
+        elif args.config:
+            main_multi(args.config, coordinator)
+        else:
+            main(coordinator)
+    finally:
+        close_coordinator(coordinator)
+        write_run_report("rss_monitor_daemon" if args.daemon else "rss_monitor")
+        if metrics_server is not None:
+            metrics_server.shutdown()
@@ -0,0 +1,126 @@
+import time
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+from datetime import timezone
+
+# Incremental RSS 2.0 parser.
+# Instead of building every <item> of the feed into memory (as feedparser does),
+# bytes are pushed through an XMLPullParser chunk by chunk and each finished
+# <item> is converted to an _extract_episode_data()-shaped dict and discarded.
+# Feeds list the newest item first, so a run that stops at the last-known GUID
+# only ever reads the head of the document.
+
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+def iter_file_chunks(fileobj, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Yields byte chunks from a binary file-like object until EOF."""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+def _local_name(tag: str) -> str:
+    """Strips an '{namespace}' prefix from an element tag."""
+    return tag.rsplit('}', 1)[-1]
+
+def _published_iso(pub_date: str | None) -> str | None:
+    """Converts an RFC 822 pubDate to the same ISO 8601 UTC string rss_checker produces."""
+    if not pub_date:
+        return None
+    try:
+        published = parsedate_to_datetime(pub_date.strip())
+    except (TypeError, ValueError, IndexError):
+        return None
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return published.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _item_to_episode(item) -> dict | None:
+    """Builds an episode dict from a finished <item> element. Returns None without a GUID."""
+    guid = None
+    title = None
+    url = ''
+    pub_date = None
+    audio_url = None
+    for child in item:
+        name = _local_name(child.tag)
+        if name == 'guid':
+            guid = (child.text or '').strip() or None
+        elif name == 'title' and title is None:
+            title = (child.text or '').strip()
+        elif name == 'link' and not url:
+            url = (child.text or '').strip()
+        elif name == 'pubDate':
+            pub_date = child.text
+        elif name == 'enclosure' and audio_url is None:
+            if child.get('type', '').startswith('audio/'):
+                audio_url = child.get('url')
+    if not guid:
+        return None
+    return {
+        'title': title or 'N/A',
+        'url': url,
+        'published': _published_iso(pub_date),
+        'guid': guid,
+        'audio_url': audio_url
+    }
+
+def iter_feed_episodes(chunks, stop_guid: str | None = None, stop_when=None):
+    """
+    Parses an RSS feed incrementally and yields episode dicts in document order.
+
+    Args:
+        chunks: An iterable of bytes (e.g. response.iter_content() or iter_file_chunks()).
+        stop_guid: If given, parsing stops as soon as an item with this GUID is
+                   completed; that item itself is not yielded. No further chunks
+                   are pulled from the iterable after that point.
+        stop_when: Optional callable taking a GUID; parsing stops in the same
+                   way at the first item for which it returns True (e.g. a
+                   ledger lookup for "already seen").
+
+    Yields:
+        Dicts with 'title', 'url', 'published', 'guid' and 'audio_url', the same
+        shape rss_checker._extract_episode_data() returns. Items without a GUID
+        are skipped.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: If the document is not well-formed XML.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    parents = []  # Open elements, so a finished <item> can be detached from its <channel>
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == 'start':
+                parents.append(elem)
+                continue
+            parents.pop()
+            if _local_name(elem.tag) != 'item':
+                continue
+            episode = _item_to_episode(elem)
+            # Drop the finished item so memory stays bounded by a single <item>.
+            if parents:
+                parents[-1].remove(elem)
+            if episode is None:
+                continue
+            if stop_guid is not None and episode['guid'] == stop_guid:
+                return
+            if stop_when is not None and stop_when(episode['guid']):
+                return
+            yield episode
+    parser.close()
+
+if __name__ == '__main__':
+    # Quick manual check: python src/rss_stream_parser.py path/to/feed.xml [stop_guid]
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python src/rss_stream_parser.py <feed.xml> [stop_guid]")
+        sys.exit(1)
+    started = time.perf_counter()
+    with open(sys.argv[1], 'rb') as f:
+        count = 0
+        for episode in iter_feed_episodes(iter_file_chunks(f), sys.argv[2] if len(sys.argv) > 2 else None):
+            count += 1
+            print(f"{episode['published']}  {episode['guid']}  {episode['title']}")
+    print(f"--- {count} episodes in {(time.perf_counter() - started) * 1000:.1f} ms ---")
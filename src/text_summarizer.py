@@ -1 +1,611 @@
+import os
+import re
+import math
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from webhook_outbox import backoff_delay, parse_retry_after
+from metrics import span, timed
 
+# Summarises an episode transcript into one X (Twitter) post.
+# An hour-long transcript does not fit in one prompt, so it is summarised
+# map-reduce style: the transcript is split into sentences (。！？), packed
+# into chunks of at most SUMMARY_CHUNK_TOKENS estimated tokens, each chunk is
+# summarised on a thread pool (map), and the partial summaries are packed and
+# summarised again until one text remains, which is reduced to at most
+# SUMMARY_MAX_CHARS full-width characters. Chunks are summarised as soon as
+# they are complete, so a stream_transcribe() generator can be passed in
+# directly.
+#
+# The model is a pluggable backend with one method,
+# summarize(text, max_chars, stage): ExtractiveBackend (TextRank over
+# character bigrams, offline and deterministic) or OpenAIBackend (chat
+# completions over plain requests). get_backend() wraps paid backends in
+# MemoizingBackend, which answers repeated chunks from an on-disk memo.
+
+SUMMARY_MAX_CHARS = int(os.environ.get("SUMMARY_MAX_CHARS", "140"))        # Full-width characters (X counts them double)
+SUMMARY_CHUNK_TOKENS = int(os.environ.get("SUMMARY_CHUNK_TOKENS", "2000"))  # Estimated tokens per map call
+SUMMARY_PARTIAL_CHARS = int(os.environ.get("SUMMARY_PARTIAL_CHARS", "300")) # Length of each partial summary
+SUMMARY_CHUNK_OVERLAP_SENTENCES = int(os.environ.get("SUMMARY_CHUNK_OVERLAP", "1"))
+SUMMARY_MAX_WORKERS = int(os.environ.get("SUMMARY_MAX_WORKERS", "4"))       # Concurrent chunk calls
+SUMMARY_BACKEND = os.environ.get("SUMMARY_BACKEND", "")  # "extractive" or "openai"; default: openai if OPENAI_API_KEY is set
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_TIMEOUT_SECONDS = 60
+OPENAI_MAX_ATTEMPTS = 4
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUMMARY_CACHE_PATH = os.environ.get("SUMMARY_CACHE_PATH", os.path.join(PROJECT_ROOT, "data", "summary_cache.sqlite3"))
+SUMMARY_CACHE_TTL_SECONDS = float(os.environ.get("SUMMARY_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.environ.get("SUMMARY_CACHE_MAX_ENTRIES", "20000"))
+SUMMARY_CACHE_ENABLED = os.environ.get("SUMMARY_CACHE", "1") != "0"
+
+# Stages passed to backends
+STAGE_MAP = "map"
+STAGE_REDUCE = "reduce"
+
+# A sentence ends at 。！？ (or !?), including closing brackets after it, or at a line break.
+_SENTENCE_RE = re.compile(r'[^。！？!?\n]+(?:[。！？!?]+[」』）)"]*)?|[。！？!?]+[」』）)"]*')
+
+# Whitespace next to Japanese text or punctuation (line breaks, indentation) carries no meaning for the memo key
+_CJK_CHAR = r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]"
+_CJK_SPACE_RE = re.compile(rf"\s+(?={_CJK_CHAR})|(?<={_CJK_CHAR})\s+")
+_MEMO_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    memo_key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_summaries_lru ON summaries (last_used_at);
+CREATE INDEX IF NOT EXISTS idx_summaries_created ON summaries (created_at);
+"""
+
+logger = logging.getLogger(__name__)
+
+class SummarizerError(Exception):
+    """The summarisation backend failed."""
+
+def split_sentences(text: str) -> list[str]:
+    """Splits Japanese (or mixed) text into sentences at 。！？!? and line breaks."""
+    return [sentence.strip() for sentence in _SENTENCE_RE.findall(text or "") if sentence.strip()]
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer: one per non-ASCII character, one per four ASCII characters.
+
+    Japanese kana/kanji come out at about one token per character in current
+    OpenAI tokenizers, so this errs on the safe side.
+    """
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return (len(text) - ascii_chars) + math.ceil(ascii_chars / 4)
+
+def x_length(text: str) -> int:
+    """Length as X counts it: Latin script and common punctuation weigh 1, everything else (CJK, kana, emoji) 2."""
+    length = 0
+    for char in text:
+        code = ord(char)
+        if code <= 4351 or 8192 <= code <= 8205 or 8208 <= code <= 8223 or 8242 <= code <= 8247:
+            length += 1
+        else:
+            length += 2
+    return length
+
+def fit_to_length(text: str, max_chars: int) -> str:
+    """
+    Shortens text to at most max_chars full-width characters (x_length <= 2 * max_chars).
+
+    Whole sentences are dropped from the end first; a single sentence that is
+    still too long is cut and ends with "…".
+    """
+    limit = 2 * max_chars
+    text = text.strip()
+    if x_length(text) <= limit:
+        return text
+    sentences = split_sentences(text)
+    while len(sentences) > 1 and x_length("".join(sentences)) > limit:
+        sentences.pop()
+    text = "".join(sentences)
+    if x_length(text) <= limit:
+        return text
+    cut = []
+    length = 2  # Room for the ellipsis
+    for char in text:
+        length += x_length(char)
+        if length > limit:
+            break
+        cut.append(char)
+    return "".join(cut).rstrip("、，, ") + "…"
+
+def _split_long_sentence(sentence: str, max_tokens: int) -> list[str]:
+    if estimate_tokens(sentence) <= max_tokens:
+        return [sentence]
+    # No punctuation to split at (common in raw Whisper output): cut every max_tokens characters.
+    return [sentence[start:start + max_tokens] for start in range(0, len(sentence), max_tokens)]
+
+def iter_chunks(pieces, max_tokens: int = SUMMARY_CHUNK_TOKENS, overlap_sentences: int = SUMMARY_CHUNK_OVERLAP_SENTENCES):
+    """
+    Packs sentences into chunks of at most max_tokens estimated tokens.
+
+    Args:
+        pieces: Iterable of text pieces (a whole transcript, or transcript
+                segment texts as they arrive). A piece boundary is also a
+                sentence boundary.
+        max_tokens: Token budget per chunk.
+        overlap_sentences: Sentences repeated at the start of the next chunk,
+                           so a topic that straddles the boundary keeps its context.
+
+    Yields:
+        Chunk texts, each as soon as it is full.
+    """
+    chunk = []
+    chunk_tokens = 0
+    fresh = False # Whether the chunk has anything besides the overlap
+    for piece in pieces:
+        for long_sentence in split_sentences(piece):
+            for sentence in _split_long_sentence(long_sentence, max_tokens):
+                tokens = estimate_tokens(sentence)
+                if fresh and chunk_tokens + tokens > max_tokens:
+                    yield "".join(chunk)
+                    chunk = chunk[-overlap_sentences:] if overlap_sentences > 0 else []
+                    chunk_tokens = sum(estimate_tokens(kept) for kept in chunk)
+                    while chunk and chunk_tokens + tokens > max_tokens:
+                        chunk_tokens -= estimate_tokens(chunk.pop(0))
+                    fresh = False
+                chunk.append(sentence)
+                chunk_tokens += tokens
+                fresh = True
+    if fresh:
+        yield "".join(chunk)
+
+def _bigrams(sentence: str) -> list[str]:
+    chars = re.sub(r"\s+", "", sentence)
+    return [chars[i:i + 2] for i in range(len(chars) - 1)] or [chars]
+
+def textrank(sentences: list[str], damping: float = 0.85, iterations: int = 50, tolerance: float = 1e-6) -> list[float]:
+    """
+    Scores sentences with TextRank over TF-IDF weighted character bigrams.
+
+    Character bigrams stand in for words, so no Japanese tokenizer is needed.
+
+    Returns:
+        One score per sentence (higher is more central).
+    """
+    count = len(sentences)
+    if count <= 1:
+        return [1.0] * count
+    term_counts = [Counter(_bigrams(sentence)) for sentence in sentences]
+    document_frequency = Counter(term for counts in term_counts for term in counts)
+    idf = {term: math.log((1 + count) / (1 + frequency)) + 1 for term, frequency in document_frequency.items()}
+    vectors = [{term: tf * idf[term] for term, tf in counts.items()} for counts in term_counts]
+    norms = [math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0 for vector in vectors]
+
+    similarity = [[0.0] * count for _ in range(count)]
+    for i in range(count):
+        for j in range(i + 1, count):
+            small, large = (vectors[i], vectors[j]) if len(vectors[i]) < len(vectors[j]) else (vectors[j], vectors[i])
+            dot = sum(weight * large[term] for term, weight in small.items() if term in large)
+            similarity[i][j] = similarity[j][i] = dot / (norms[i] * norms[j])
+    out_weight = [sum(row) or 1.0 for row in similarity]
+
+    scores = [1.0 / count] * count
+    for _ in range(iterations):
+        updated = [(1 - damping) / count + damping * sum(similarity[j][i] / out_weight[j] * scores[j] for j in range(count))
+                   for i in range(count)]
+        converged = max(abs(a - b) for a, b in zip(updated, scores)) < tolerance
+        scores = updated
+        if converged:
+            break
+    return scores
+
+class ExtractiveBackend:
+    """Offline backend: keeps the most central sentences (TextRank) in their original order."""
+
+    name = "extractive"
+
+    def summarize(self, text: str, max_chars: int, stage: str = STAGE_MAP) -> str:
+        sentences = split_sentences(text)
+        if len("".join(sentences)) <= max_chars:
+            return "".join(sentences)
+        scores = textrank(sentences)
+        chosen = set()
+        length = 0
+        for index in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+            if length + len(sentences[index]) <= max_chars:
+                chosen.add(index)
+                length += len(sentences[index])
+        if not chosen:
+            best = max(range(len(sentences)), key=lambda i: scores[i])
+            return fit_to_length(sentences[best], max_chars)
+        return "".join(sentences[index] for index in sorted(chosen))
+
+class OpenAIBackend:
+    """Chat-completions backend (OPENAI_API_KEY). Retries 429/5xx with backoff, honouring Retry-After."""
+
+    name = "openai"
+
+    PROMPTS = {
+        STAGE_MAP: ("以下はポッドキャスト音声の文字起こしの一部です。話題・固有名詞・結論を落とさずに、"
+                    "{max_chars}文字以内の日本語で要約してください。要約本文のみを出力してください。"),
+        STAGE_REDUCE: ("以下はポッドキャスト1エピソード分の部分要約です。エピソード全体の要点を、X (旧Twitter) に"
+                       "投稿できる{max_chars}文字以内の日本語1段落にまとめてください。ハッシュタグやURLは付けず、"
+                       "要約本文のみを出力してください。"),
+    }
+
+    def __init__(self, api_key: str | None = OPENAI_API_KEY, model: str = OPENAI_MODEL,
+                 base_url: str = OPENAI_BASE_URL, session: requests.Session | None = None,
+                 timeout: float = OPENAI_TIMEOUT_SECONDS, max_attempts: int = OPENAI_MAX_ATTEMPTS):
+        if not api_key:
+            raise SummarizerError("OPENAI_API_KEY is not set.")
+        self.model = model
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.session = session or requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+
+    def summarize(self, text: str, max_chars: int, stage: str = STAGE_MAP) -> str:
+        body = {
+            "model": self.model,
+            "temperature": 0.2,
+            "max_tokens": max(64, max_chars * 2),
+            "messages": [
+                {"role": "system", "content": self.PROMPTS[stage].format(max_chars=max_chars)},
+                {"role": "user", "content": text},
+            ],
+        }
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with span("summary_request", stage=stage) as request_span:
+                    response = self.session.post(self.url, data=data, timeout=self.timeout)
+                    if response.status_code != 200:
+                        request_span.fail()
+            except requests.exceptions.RequestException as e:
+                error, retry_after = str(e) or type(e).__name__, None
+            else:
+                if response.status_code == 200:
+                    try:
+                        return response.json()["choices"][0]["message"]["content"].strip()
+                    except (ValueError, KeyError, IndexError, TypeError) as e:
+                        raise SummarizerError(f"Unexpected response from {self.url}: {e}")
+                error = f"HTTP {response.status_code}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if response.status_code not in (408, 409, 429) and response.status_code < 500:
+                    raise SummarizerError(f"{error} from {self.url}: {response.text[:200]}")
+            if attempt == self.max_attempts:
+                raise SummarizerError(f"{error} from {self.url} after {attempt} attempt(s)")
+            delay = max(backoff_delay(attempt, base=1.0, cap=30.0), retry_after or 0)
+            logger.warning(f"Summary request failed ({error}); retrying in {delay:.1f}s (attempt {attempt}/{self.max_attempts}).")
+            time.sleep(delay)
+
+class MemoizingBackend:
+    """
+    Wraps a backend with a persistent, coalescing memo of its answers.
+
+    The key is a SHA-256 over the normalised input text (NFKC, whitespace
+    collapsed, and dropped next to Japanese text), the stage, the length limit and the backend's identity (name,
+    model and prompt), so retries, reruns and overlapping chunk windows that
+    produce the same chunk are answered from SQLite instead of the API.
+    Concurrent calls with the same key share one upstream call. Entries
+    expire after ttl_seconds; beyond max_entries the least recently used
+    ones are evicted. Failures are not cached.
+    """
+
+    def __init__(self, backend, path: str = SUMMARY_CACHE_PATH, ttl_seconds: float = SUMMARY_CACHE_TTL_SECONDS,
+                 max_entries: int = SUMMARY_CACHE_MAX_ENTRIES):
+        self.backend = backend
+        self.name = backend.name
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "evictions": 0}
+        self._in_flight = {} # key -> Future of the upstream call
+        self._lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_MEMO_SCHEMA)
+
+    def _identity(self, stage: str) -> dict:
+        prompts = getattr(self.backend, "PROMPTS", {})
+        return {"backend": self.backend.name, "model": getattr(self.backend, "model", None), "prompt": prompts.get(stage)}
+
+    def key(self, text: str, max_chars: int, stage: str = STAGE_MAP) -> str:
+        normalised = _CJK_SPACE_RE.sub("", re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip())
+        canonical = json.dumps({"text": normalised, "stage": stage, "max_chars": max_chars, **self._identity(stage)},
+                               sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT summary, created_at FROM summaries WHERE memo_key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                return None
+            self._conn.execute("UPDATE summaries SET last_used_at = ? WHERE memo_key = ?", (now, key))
+        return row[0]
+
+    def _store(self, key: str, summary: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (memo_key, summary, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, summary, now, now),
+            )
+            evicted = self._conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+            excess = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                evicted += self._conn.execute(
+                    "DELETE FROM summaries WHERE memo_key IN (SELECT memo_key FROM summaries ORDER BY last_used_at LIMIT ?)",
+                    (excess,),
+                ).rowcount
+            self.stats["evictions"] += evicted
+
+    def summarize(self, text: str, max_chars: int, stage: str = STAGE_MAP) -> str:
+        key = self.key(text, max_chars, stage)
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                return cached
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not owner:
+            return future.result()
+        try:
+            summary = self.backend.summarize(text, max_chars, stage)
+        except BaseException as e:
+            with self._lock:
+                self.stats["errors"] += 1
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, summary)
+            del self._in_flight[key]
+        future.set_result(summary)
+        return summary
+
+    def close(self):
+        """Checkpoints the WAL into the main file and closes."""
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def get_backend(name: str | None = None, cache: bool = SUMMARY_CACHE_ENABLED):
+    """
+    Returns the backend named by `name` / SUMMARY_BACKEND (default: openai when OPENAI_API_KEY is set).
+
+    The openai backend is wrapped in MemoizingBackend unless cache is False
+    (SUMMARY_CACHE=0); the extractive one is cheaper to rerun than to look up.
+    """
+    name = (name or SUMMARY_BACKEND or ("openai" if OPENAI_API_KEY else "extractive")).lower()
+    if name == "openai":
+        return MemoizingBackend(OpenAIBackend()) if cache else OpenAIBackend()
+    if name == "extractive":
+        return ExtractiveBackend()
+    raise ValueError(f"Unknown summary backend: {name}")
+
+def _pack(texts: list[str], max_tokens: int) -> list[str]:
+    """Concatenates consecutive texts into groups of at most max_tokens (a text over budget stays on its own)."""
+    groups = []
+    group_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if groups and group_tokens + tokens <= max_tokens:
+            groups[-1] += "\n" + text
+            group_tokens += tokens
+        else:
+            groups.append(text)
+            group_tokens = tokens
+    return groups
+
+@timed("summarize")
+def summarize_transcript(transcript, backend=None, max_chars: int = SUMMARY_MAX_CHARS,
+                         chunk_tokens: int = SUMMARY_CHUNK_TOKENS, partial_chars: int = SUMMARY_PARTIAL_CHARS,
+                         max_workers: int = SUMMARY_MAX_WORKERS) -> dict:
+    """
+    Summarises a transcript into one post of at most max_chars full-width characters.
+
+    Args:
+        transcript: The transcript text, or an iterable of transcript segments
+                    ({'text': ...} dicts or strings), e.g. transcribe_audio()['segments']
+                    or a stream_transcribe() generator. Chunks are summarised
+                    while the iterable is still being consumed.
+        backend: Object with summarize(text, max_chars, stage); default get_backend().
+        max_chars: Length of the final summary in full-width characters.
+        chunk_tokens: Estimated token budget of one backend call's input.
+        partial_chars: Length of each partial (map) summary.
+        max_workers: Concurrent backend calls.
+
+    Returns:
+        A dict with 'summary', 'chunks' (map inputs), 'rounds' (map rounds,
+        0 when the transcript fits in one call), 'calls', 'backend' and 'elapsed'.
+
+    Raises:
+        SummarizerError: If the backend fails.
+    """
+    backend = backend or get_backend()
+    started = time.perf_counter()
+    # At least three partials must fit in one call, or a reduce round would not shrink anything.
+    partial_chars = max(1, min(partial_chars, chunk_tokens // 3))
+    pieces = [transcript] if isinstance(transcript, str) else (
+        piece["text"] if isinstance(piece, dict) else piece for piece in transcript)
+    chunks = iter_chunks(pieces, chunk_tokens)
+    calls = 0
+    rounds = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # Hold the first chunk back until a second one exists: a short transcript needs only the reduce call.
+        first = next(chunks, None)
+        second = next(chunks, None) if first is not None else None
+        texts = [chunk for chunk in (first, second) if chunk is not None]
+        chunk_count = len(texts)
+        if second is not None:
+            futures = [executor.submit(backend.summarize, chunk, partial_chars, STAGE_MAP) for chunk in texts]
+            futures += [executor.submit(backend.summarize, chunk, partial_chars, STAGE_MAP) for chunk in chunks]
+            chunk_count = len(futures)
+            partials = [future.result() for future in futures]
+            calls += len(partials)
+            rounds = 1
+            texts = _pack(partials, chunk_tokens)
+            while len(texts) > 1:
+                previous = len(texts)
+                partials = list(executor.map(lambda text: backend.summarize(text, partial_chars, STAGE_MAP), texts))
+                calls += len(partials)
+                rounds += 1
+                texts = _pack(partials, chunk_tokens)
+                if len(texts) >= previous:
+                    # The backend ignored the length limit; pair partials up so the rounds still converge.
+                    texts = ["\n".join(texts[i:i + 2]) for i in range(0, len(texts), 2)]
+
+    summary = ""
+    if texts:
+        summary = fit_to_length(backend.summarize(texts[0], max_chars, STAGE_REDUCE), max_chars)
+        calls += 1
+    elapsed = time.perf_counter() - started
+    memo = f" (memo {backend.stats})" if isinstance(backend, MemoizingBackend) else ""
+    logger.info(f"Summarised {chunk_count} chunk(s) in {rounds} map round(s), {calls} {backend.name} call(s), {elapsed:.2f}s{memo}.")
+    return {"summary": summary, "chunks": chunk_count, "rounds": rounds, "calls": calls,
+            "backend": backend.name, "elapsed": elapsed}
+
+if __name__ == '__main__':
+    # python src/text_summarizer.py          -> self-check (extractive backend, concurrency, stand-in OpenAI API)
+    # python src/text_summarizer.py <file>   -> summarise a transcript text file with get_backend()
+    import sys
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from log_setup import configure_logging
+
+    configure_logging(log_file=None)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            result = summarize_transcript(f.read())
+        print(result["summary"])
+        print(f"--- {result['chunks']} chunks, {result['calls']} {result['backend']} calls, {result['elapsed']:.2f}s ---")
+        raise SystemExit(0)
+
+    assert split_sentences("今日は晴れ。「本当？」と聞いた！\nそうです") == ["今日は晴れ。", "「本当？」", "と聞いた！", "そうです"]
+    assert x_length("abc") == 3 and x_length("あいう") == 6
+    assert x_length(fit_to_length("あ" * 500, 140)) <= 280 and fit_to_length("あ" * 500, 140).endswith("…")
+
+    topics = ["朝のランニングを続けるコツについて話しました。", "新しい本の執筆が終盤に入りました。",
+              "リスナーからの質問に答えました。", "来月のイベントの告知をしました。"]
+    transcript = "".join(f"{topics[i % 4]}今日は{i}番目の話題で、少し脱線もしました。" for i in range(400))
+    chunks = list(iter_chunks([transcript], max_tokens=500))
+    assert all(estimate_tokens(chunk) <= 500 for chunk in chunks) and len(chunks) > 10
+
+    result = summarize_transcript(transcript, ExtractiveBackend(), chunk_tokens=500)
+    print(f"Extractive: {result['summary']} ({x_length(result['summary'])}/280, {result['calls']} calls)")
+    assert 0 < x_length(result["summary"]) <= 280 and result["rounds"] >= 1
+    short = summarize_transcript("短いエピソードでした。", ExtractiveBackend())
+    assert short["summary"] == "短いエピソードでした。" and short["calls"] == 1
+
+    class SlowBackend:
+        """Stands in for a network backend: 50 ms per call."""
+        name = "slow"
+
+        def summarize(self, text, max_chars, stage=STAGE_MAP):
+            time.sleep(0.05)
+            return ExtractiveBackend().summarize(text, max_chars, stage)
+
+    timings = {}
+    for workers in (1, 8):
+        timings[workers] = summarize_transcript(transcript, SlowBackend(), chunk_tokens=500, max_workers=workers)["elapsed"]
+    print(f"Slow backend: {timings[1]:.2f}s with 1 worker, {timings[8]:.2f}s with 8")
+    assert timings[8] < timings[1] / 2
+
+    class StandInOpenAIHandler(BaseHTTPRequestHandler):
+        calls = 0
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            StandInOpenAIHandler.calls += 1
+            if StandInOpenAIHandler.calls == 1:
+                self._reply(429, {"error": "rate limited"}, {"Retry-After": "0"})
+                return
+            assert self.headers["Authorization"] == "Bearer test-key"
+            content = "要約: " + body["messages"][1]["content"][:20]
+            self._reply(200, {"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+        def _reply(self, status, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    openai_backend = OpenAIBackend(api_key="test-key", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+    remote = summarize_transcript(transcript[:3000], openai_backend, chunk_tokens=1000)
+    print(f"Stand-in OpenAI: {remote['summary']} ({remote['calls']} calls, {StandInOpenAIHandler.calls} requests)")
+    assert remote["summary"].startswith("要約: ") and StandInOpenAIHandler.calls == remote["calls"] + 1
+    server.shutdown()
+
+    # Memo: identical concurrent calls are coalesced, reruns and whitespace variants hit, entries persist and expire.
+    import tempfile
+
+    class CountingBackend(SlowBackend):
+        name = "counting"
+        upstream_calls = 0
+
+        def summarize(self, text, max_chars, stage=STAGE_MAP):
+            CountingBackend.upstream_calls += 1
+            return super().summarize(text, max_chars, stage)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        memo_path = os.path.join(tmp_dir, "summaries.sqlite3")
+        with MemoizingBackend(CountingBackend(), memo_path) as memo:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                answers = list(pool.map(lambda _: memo.summarize(transcript[:2000], 100), range(8)))
+            assert len(set(answers)) == 1 and CountingBackend.upstream_calls == 1
+            assert memo.stats["misses"] == 1 and memo.stats["coalesced"] + memo.stats["hits"] == 7
+            started = time.perf_counter()
+            first_run = summarize_transcript(transcript, memo, chunk_tokens=500)
+            upstream_after_first = CountingBackend.upstream_calls
+            rerun = summarize_transcript(transcript, memo, chunk_tokens=500)
+            assert rerun["summary"] == first_run["summary"] and CountingBackend.upstream_calls == upstream_after_first
+            hits, upstream = memo.stats["hits"], CountingBackend.upstream_calls
+            memo.summarize("  " + transcript[:2000].replace("。", "。\n"), 100)
+            memo.summarize(transcript[:2000].replace("、", " 、 "), 100)
+            assert memo.stats["hits"] == hits + 2 and CountingBackend.upstream_calls == upstream, memo.stats
+            # Spaces between words of Latin text still count.
+            assert memo.key("read me", 100) != memo.key("readme", 100)
+            print(f"Memo: {memo.stats}, rerun in {rerun['elapsed']:.3f}s vs {first_run['elapsed']:.3f}s")
+        with MemoizingBackend(CountingBackend(), memo_path) as reopened:
+            assert reopened.summarize(transcript[:2000], 100) == answers[0] and reopened.stats["hits"] == 1
+        with MemoizingBackend(CountingBackend(), memo_path, ttl_seconds=0) as expired:
+            expired.summarize(transcript[:2000], 100)
+            assert expired.stats["misses"] == 1
+    print("--- text_summarizer.py self-check passed ---")
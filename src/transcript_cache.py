@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+import threading
+import logging
+
+# Content-addressed cache of Whisper transcripts.
+# The key is a SHA-256 over the audio file's SHA-256 and the settings that
+# change the output (model, language, quantisation, segmenting), so the same
+# audio reached through a retry, a reset ledger or a cross-post is only
+# transcribed once per set of settings. Transcripts are stored as
+# zlib-compressed JSON in one SQLite table; when the table grows past
+# TRANSCRIPT_CACHE_MAX_BYTES or TRANSCRIPT_CACHE_MAX_ENTRIES the least
+# recently used entries are evicted.
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.environ.get(
+    "TRANSCRIPT_CACHE_PATH", os.path.join(PROJECT_ROOT, "data", "transcript_cache.sqlite3")
+)
+MAX_CACHE_BYTES = int(os.environ.get("TRANSCRIPT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # Compressed size
+MAX_CACHE_ENTRIES = int(os.environ.get("TRANSCRIPT_CACHE_MAX_ENTRIES", "5000"))
+# Bump when the stored transcript format changes so old entries are no longer hit
+CACHE_FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    cache_key TEXT PRIMARY KEY,
+    audio_sha256 TEXT NOT NULL,
+    params TEXT NOT NULL,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transcripts_lru ON transcripts (last_used_at);
+CREATE INDEX IF NOT EXISTS idx_transcripts_audio ON transcripts (audio_sha256);
+"""
+
+logger = logging.getLogger(__name__)
+
+def cache_key(audio_sha256: str, params: dict) -> str:
+    """Returns the cache key for a transcript of the given audio made with the given settings."""
+    canonical = json.dumps({"audio": audio_sha256.lower(), "params": params, "v": CACHE_FORMAT_VERSION},
+                           sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class TranscriptCache:
+    """
+    SQLite-backed LRU cache of transcripts, addressed by cache_key().
+
+    Usage:
+        with TranscriptCache() as cache:
+            key = cache_key(audio_sha256, params)
+            transcript = cache.get(key)
+            if transcript is None:
+                transcript = ...
+                cache.put(key, audio_sha256, params, transcript)
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = MAX_CACHE_BYTES,
+                 max_entries: int = MAX_CACHE_ENTRIES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str) -> dict | None:
+        """Returns the cached transcript for key (and marks it recently used), or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM transcripts WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE transcripts SET last_used_at = ? WHERE cache_key = ?", (time.time(), key))
+            self.stats["hits"] += 1
+        return json.loads(zlib.decompress(row["data"]).decode("utf-8"))
+
+    def put(self, key: str, audio_sha256: str, params: dict, transcript: dict):
+        """Stores a transcript under key, then evicts least recently used entries beyond the limits."""
+        data = zlib.compress(json.dumps(transcript, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts (cache_key, audio_sha256, params, data, size, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, audio_sha256.lower(), json.dumps(params, sort_keys=True, ensure_ascii=False), data, len(data), now, now),
+            )
+            self.stats["stores"] += 1
+            self._evict()
+
+    def _evict(self):
+        total_bytes, entries = self._conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM transcripts").fetchone()
+        if total_bytes <= self.max_bytes and entries <= self.max_entries:
+            return
+        evict = []
+        for row in self._conn.execute("SELECT cache_key, size FROM transcripts ORDER BY last_used_at"):
+            if total_bytes <= self.max_bytes and entries <= self.max_entries:
+                break
+            evict.append((row["cache_key"],))
+            total_bytes -= row["size"]
+            entries -= 1
+        self._conn.executemany("DELETE FROM transcripts WHERE cache_key = ?", evict)
+        self.stats["evictions"] += len(evict)
+        logger.info(f"Evicted {len(evict)} transcript(s) from the cache ({entries} left, {total_bytes / 1024:.0f} KiB).")
+
+    def size(self) -> tuple[int, int]:
+        """Returns (entries, compressed bytes) currently stored."""
+        with self._lock:
+            total_bytes, entries = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM transcripts"
+            ).fetchone()
+        return entries, total_bytes
+
+    def close(self):
+        """Checkpoints the WAL into the main file and closes."""
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+if __name__ == '__main__':
+    # Self-check: hit/miss, parameter-sensitive keys, LRU eviction and lookup latency.
+    # Run with: python src/transcript_cache.py
+    import tempfile
+
+    from log_setup import configure_logging
+    configure_logging(log_file=None)
+
+    params = {"model": "base", "language": "ja", "int8": False}
+    transcript = {"text": "こんにちは。" * 2000,
+                  "segments": [{"start": i * 2.0, "end": i * 2.0 + 2, "text": "こんにちは。"} for i in range(2000)]}
+    audio_hash = hashlib.sha256(b"episode audio").hexdigest()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with TranscriptCache(os.path.join(tmp_dir, "cache.sqlite3"), max_entries=3) as cache:
+            key = cache_key(audio_hash, params)
+            assert key != cache_key(audio_hash, {**params, "model": "small"})
+            assert key == cache_key(audio_hash.upper(), dict(reversed(list(params.items()))))
+            assert cache.get(key) is None
+            cache.put(key, audio_hash, params, transcript)
+
+            started = time.perf_counter()
+            assert cache.get(key) == transcript
+            print(f"Cache hit in {(time.perf_counter() - started) * 1000:.2f} ms "
+                  f"({cache.size()[1] / 1024:.1f} KiB stored for {len(json.dumps(transcript, ensure_ascii=False).encode()) / 1024:.0f} KiB of JSON)")
+
+            # key was used last, so the next-oldest entry goes first
+            others = [cache_key(hashlib.sha256(bytes([i])).hexdigest(), params) for i in range(3)]
+            for other in others:
+                cache.put(other, "0" * 64, params, {"text": "", "segments": []})
+                cache.get(key)
+            assert cache.get(key) is not None and cache.get(others[0]) is None
+            assert cache.size()[0] == 3 and cache.stats["evictions"] == 1
+            print(cache.stats)
+
+    print("--- transcript_cache.py self-check passed ---")
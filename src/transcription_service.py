@@ -0,0 +1,604 @@
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from audio_processor import (
+    WHISPER_MODEL, WHISPER_LANGUAGE, WHISPER_WORKERS, WHISPER_THREADS_PER_WORKER, WHISPER_INT8,
+    WHISPER_SEGMENT_SECONDS, WHISPER_MAX_SEGMENT_SECONDS, TRANSCRIBE_SERVICE_SOCKET, _PCM_BYTES_PER_MS,
+    decode_to_pcm, split_pcm_at_silence, _init_transcription_worker, _transcribe_window_in_worker,
+)
+
+# Resident transcription service.
+# Loading a Whisper model takes seconds and hundreds of MB, which every
+# cron-started run would otherwise pay again. This process loads the model
+# once into its worker pool and keeps it; transcribe_audio() (main.py,
+# backfill.py, the audio_processor.py CLI) sends it the path of a downloaded
+# file over a Unix socket, so an episode's latency is decoding and inference
+# only.
+# Protocol: one JSON request line per connection, answered by JSON lines:
+#   {"op": "ping"} -> {"event": "ready", "model", "int8", "workers", "running", "waiting", "pid"}
+#   {"op": "transcribe", "path", "model", "language", "int8", "segment_seconds"}
+#     -> {"event": "queued"} (only while all job slots are busy)
+#     -> {"event": "started", "segment_count", "audio_seconds", "timings"}
+#     -> {"event": "segment", "index", "segments": [...]}  one per audio segment, in order, as soon as ready
+#     -> {"event": "done", "timings"}, or {"event": "error"} / {"event": "rejected"} with a "message"
+# Several jobs run at once (TRANSCRIBE_SERVICE_JOBS); each keeps at most one
+# segment per worker in flight, so jobs share the pool instead of queueing
+# behind each other. Files are decoded to cached PCM (audio_processor
+# .decode_to_pcm()) and workers map only their segment; the decoded audio of
+# the running jobs together is capped at TRANSCRIBE_SERVICE_MAX_PCM_MB: a job
+# that does not fit waits (one job larger than the whole cap runs alone).
+
+# Jobs transcribed at the same time; more connections wait for a slot
+TRANSCRIBE_SERVICE_JOBS = int(os.environ.get("TRANSCRIBE_SERVICE_JOBS", "2"))
+# Decoded 16 kHz PCM the running jobs may have mapped together (an hour is about 115 MB)
+TRANSCRIBE_SERVICE_MAX_PCM_MB = int(os.environ.get("TRANSCRIBE_SERVICE_MAX_PCM_MB", "1024"))
+# Exit after this long without jobs (0: never); the service started by transcribe_audio() uses it
+TRANSCRIBE_SERVICE_IDLE_EXIT = float(os.environ.get("TRANSCRIBE_SERVICE_IDLE_EXIT", "3600"))
+# How long ensure_service() waits for a freshly started service to load its model
+TRANSCRIBE_SERVICE_START_SECONDS = float(os.environ.get("TRANSCRIBE_SERVICE_START_SECONDS", "300"))
+# A client gives up (and transcribes locally) when the service is silent this long
+TRANSCRIBE_SERVICE_TIMEOUT = float(os.environ.get("TRANSCRIBE_SERVICE_TIMEOUT", "1800"))
+CONNECT_TIMEOUT_SECONDS = 2.0
+REQUEST_READ_TIMEOUT_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+_start_lock = threading.Lock()
+
+class ServiceUnavailable(Exception):
+    """The service is not running, runs another model, or went away; the caller transcribes locally."""
+
+class TranscriptionServiceError(Exception):
+    """The service ran the job and it failed (e.g. the file cannot be decoded)."""
+
+class _PcmBudget:
+    """Bytes of decoded audio the running jobs may hold together; a job larger than the whole budget runs alone."""
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.used_bytes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int):
+        with self._condition:
+            while self.used_bytes and self.used_bytes + size > self.limit_bytes:
+                self._condition.wait()
+            self.used_bytes += size
+
+    def release(self, size: int):
+        with self._condition:
+            self.used_bytes -= size
+            self._condition.notify_all()
+
+class TranscriptionService:
+    """
+    Keeps a Whisper worker pool loaded and transcribes files sent over a Unix socket.
+
+    Usage:
+        with TranscriptionService() as service:
+            service.serve_forever()   # Until SIGTERM, close() or the idle timeout
+    """
+
+    def __init__(self, address: str = TRANSCRIBE_SERVICE_SOCKET, model_name: str = WHISPER_MODEL,
+                 workers: int = WHISPER_WORKERS, threads_per_worker: int = WHISPER_THREADS_PER_WORKER,
+                 int8: bool = WHISPER_INT8, max_jobs: int = TRANSCRIBE_SERVICE_JOBS,
+                 max_pcm_mb: float = TRANSCRIBE_SERVICE_MAX_PCM_MB, idle_exit_seconds: float = 0):
+        self.address = address
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker
+        self.int8 = bool(int8)
+        self.max_jobs = max(1, max_jobs)
+        self.idle_exit_seconds = idle_exit_seconds
+        self._budget = _PcmBudget(int(max_pcm_mb * 1024 * 1024))
+        self._slots = threading.BoundedSemaphore(self.max_jobs)
+        self._decode_lock = threading.Lock()   # One ffmpeg decode at a time; it competes with the workers for CPU
+        self._state_lock = threading.Lock()
+        self._running = 0
+        self._waiting = 0
+        self._last_active = time.monotonic()
+        self._stop = threading.Event()
+        self._executor = None
+        self._listener = None
+
+    def _start_workers(self):
+        """Starts the pool; every worker loads the model now rather than when the first job arrives."""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        if self.workers == 1:
+            executor = ThreadPoolExecutor(max_workers=1, initializer=_init_transcription_worker,
+                                          initargs=(self.model_name, self.threads_per_worker, self.int8))
+        else:
+            executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=_init_transcription_worker,
+                                           initargs=(self.model_name, self.threads_per_worker, self.int8))
+        for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def _decode(self, path: str, segment_seconds: int) -> tuple:
+        """Returns (ranges, pcm_path, timings): (start_ms, end_ms) segments of the decoded file and {'decode', 'split'}."""
+        timings = {}
+        phase_started = time.perf_counter()
+        pcm_path = decode_to_pcm(path)
+        timings["decode"] = time.perf_counter() - phase_started
+        phase_started = time.perf_counter()
+        ranges = split_pcm_at_silence(pcm_path, segment_seconds, max(segment_seconds, WHISPER_MAX_SEGMENT_SECONDS))
+        timings["split"] = time.perf_counter() - phase_started
+        return ranges, pcm_path, timings
+
+    def _submit(self, index: int, pcm_path: str, start_ms: int, end_ms: int, language: str | None):
+        return self._executor.submit(_transcribe_window_in_worker, index, pcm_path, start_ms, end_ms, language)
+
+    def start(self) -> bool:
+        """Loads the model and starts listening. Returns False if another service already answers on the socket."""
+        if ping(self.address) is not None:
+            logger.info(f"A transcription service is already listening on {self.address}.")
+            return False
+        started = time.perf_counter()
+        self._executor = self._start_workers()
+        logger.info(f"Loaded model={self.model_name}{' int8' if self.int8 else ''} on {self.workers} worker(s) "
+                    f"in {time.perf_counter() - started:.1f}s.")
+        # Checked again: another service may have finished loading meanwhile.
+        if ping(self.address) is not None:
+            logger.info(f"A transcription service started on {self.address} meanwhile; not starting a second one.")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            return False
+        directory = os.path.dirname(self.address)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.address):
+            os.remove(self.address) # Left behind by a service that was killed
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.address)
+        os.chmod(self.address, 0o600) # Only this user may submit files
+        listener.listen(16)
+        listener.settimeout(1.0)      # Wake up to notice close() and the idle timeout
+        self._listener = listener
+        self._last_active = time.monotonic()
+        logger.info(f"Transcription service listening on {self.address} ({self.max_jobs} job(s) at once).")
+        return True
+
+    def serve_forever(self):
+        """Accepts connections until close(), a signal handler setting the stop, or the idle timeout."""
+        if self._listener is None and not self.start():
+            return
+        while not self._stop.is_set():
+            try:
+                connection, _ = self._listener.accept()
+            except socket.timeout:
+                if self._idle_expired():
+                    logger.info(f"No jobs for {self.idle_exit_seconds:.0f}s; stopping.")
+                    break
+                continue
+            except OSError:
+                if self._stop.is_set():
+                    break
+                raise
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _idle_expired(self) -> bool:
+        with self._state_lock:
+            idle = self._running == 0 and self._waiting == 0
+            return bool(self.idle_exit_seconds) and idle and time.monotonic() - self._last_active > self.idle_exit_seconds
+
+    def status(self) -> dict:
+        with self._state_lock:
+            return {"event": "ready", "model": self.model_name, "int8": self.int8, "workers": self.workers,
+                    "running": self._running, "waiting": self._waiting, "pid": os.getpid()}
+
+    def _handle(self, connection: socket.socket):
+        def send(message: dict):
+            connection.sendall((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+
+        try:
+            connection.settimeout(REQUEST_READ_TIMEOUT_SECONDS)
+            with connection.makefile("rb") as reader:
+                line = reader.readline()
+            connection.settimeout(None)
+            request = json.loads(line)
+            if request.get("op") == "ping":
+                send(self.status())
+            elif request.get("op") == "transcribe":
+                self._run_job(request, send)
+            else:
+                send({"event": "rejected", "message": f"Unknown op {request.get('op')!r}"})
+        except (OSError, ValueError, AttributeError) as e:
+            logger.info(f"Dropped a client connection: {e}")
+        finally:
+            connection.close()
+
+    def _run_job(self, request: dict, send):
+        path = request.get("path") or ""
+        mismatch = [f"{key}={request[key]!r}" for key, value in (("model", self.model_name), ("int8", self.int8))
+                    if key in request and request[key] != value]
+        if mismatch:
+            send({"event": "rejected", "message": f"service runs model={self.model_name!r} int8={self.int8}, "
+                                                  f"not {', '.join(mismatch)}"})
+            return
+        if not os.path.isfile(path):
+            send({"event": "error", "message": f"No such file on the service's host: {path}"})
+            return
+        language = request.get("language")
+        segment_seconds = int(request.get("segment_seconds") or WHISPER_SEGMENT_SECONDS)
+
+        with self._state_lock:
+            self._waiting += 1
+        try:
+            if not self._slots.acquire(blocking=False):
+                send({"event": "queued"})
+                self._slots.acquire()
+        finally:
+            with self._state_lock:
+                self._waiting -= 1
+        with self._state_lock:
+            self._running += 1
+        reserved = 0
+        try:
+            with self._decode_lock:
+                try:
+                    ranges, pcm_path, timings = self._decode(path, segment_seconds)
+                except Exception as e:
+                    logger.warning(f"Cannot decode {path}: {e}")
+                    send({"event": "error", "message": f"Cannot decode {path}: {e}"})
+                    return
+                reserved = ranges[-1][1] * _PCM_BYTES_PER_MS if ranges else 0
+                self._budget.acquire(reserved)
+            audio_seconds = ranges[-1][1] / 1000.0 if ranges else 0.0
+            logger.info(f"Job {path}: {len(ranges)} segments, {audio_seconds / 60:.1f} min.")
+            send({"event": "started", "segment_count": len(ranges), "audio_seconds": audio_seconds, "timings": timings})
+            phase_started = time.perf_counter()
+            try:
+                self._transcribe_job(ranges, pcm_path, language, send)
+            except OSError:
+                raise # The client went away
+            except Exception as e:
+                logger.warning(f"Transcribing {path} failed: {e}")
+                send({"event": "error", "message": f"Transcription failed: {e}"})
+                return
+            timings["transcribe"] = time.perf_counter() - phase_started
+            send({"event": "done", "timings": timings})
+        finally:
+            self._budget.release(reserved)
+            with self._state_lock:
+                self._running -= 1
+                self._last_active = time.monotonic()
+            self._slots.release()
+
+    def _transcribe_job(self, ranges: list, pcm_path: str, language: str | None, send):
+        """Keeps one segment per worker in flight and sends the results in order as soon as they are complete."""
+        in_flight = {}   # future -> segment index
+        finished = {}    # segment index -> transcript segments, waiting for earlier ones
+        next_submit = 0
+        next_send = 0
+        try:
+            while next_send < len(ranges):
+                while next_submit < len(ranges) and len(in_flight) < self.workers:
+                    start_ms, end_ms = ranges[next_submit]
+                    in_flight[self._submit(next_submit, pcm_path, start_ms, end_ms, language)] = next_submit
+                    next_submit += 1
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del in_flight[future]
+                    index, segments = future.result()
+                    finished[index] = segments
+                while next_send in finished:
+                    send({"event": "segment", "index": next_send, "segments": finished.pop(next_send)})
+                    next_send += 1
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def stop(self):
+        """Makes serve_forever() return within a second (safe from a signal handler)."""
+        self._stop.set()
+
+    def close(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            try:
+                os.remove(self.address)
+            except OSError:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# --- Client -----------------------------------------------------------------
+
+def _request(address: str, message: dict, timeout: float = TRANSCRIBE_SERVICE_TIMEOUT):
+    """Sends one request and yields the service's replies. Raises ServiceUnavailable if it cannot be reached."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise ServiceUnavailable("Unix sockets are not available on this platform")
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.settimeout(CONNECT_TIMEOUT_SECONDS)
+        try:
+            connection.connect(address)
+        except OSError as e:
+            raise ServiceUnavailable(f"nothing listening on {address}: {e}") from None
+        try:
+            connection.sendall((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+            connection.settimeout(timeout)
+            with connection.makefile("rb") as replies:
+                for line in replies:
+                    yield json.loads(line)
+        except (OSError, ValueError) as e:
+            raise ServiceUnavailable(f"lost the connection to {address}: {e}") from None
+    finally:
+        connection.close()
+
+def ping(address: str = TRANSCRIBE_SERVICE_SOCKET) -> dict | None:
+    """Returns the service's status ('model', 'workers', 'running', ...), or None if it is not running."""
+    try:
+        for reply in _request(address, {"op": "ping"}, timeout=CONNECT_TIMEOUT_SECONDS):
+            return reply
+    except ServiceUnavailable:
+        return None
+    return None
+
+def iter_transcription(path: str, address: str = TRANSCRIBE_SERVICE_SOCKET, model_name: str = WHISPER_MODEL,
+                       language: str | None = WHISPER_LANGUAGE, int8: bool = WHISPER_INT8,
+                       segment_seconds: int = WHISPER_SEGMENT_SECONDS):
+    """
+    Has the service transcribe a local file and yields its replies as they arrive.
+
+    Yields the 'queued' / 'started' / 'segment' / 'done' messages (see the
+    protocol above); 'segment' messages come in order.
+
+    Raises:
+        ServiceUnavailable: Not running, runs another model, or went away midway.
+        TranscriptionServiceError: The job failed on the service.
+    """
+    request = {"op": "transcribe", "path": path, "model": model_name, "language": language,
+               "int8": bool(int8), "segment_seconds": segment_seconds}
+    for reply in _request(address, request):
+        if reply["event"] == "rejected":
+            raise ServiceUnavailable(reply["message"])
+        if reply["event"] == "error":
+            raise TranscriptionServiceError(reply["message"])
+        yield reply
+        if reply["event"] == "done":
+            return
+    raise ServiceUnavailable(f"the service on {address} stopped before finishing {path}")
+
+def transcribe_on_service(path: str, address: str = TRANSCRIBE_SERVICE_SOCKET, model_name: str = WHISPER_MODEL,
+                          language: str | None = WHISPER_LANGUAGE, int8: bool = WHISPER_INT8,
+                          segment_seconds: int = WHISPER_SEGMENT_SECONDS) -> dict:
+    """Collects iter_transcription() into {'segments', 'audio_seconds', 'segment_count', 'workers', 'timings'}."""
+    status = ping(address)
+    if status is None:
+        raise ServiceUnavailable(f"nothing listening on {address}")
+    segments = []
+    result = {"workers": status["workers"]}
+    for reply in iter_transcription(path, address, model_name, language, int8, segment_seconds):
+        if reply["event"] == "queued":
+            logger.info(f"Transcription service busy; {path} is waiting for a slot.")
+        elif reply["event"] == "started":
+            result.update(segment_count=reply["segment_count"], audio_seconds=reply["audio_seconds"])
+        elif reply["event"] == "segment":
+            segments.extend(reply["segments"])
+        elif reply["event"] == "done":
+            result["timings"] = reply["timings"]
+    return dict(result, segments=segments)
+
+def ensure_service(address: str = TRANSCRIBE_SERVICE_SOCKET, idle_exit_seconds: float = TRANSCRIBE_SERVICE_IDLE_EXIT,
+                   wait_seconds: float = TRANSCRIBE_SERVICE_START_SECONDS) -> bool:
+    """
+    Starts the service in the background if nothing answers on the socket, and waits until its model is loaded.
+
+    The service outlives this process (later cron runs use it too) and exits
+    after idle_exit_seconds without jobs. Returns True once it answers.
+    """
+    import subprocess
+    with _start_lock:
+        if ping(address) is not None:
+            return True
+        command = [sys.executable, os.path.abspath(__file__), "--socket", address, "--idle-exit", str(idle_exit_seconds)]
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   start_new_session=True)
+        logger.info(f"Started the transcription service (pid {process.pid}); waiting for it to load the model.")
+        deadline = time.monotonic() + wait_seconds
+        while time.monotonic() < deadline:
+            if ping(address) is not None:
+                return True
+            if process.poll() is not None:
+                # Exits with 0 when another service won the race to the socket.
+                if process.returncode == 0 and ping(address) is not None:
+                    return True
+                logger.warning(f"The transcription service exited with status {process.returncode} while starting.")
+                return False
+            time.sleep(0.5)
+        logger.warning(f"The transcription service did not answer within {wait_seconds:.0f}s.")
+        return False
+
+def main() -> int:
+    import argparse
+    import signal
+    from log_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description="Resident Whisper transcription service (keeps the model loaded).")
+    parser.add_argument("--socket", default=TRANSCRIBE_SERVICE_SOCKET, help="Unix socket to listen on (default: TRANSCRIBE_SERVICE_SOCKET).")
+    parser.add_argument("--jobs", type=int, default=TRANSCRIBE_SERVICE_JOBS, help="Jobs transcribed at the same time.")
+    parser.add_argument("--max-pcm-mb", type=int, default=TRANSCRIBE_SERVICE_MAX_PCM_MB,
+                        help="Decoded audio the running jobs may hold together, in MB.")
+    parser.add_argument("--idle-exit", type=float, default=0, help="Exit after this many seconds without jobs (default: never).")
+    parser.add_argument("--ping", action="store_true", help="Print the running service's status (exit 1 if none).")
+    parser.add_argument("--submit", metavar="AUDIO_FILE", help="Transcribe a file on the running service, printing segments as they arrive.")
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.ping:
+        status = ping(args.socket)
+        print(json.dumps(status, ensure_ascii=False) if status else f"No transcription service on {args.socket}")
+        return 0 if status else 1
+    if args.submit:
+        try:
+            for reply in iter_transcription(os.path.abspath(args.submit), args.socket):
+                for segment in reply.get("segments", []):
+                    print(f"[{segment['start']:8.2f} - {segment['end']:8.2f}] {segment['text']}", flush=True)
+                if reply["event"] == "done":
+                    print(f"--- timings {reply['timings']} ---")
+        except (ServiceUnavailable, TranscriptionServiceError) as e:
+            logger.error(f"{e}")
+            return 1
+        return 0
+
+    with TranscriptionService(args.socket, max_jobs=args.jobs, max_pcm_mb=args.max_pcm_mb,
+                              idle_exit_seconds=args.idle_exit) as service:
+        def _request_stop(signum, frame):
+            logger.info(f"Received signal {signum}; stopping.")
+            service.stop()
+        signal.signal(signal.SIGINT, _request_stop)
+        signal.signal(signal.SIGTERM, _request_stop)
+        service.serve_forever()
+    return 0
+
+if __name__ == "__main__":
+    if "--self-check" not in sys.argv[1:]:
+        sys.exit(main())
+
+    # Offline self-check of the protocol, the job slots and the PCM cap with a stand-in model:
+    # python src/transcription_service.py --self-check
+    import hashlib
+    import tempfile
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+    from log_setup import configure_logging
+    from transcript_cache import TranscriptCache
+    from audio_processor import stream_transcribe, transcribe_audio
+
+    configure_logging(log_file=None)
+
+    class StandInService(TranscriptionService):
+        """Decodes a file holding a number of seconds into 2 s segments; 'transcribes' a segment in 20 ms."""
+        peak_pcm_bytes = 0
+
+        def _start_workers(self):
+            return ThreadPoolExecutor(max_workers=self.workers)
+
+        def _decode(self, path: str, segment_seconds: int) -> tuple:
+            with open(path, encoding="utf-8") as f:
+                total_ms = int(f.read()) * 1000
+            ranges = [(start, min(start + 2000, total_ms)) for start in range(0, total_ms, 2000)]
+            return ranges, path, {"decode": 0.0, "split": 0.0}
+
+        def _submit(self, index: int, pcm_path: str, start_ms: int, end_ms: int, language: str | None):
+            self.peak_pcm_bytes = max(self.peak_pcm_bytes, self._budget.used_bytes)
+
+            def run():
+                time.sleep(0.02)
+                return index, [{"start": start_ms / 1000.0, "end": end_ms / 1000.0, "text": f"seg{index}"}]
+            return self._executor.submit(run)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        address = os.path.join(tmp_dir, "transcriber.sock")
+        episodes = {}
+        for name in ("a", "b", "c"):
+            episodes[name] = os.path.join(tmp_dir, f"{name}.mp3")
+            with open(episodes[name], "w", encoding="utf-8") as f:
+                f.write("40") # 1.25 MB of decoded PCM
+
+        # Nothing running: callers are told to transcribe locally.
+        assert ping(address) is None
+        try:
+            transcribe_on_service(episodes["a"], address)
+            raise AssertionError("expected ServiceUnavailable")
+        except ServiceUnavailable:
+            pass
+
+        # Two job slots, but a 2 MB PCM cap that fits only one of the 40 s episodes at a time.
+        service = StandInService(address, workers=2, max_jobs=2, max_pcm_mb=2)
+        assert service.start()
+        server_thread = threading.Thread(target=service.serve_forever, daemon=True)
+        server_thread.start()
+        status = ping(address)
+        assert status["event"] == "ready" and status["model"] == WHISPER_MODEL and status["workers"] == 2
+        assert not StandInService(address).start() # A second service leaves the socket alone
+
+        replies = {}
+        def submit(name: str):
+            replies[name] = list(iter_transcription(episodes[name], address))
+        clients = [threading.Thread(target=submit, args=(name,)) for name in episodes]
+        started = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - started
+        for name, events in replies.items():
+            segments = [event for event in events if event["event"] == "segment"]
+            assert [event["index"] for event in segments] == list(range(20)), name
+            assert events[-1]["event"] == "done" and "transcribe" in events[-1]["timings"]
+        assert any(events[0]["event"] == "queued" for events in replies.values()) # Third job waited for a slot
+        assert service.peak_pcm_bytes <= 2 * 1024 * 1024
+        print(f"3 concurrent jobs of 20 segments in {elapsed:.2f}s, peak decoded PCM {service.peak_pcm_bytes / 1024:.0f} KiB")
+
+        # Another model or a missing file: rejected (transcribe locally) vs failed.
+        try:
+            list(iter_transcription(episodes["a"], address, model_name="not-" + WHISPER_MODEL))
+            raise AssertionError("expected ServiceUnavailable")
+        except ServiceUnavailable as e:
+            assert "service runs model" in str(e)
+        try:
+            list(iter_transcription(os.path.join(tmp_dir, "missing.mp3"), address))
+            raise AssertionError("expected TranscriptionServiceError")
+        except TranscriptionServiceError:
+            pass
+
+        # transcribe_audio() goes to the service (no model in this process) and caches the result.
+        with TranscriptCache(os.path.join(tmp_dir, "transcripts.sqlite3")) as transcript_cache:
+            transcript = transcribe_audio(episodes["a"], cache=transcript_cache, service=address)
+            assert transcript["service"] and transcript["segment_count"] == 20 and transcript["audio_seconds"] == 40.0
+            assert transcript["text"].startswith("seg0seg1") and transcript["workers"] == 2
+            assert transcribe_audio(episodes["a"], cache=transcript_cache, service=address)["cached"]
+
+            # stream_transcribe() downloads the episode for the service, yields its segments as they come and caches them.
+            audio_requests = []
+            class EpisodeHandler(SimpleHTTPRequestHandler):
+                def __init__(self, *args, **kwargs):
+                    super().__init__(*args, directory=tmp_dir, **kwargs)
+
+                def do_GET(self):
+                    audio_requests.append(self.path)
+                    super().do_GET()
+
+                def log_message(self, format, *args):
+                    pass
+            http_server = ThreadingHTTPServer(("127.0.0.1", 0), EpisodeHandler)
+            threading.Thread(target=http_server.serve_forever, daemon=True).start()
+            episode_url = f"http://127.0.0.1:{http_server.server_address[1]}/b.mp3"
+            streamed = list(stream_transcribe(episode_url, cache=transcript_cache, service=address,
+                                              dest_dir=os.path.join(tmp_dir, "downloads")))
+            assert [segment["text"] for segment in streamed] == [f"seg{i}" for i in range(20)], streamed
+            with open(episodes["b"], "rb") as f:
+                b_sha256 = hashlib.sha256(f.read()).hexdigest()
+            # Known audio: served from the cache without downloading it again.
+            assert list(stream_transcribe(episode_url, cache=transcript_cache, audio_sha256=b_sha256, service=address)) == streamed
+            assert audio_requests == ["/b.mp3"], audio_requests
+            http_server.shutdown()
+
+        service.close()
+        server_thread.join(timeout=5)
+        assert not server_thread.is_alive() and not os.path.exists(address) and ping(address) is None
+
+        # A service started with an idle timeout exits on its own.
+        with StandInService(address, idle_exit_seconds=0.5) as idle_service:
+            started = time.perf_counter()
+            idle_service.serve_forever()
+            assert time.perf_counter() - started < 5
+
+    print("--- transcription_service.py self-check passed ---")
@@ -0,0 +1,507 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit, urlencode, parse_qsl
+import requests
+from metrics import observe
+from voicy_scraper import (
+    extract_channel_episodes, scrape_latest_voicy_episode, ScrapeResult, METHOD_INDEX,
+    HTTP_TIMEOUT_SECONDS, HTTP_USER_AGENT, VOICY_CHANNEL_ID_PATTERN,
+)
+
+# Finds the Voicy episode that corresponds to a given stand.fm episode.
+# The channel page's episode cards (story id, title, date) are kept in a small
+# SQLite index per channel. Each lookup refreshes the index with one conditional
+# GET of the first listing page (later pages are only walked while every card
+# on a page is newer than the cached head, e.g. on the first run) and then
+# picks the indexed episode whose title is most similar to the stand.fm title
+# and whose date is close to its publish time. Nothing is sent when no
+# episode matches yet (Voicy has not published it); the caller retries later
+# instead of delivering whatever happens to be newest on the page.
+# Backfill crawls the whole listing once (refresh_channel_index(full=True))
+# and matches a whole backlog in one pass with match_many().
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INDEX_PATH = os.environ.get(
+    "VOICY_INDEX_FILE", os.path.join(PROJECT_ROOT, "data", "voicy_index.sqlite3")
+)
+# Listing pages walked at most per refresh (the first run fills the index from these)
+MAX_LISTING_PAGES = int(os.environ.get("VOICY_INDEX_MAX_PAGES", "5"))
+# Query parameter of the listing's later pages: <channel url>?page=2
+LISTING_PAGE_PARAM = os.environ.get("VOICY_LISTING_PAGE_PARAM", "page")
+# Title similarity (0..1) an episode needs to count as a match
+MIN_TITLE_SIMILARITY = float(os.environ.get("VOICY_MATCH_MIN_SIMILARITY", "0.6"))
+# Episodes published further apart than this are never matched
+MAX_PUBLISH_GAP_DAYS = float(os.environ.get("VOICY_MATCH_MAX_DAYS", "7"))
+# Score lost per day between the two publish times, so the closer of two similar titles wins
+DAY_PENALTY = 0.02
+# Indexed episodes considered per lookup, newest first
+MATCH_CANDIDATES = 200
+# Voicy shows dates without a zone in Japan time
+JST = timezone(timedelta(hours=9))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS voicy_channels (
+    channel_id    TEXT PRIMARY KEY,
+    etag          TEXT,
+    last_modified TEXT,
+    head_story_id INTEGER,
+    refreshed_at  REAL
+);
+CREATE TABLE IF NOT EXISTS voicy_episodes (
+    channel_id   TEXT NOT NULL,
+    story_id     INTEGER NOT NULL,
+    url          TEXT NOT NULL,
+    title        TEXT NOT NULL,
+    published    TEXT,
+    matched_guid TEXT,
+    PRIMARY KEY (channel_id, story_id)
+);
+"""
+
+logger = logging.getLogger(__name__)
+
+def normalize_title(title: str) -> str:
+    """NFKC, lower case, without spaces, punctuation or symbols (so 「」, 【】, ！ and emoji do not count)."""
+    text = unicodedata.normalize("NFKC", title or "").lower()
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] not in ("P", "S", "Z", "C"))
+
+def _bigrams(text: str) -> list[str]:
+    return [text[i:i + 2] for i in range(len(text) - 1)] or [text]
+
+def title_similarity(a: str, b: str) -> float:
+    """
+    Fuzzy similarity of two (Japanese) titles between 0 and 1.
+
+    Dice coefficient over character bigrams of the normalised titles; a title
+    that contains the other (e.g. Voicy adds "【#123】" or a subtitle) scores
+    at least 0.9.
+    """
+    a, b = normalize_title(a), normalize_title(b)
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    shorter, longer = sorted((a, b), key=len)
+    contained = 0.9 if len(shorter) >= 4 and shorter in longer else 0.0
+    grams_a, grams_b = _bigrams(a), _bigrams(b)
+    remaining = list(grams_b)
+    common = 0
+    for gram in grams_a:
+        if gram in remaining:
+            remaining.remove(gram)
+            common += 1
+    return max(contained, 2 * common / (len(grams_a) + len(grams_b)))
+
+def parse_published(value: str | None) -> datetime | None:
+    """Parses ISO 8601 (Voicy, rss_checker), RFC 822 (RSS) or YYYY/MM/DD dates; naive times are taken as JST."""
+    if not value:
+        return None
+    value = value.strip()
+    parsed = None
+    for parse in (lambda v: datetime.fromisoformat(v.replace("Z", "+00:00")), parsedate_to_datetime,
+                  lambda v: datetime.strptime(v, "%Y/%m/%d")):
+        try:
+            parsed = parse(value)
+            break
+        except (TypeError, ValueError, IndexError):
+            continue
+    if parsed is None:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=JST)
+
+def match_score(episode: dict, candidate: dict) -> float:
+    """How well an indexed Voicy episode matches a stand.fm episode (title similarity minus a date penalty); 0 if it cannot be the same one."""
+    similarity = title_similarity(episode.get("title", ""), candidate["title"])
+    published, candidate_published = parse_published(episode.get("published")), parse_published(candidate["published"])
+    if published is None or candidate_published is None:
+        return similarity
+    gap_days = abs((candidate_published - published).total_seconds()) / 86400
+    if gap_days > MAX_PUBLISH_GAP_DAYS:
+        return 0.0
+    return similarity - DAY_PENALTY * gap_days
+
+def listing_page_url(voicy_channel_url: str, page: int) -> str:
+    if page <= 1:
+        return voicy_channel_url
+    parts = urlsplit(voicy_channel_url)
+    query = dict(parse_qsl(parts.query), **{LISTING_PAGE_PARAM: str(page)})
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def _channel_id(voicy_channel_url: str) -> str | None:
+    match = VOICY_CHANNEL_ID_PATTERN.search(voicy_channel_url)
+    return match.group(1) if match else None
+
+class VoicyEpisodeIndex:
+    """
+    SQLite cache of each Voicy channel's episode listing and of which stand.fm episode each one was matched to.
+
+    Usage:
+        with VoicyEpisodeIndex() as index:
+            result = resolve_voicy_episode(channel_url, episode, index)
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def channel(self, channel_id: str) -> dict | None:
+        """The channel's validators and head (newest indexed story id), or None if it was never indexed."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM voicy_channels WHERE channel_id = ?", (channel_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, channel_id: str, episodes: list[dict], etag: str | None = None, last_modified: str | None = None):
+        """Adds (or refreshes the title and date of) listed episodes and stores the page's validators."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO voicy_episodes (channel_id, story_id, url, title, published) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (channel_id, story_id) DO UPDATE SET url = excluded.url, title = excluded.title, "
+                    "published = COALESCE(excluded.published, voicy_episodes.published)",
+                    [(channel_id, e["story_id"], e["url"], e["title"], e["published"]) for e in episodes],
+                )
+                self._conn.execute(
+                    "INSERT INTO voicy_channels (channel_id, etag, last_modified, head_story_id, refreshed_at) "
+                    "VALUES (?, ?, ?, (SELECT MAX(story_id) FROM voicy_episodes WHERE channel_id = ?), ?) "
+                    "ON CONFLICT (channel_id) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified, "
+                    "head_story_id = excluded.head_story_id, refreshed_at = excluded.refreshed_at",
+                    (channel_id, etag, last_modified, channel_id, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def drop_newer_than(self, channel_id: str, story_id: int) -> int:
+        """Removes indexed episodes above story_id and moves the head back; returns how many were removed."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                dropped = self._conn.execute("DELETE FROM voicy_episodes WHERE channel_id = ? AND story_id > ?",
+                                             (channel_id, story_id)).rowcount
+                self._conn.execute(
+                    "UPDATE voicy_channels SET head_story_id = (SELECT MAX(story_id) FROM voicy_episodes WHERE channel_id = ?) "
+                    "WHERE channel_id = ?",
+                    (channel_id, channel_id),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dropped
+
+    def candidates(self, channel_id: str, guid: str | None = None, limit: int = MATCH_CANDIDATES,
+                   unclaimed: bool = True) -> list[dict]:
+        """Indexed episodes newest first (limit -1: all), without those already matched to another stand.fm episode."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM voicy_episodes WHERE channel_id = ? AND (? = 0 OR matched_guid IS NULL OR matched_guid = ?) "
+                "ORDER BY story_id DESC LIMIT ?",
+                (channel_id, int(unclaimed), guid, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim(self, channel_id: str, story_id: int, guid: str):
+        """Remembers that story_id is the Voicy copy of guid, so it is not matched to another episode."""
+        with self._lock:
+            self._conn.execute("UPDATE voicy_episodes SET matched_guid = ? WHERE channel_id = ? AND story_id = ?",
+                               (guid, channel_id, story_id))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def refresh_channel_index(index: VoicyEpisodeIndex, voicy_channel_url: str, session: requests.Session | None = None,
+                          max_pages: int = MAX_LISTING_PAGES, full: bool = False) -> int | None:
+    """
+    Brings a channel's index up to date with as few requests as possible.
+
+    The first listing page is fetched conditionally (If-None-Match /
+    If-Modified-Since); a 304 costs no parsing at all. Later pages are only
+    fetched while every episode on the previous page is newer than the
+    cached head, and at most max_pages in total.
+
+    With full=True (backfill) the first page is fetched unconditionally and
+    the listing is walked until a page adds nothing or max_pages is reached,
+    so older episodes missing from the index are filled in as well.
+
+    Returns:
+        The number of newly indexed episodes (0 if the page was unchanged),
+        or None if the page lists no episodes that can be read without a
+        browser.
+
+    Raises:
+        requests.RequestException: If the first page cannot be fetched.
+    """
+    channel_id = _channel_id(voicy_channel_url)
+    cached = index.channel(channel_id) or {}
+    head = cached.get("head_story_id") or 0
+    http = session or requests
+    headers = {"User-Agent": HTTP_USER_AGENT, "Accept-Language": "ja,en;q=0.8"}
+    if cached.get("etag") and not full:
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified") and not full:
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = http.get(voicy_channel_url, headers=headers, timeout=HTTP_TIMEOUT_SECONDS)
+    if response.status_code == 304:
+        logger.debug(f"Voicy listing of channel {channel_id} unchanged (304).")
+        return 0
+    response.raise_for_status()
+    episodes = extract_channel_episodes(response.text, voicy_channel_url)
+    if not episodes:
+        return None
+    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    newest_listed = max(episode["story_id"] for episode in episodes)
+    if head > newest_listed:
+        # The head is past the channel's own newest story: an older version indexed
+        # another channel's recommended stories, which would hide every new episode.
+        dropped = index.drop_newer_than(channel_id, newest_listed)
+        logger.warning(f"Dropped {dropped} indexed Voicy episode(s) of channel {channel_id} above its newest "
+                       f"listed story {newest_listed} (cached head was {head}).")
+        head = (index.channel(channel_id) or {}).get("head_story_id") or 0
+
+    listed = list(episodes)
+    new = [episode for episode in episodes if episode["story_id"] > head]
+    seen = {episode["story_id"] for episode in episodes}
+    page = 1
+    # Every card on the page is new: the cached head (if any) is further down the listing.
+    while (full or len(new) == len(episodes)) and page < max_pages:
+        page += 1
+        try:
+            response = http.get(listing_page_url(voicy_channel_url, page),
+                                headers={"User-Agent": HTTP_USER_AGENT}, timeout=HTTP_TIMEOUT_SECONDS)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"Could not fetch page {page} of the Voicy listing of channel {channel_id}: {e}")
+            break
+        episodes = [episode for episode in extract_channel_episodes(response.text, voicy_channel_url)
+                    if episode["story_id"] not in seen]
+        if not episodes: # Past the end, or the site ignores the page parameter
+            break
+        seen.update(episode["story_id"] for episode in episodes)
+        listed.extend(episodes)
+        new_on_page = [episode for episode in episodes if episode["story_id"] > head]
+        new.extend(new_on_page)
+        if len(new_on_page) < len(episodes) and not full:
+            break
+
+    if full:
+        known = {candidate["story_id"] for candidate in index.candidates(channel_id, limit=-1, unclaimed=False)}
+        new = [episode for episode in listed if episode["story_id"] not in known]
+    index.update(channel_id, listed if full else new, etag, last_modified)
+    logger.debug(f"Indexed {len(new)} new Voicy episode(s) of channel {channel_id} from {page} page(s).")
+    return len(new)
+
+def find_match(index: VoicyEpisodeIndex, channel_id: str, episode: dict) -> tuple[dict | None, float]:
+    """Returns the best-matching unclaimed indexed episode and its score, or (None, best score) below MIN_TITLE_SIMILARITY."""
+    best, best_score = None, 0.0
+    for candidate in index.candidates(channel_id, episode.get("guid")):
+        score = match_score(episode, candidate)
+        if score > best_score:
+            best, best_score = candidate, score
+    if best is None or best_score < MIN_TITLE_SIMILARITY:
+        return None, best_score
+    return best, best_score
+
+def match_many(index: VoicyEpisodeIndex, channel_id: str, episodes: list[dict]) -> dict:
+    """
+    Matches many stand.fm episodes against the whole index at once (backfill).
+
+    find_match() only looks at the newest MATCH_CANDIDATES episodes, which is
+    right for a new episode but misses old ones. Here every unclaimed indexed
+    episode is loaded once, its date parsed once, and each stand.fm episode
+    (in the given order) is scored only against those published within
+    MAX_PUBLISH_GAP_DAYS. Matches are claimed as they are made, so two
+    episodes never get the same Voicy URL.
+
+    Returns:
+        {guid: indexed episode} for the episodes that matched.
+    """
+    dated, undated = [], []
+    for candidate in index.candidates(channel_id, limit=-1, unclaimed=False):
+        published = parse_published(candidate["published"])
+        if published is None:
+            undated.append(candidate)
+        else:
+            dated.append((published, candidate))
+    dated.sort(key=lambda item: item[0])
+    times = [published for published, _ in dated]
+    window = timedelta(days=MAX_PUBLISH_GAP_DAYS)
+    taken = set()
+    matches = {}
+    for episode in episodes:
+        published = parse_published(episode.get("published"))
+        if published is None:
+            nearby = [candidate for _, candidate in dated] + undated
+        else:
+            nearby = [candidate for _, candidate in dated[bisect_left(times, published - window):
+                                                          bisect_right(times, published + window)]] + undated
+        best, best_score = None, 0.0
+        for candidate in nearby:
+            if candidate["story_id"] in taken or candidate["matched_guid"] not in (None, episode["guid"]):
+                continue
+            score = match_score(episode, candidate)
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is None or best_score < MIN_TITLE_SIMILARITY:
+            continue
+        taken.add(best["story_id"])
+        index.claim(channel_id, best["story_id"], episode["guid"])
+        matches[episode["guid"]] = best
+    return matches
+
+def resolve_voicy_episode(voicy_channel_url: str, episode: dict, index: VoicyEpisodeIndex | None = None,
+                          session: requests.Session | None = None, pool=None) -> ScrapeResult:
+    """
+    Finds the Voicy URL of one stand.fm episode by title and publish date.
+
+    Args:
+        voicy_channel_url: The URL of the Voicy channel page.
+        episode: The stand.fm episode ('guid', 'title', 'published').
+        index: Episode index to use (default: one at DEFAULT_INDEX_PATH for this call).
+        session: Optional requests session for the listing requests.
+        pool: Optional browser_pool.BrowserPool, only used when the page lists
+              no episodes without JavaScript and the lookup falls back to
+              scrape_latest_voicy_episode().
+
+    Returns:
+        A ScrapeResult with method METHOD_INDEX and the matched URL, or no URL
+        and an error if no indexed episode matches yet. Does not raise.
+    """
+    if index is None:
+        with VoicyEpisodeIndex() as own_index:
+            return resolve_voicy_episode(voicy_channel_url, episode, own_index, session, pool)
+
+    started = time.perf_counter()
+    timings = {}
+    channel_id = _channel_id(voicy_channel_url)
+    if not channel_id:
+        return ScrapeResult(None, METHOD_INDEX, 0.0, f"not a Voicy channel URL: {voicy_channel_url}")
+    refresh_error = None
+    try:
+        indexed = refresh_channel_index(index, voicy_channel_url, session)
+    except requests.RequestException as e:
+        # Match against what is cached; a new episode will be found on a later run.
+        indexed, refresh_error = 0, str(e)
+        logger.warning(f"Could not refresh the Voicy listing of channel {channel_id}: {e}")
+    timings["http"] = time.perf_counter() - started
+
+    if indexed is None and index.channel(channel_id) is None:
+        logger.warning(f"The Voicy listing of channel {channel_id} needs a browser; falling back to its newest episode.")
+        return scrape_latest_voicy_episode(voicy_channel_url, pool)
+
+    phase_started = time.perf_counter()
+    match, score = find_match(index, channel_id, episode)
+    timings["match"] = time.perf_counter() - phase_started
+    elapsed = time.perf_counter() - started
+    if match is None:
+        error = f"no Voicy episode matches '{episode.get('title')}' yet (best score {score:.2f})"
+        if refresh_error:
+            error += f"; listing refresh failed: {refresh_error}"
+        result = ScrapeResult(None, METHOD_INDEX, elapsed, error, timings)
+    else:
+        if episode.get("guid"):
+            index.claim(channel_id, match["story_id"], episode["guid"])
+        logger.info(f"Matched '{episode.get('title')}' to Voicy '{match['title']}' (score {score:.2f}): {match['url']}")
+        result = ScrapeResult(match["url"], METHOD_INDEX, elapsed, timings=timings)
+    observe("voicy_lookup", result.elapsed_seconds, failed=not result.url, method=METHOD_INDEX)
+    for phase, seconds in timings.items():
+        observe("voicy_phase", seconds, phase=phase)
+    return result
+
+if __name__ == '__main__':
+    # Self-check against the recorded channel pages served locally: matching,
+    # claims, incremental refresh (304 and head) and the browser-free fallback.
+    # Usage: python src/voicy_index.py
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    fixture_dir = os.path.join(PROJECT_ROOT, "fixtures", "voicy")
+    with open(os.path.join(fixture_dir, "channel_ssr.html"), "rb") as f:
+        page = f.read()
+    with open(os.path.join(fixture_dir, "channel_recommendations.html"), "rb") as f:
+        recommendations_page = f.read()
+    requests_seen = []
+
+    class ListingHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.path)
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = page if "page=" not in self.path else b"<html></html>"
+            if self.path.startswith("/recommended/") and "page=" not in self.path:
+                body = recommendations_page
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    assert title_similarity("なんでもAIでやればいいわけじゃない", "【#120】なんでもＡＩでやればいいわけじゃない！") >= 0.9
+    assert title_similarity("朝の習慣について", "音声配信を続けるコツ") < 0.2
+    assert parse_published("Thu, 05 Jun 2025 21:00:12 +0000") == parse_published("2025-06-06T06:00:12+09:00")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ListingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    channel_url = f"http://127.0.0.1:{server.server_address[1]}/channel/821320"
+    with tempfile.TemporaryDirectory() as tmp, VoicyEpisodeIndex(os.path.join(tmp, "index.sqlite3")) as index:
+        # Not the newest card: the stand.fm episode from the day before.
+        result = resolve_voicy_episode(channel_url, {"guid": "a", "title": "音声配信を続けるコツ",
+                                                     "published": "Wed, 04 Jun 2025 21:00:00 +0000"}, index)
+        assert result.url == "https://voicy.jp/channel/821320/6751234" and result.method == METHOD_INDEX, result
+        assert requests_seen == ["/channel/821320", "/channel/821320?page=2"], requests_seen
+        # Later lookups cost one conditional request.
+        result = resolve_voicy_episode(channel_url, {"guid": "b", "title": "ＡＩで何でもやればいいわけじゃない",
+                                                     "published": "2025-06-05T21:00:00Z"}, index)
+        assert result.url == "https://voicy.jp/channel/821320/6768811", result
+        assert len(requests_seen) == 3, requests_seen
+        # Not on Voicy yet: no URL rather than the newest one; a claimed episode is not reused.
+        assert resolve_voicy_episode(channel_url, {"guid": "c", "title": "新しい仕事の話"}, index).url is None
+        assert resolve_voicy_episode(channel_url, {"guid": "d", "title": "音声配信を続けるコツ"}, index).url is None
+        assert resolve_voicy_episode(channel_url, {"guid": "a", "title": "音声配信を続けるコツ"}, index).url is not None
+    with tempfile.TemporaryDirectory() as tmp, VoicyEpisodeIndex(os.path.join(tmp, "index.sqlite3")) as index:
+        # Other channels' recommended stories on the page are neither indexed nor taken as the head.
+        recommended_url = f"http://127.0.0.1:{server.server_address[1]}/recommended/channel/821320"
+        assert refresh_channel_index(index, recommended_url) == 3
+        assert [c["story_id"] for c in index.candidates("821320")] == [6768811, 6751234, 6733001]
+        assert index.channel("821320")["head_story_id"] == 6768811
+        # An index polluted with a foreign head before the fix heals on the next changed page.
+        index.drop_newer_than("821320", 6751234)
+        index.update("821320", [{"story_id": 7000000, "url": "https://voicy.jp/channel/821320/7000000",
+                                 "title": "他のチャンネルのおすすめ放送", "published": None}])
+        assert index.channel("821320")["head_story_id"] == 7000000
+        assert refresh_channel_index(index, recommended_url) == 1
+        assert index.channel("821320")["head_story_id"] == 6768811
+        assert 7000000 not in {c["story_id"] for c in index.candidates("821320", limit=-1, unclaimed=False)}
+    server.shutdown()
+    print("--- voicy_index.py self-check passed ---")
@@ -1,16 +1,313 @@
 import os
+import sys
+import re
+import json
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
+import logging
+from dataclasses import dataclass, field
+from urllib.parse import urljoin
+import requests
+from metrics import observe
+# BeautifulSoup is imported where a page is parsed, and Selenium lazily in
+# _get_latest_voicy_episode_url_browser(), which only runs when the plain HTTP
+# fast path cannot find the episode link; importing this module stays cheap
+# for runs that find no new episode.
 # webdriver_manager can be used to automatically manage ChromeDriver
 # from webdriver_manager.chrome import ChromeDriverManager
 
 # Voicy specific selector from the project plan
 VOICY_EPISODE_SELECTOR = "a.story-item-content"
+# Episode pages look like https://voicy.jp/channel/<channel id>/<story id>
+VOICY_CHANNEL_ID_PATTERN = re.compile(r"/channel/(\d+)")
+# Keys that hold a story id in Voicy's embedded JSON data
+VOICY_STORY_ID_KEYS = ("StoryId", "storyId", "story_id")
+# ... and the channel a story belongs to (pages embed other channels' stories as recommendations)
+VOICY_CHANNEL_ID_KEYS = ("ChannelId", "channelId", "channel_id")
+# ... and the title / publish time next to it
+VOICY_TITLE_KEYS = ("Title", "title", "StoryTitle", "storyTitle")
+VOICY_PUBLISHED_KEYS = ("PublishedAt", "publishedAt", "published_at", "ReleasedAt", "releasedAt", "PublishAt")
+VOICY_TITLE_SELECTOR = ".story-item-title"
+HTTP_TIMEOUT_SECONDS = 15
+HTTP_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36"
+
+# Prefix of the JSON result line voicy_scraper.py prints when run as a script
+SCRAPE_RESULT_STDOUT_PREFIX = "VOICY_SCRAPE_RESULT:"
+
+# ChromeDriver's --verbose log is opt-in (CHROMEDRIVER_VERBOSE=1); it grows by hundreds of lines per run
+CHROMEDRIVER_VERBOSE = os.environ.get("CHROMEDRIVER_VERBOSE", "").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+
+# Which path produced a ScrapeResult
+METHOD_HTTP = "http"
+METHOD_BROWSER = "browser"
+METHOD_SUBPROCESS = "subprocess" # The isolated scraper process did not report a result
+METHOD_INDEX = "index"           # Matched against the channel's episode listing (voicy_index)
+
+@dataclass
+class ScrapeResult:
+    """
+    Outcome of a Voicy lookup.
+
+    Attributes:
+        url: The latest episode URL, or None if it could not be found.
+        method: METHOD_HTTP or METHOD_BROWSER, whichever path ran last
+                (METHOD_INDEX for a voicy_index match).
+        elapsed_seconds: Total wall time of the lookup.
+        error: A short description of why no URL was found, otherwise None.
+        timings: Per-phase durations in seconds ('http', 'driver_start',
+                 'page_load', 'selector_wait'), only for phases that ran.
+    """
+    url: str | None
+    method: str
+    elapsed_seconds: float
+    error: str | None = None
+    timings: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "method": self.method,
+            "elapsed_seconds": self.elapsed_seconds,
+            "error": self.error,
+            "timings": self.timings,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ScrapeResult":
+        return cls(
+            url=data.get("url"),
+            method=data.get("method", METHOD_BROWSER),
+            elapsed_seconds=float(data.get("elapsed_seconds", 0.0)),
+            error=data.get("error"),
+            timings=data.get("timings") or {},
+        )
+
+def _channel_id(voicy_channel_url: str) -> str | None:
+    match = VOICY_CHANNEL_ID_PATTERN.search(voicy_channel_url)
+    return match.group(1) if match else None
+
+def _first_channel_episode_url(hrefs, voicy_channel_url: str) -> str | None:
+    """
+    Returns the first of the episode card links that belongs to this channel, as an absolute URL.
+
+    Channel pages also show cards for other channels' episodes (recommendations),
+    sometimes before the channel's own. Any card counts if the channel URL
+    carries no channel id.
+    """
+    channel_id = _channel_id(voicy_channel_url)
+    link_pattern = re.compile(rf"/channel/{channel_id}/(\d+)") if channel_id else None
+    for href in hrefs:
+        if href and (link_pattern is None or link_pattern.search(href)):
+            return urljoin(voicy_channel_url, href)
+    return None
+
+def extract_latest_episode_url_from_html(html: str, voicy_channel_url: str) -> str | None:
+    """
+    Pulls the latest episode URL out of a Voicy channel page without a browser.
+
+    Tries, in order: the server-rendered episode link (VOICY_EPISODE_SELECTOR),
+    embedded JSON data blobs (Next.js __NEXT_DATA__ and other application/json
+    scripts), and finally any /channel/<id>/<story id> link in the markup.
+
+    Args:
+        html: The channel page HTML.
+        voicy_channel_url: The channel URL, used to resolve relative links.
+
+    Returns:
+        The absolute episode URL, or None if the page carries no episode data
+        (e.g. a client-rendered shell that needs JavaScript).
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    channel_id = _channel_id(voicy_channel_url)
+    link_pattern = re.compile(rf"/channel/{channel_id}/(\d+)") if channel_id else None
+
+    # 1. Server-rendered markup: the first episode card of this channel is the newest one.
+    episode_url = _first_channel_episode_url((element.get("href") for element in soup.select(VOICY_EPISODE_SELECTOR)),
+                                             voicy_channel_url)
+    if episode_url:
+        return episode_url
+
+    if not channel_id:
+        return None
+
+    # 2. Embedded JSON: Voicy story ids increase over time, so this channel's largest one is the newest.
+    story_ids = []
+    for script in soup.find_all("script", type=["application/json", "application/ld+json"]):
+        try:
+            data = json.loads(script.string or "")
+        except json.JSONDecodeError:
+            continue
+        story_ids.extend(int(_first_value(record, VOICY_STORY_ID_KEYS)) for record in _channel_story_records(data, channel_id))
+    if story_ids:
+        return f"https://voicy.jp/channel/{channel_id}/{max(story_ids)}"
+
+    # 3. Any plain link to an episode of this channel, first in document order.
+    for anchor in soup.find_all("a", href=True):
+        if link_pattern.search(anchor["href"]):
+            return urljoin(voicy_channel_url, anchor["href"])
+    return None
+
+def _has_story_id(data: dict) -> bool:
+    return any(str(data.get(key, "")).isdigit() for key in VOICY_STORY_ID_KEYS)
+
+def _iter_story_records(data, channel_id: str | None = None):
+    """
+    Walks a decoded JSON blob and yields (record, channel id) for every dict that carries a story id.
+
+    The channel id is the record's own, else the nearest enclosing object's.
+    An object also takes it from a channel object among its values (Next.js
+    pages put {"channel": {"ChannelId": ...}} next to the story list). None
+    if nothing says which channel the record belongs to.
+    """
+    if isinstance(data, dict):
+        own = _first_value(data, VOICY_CHANNEL_ID_KEYS)
+        if own is None:
+            own = next((_first_value(value, VOICY_CHANNEL_ID_KEYS) for value in data.values()
+                        if isinstance(value, dict) and not _has_story_id(value)
+                        and _first_value(value, VOICY_CHANNEL_ID_KEYS) is not None), None)
+        channel_id = own or channel_id
+        if _has_story_id(data):
+            yield data, channel_id
+        for value in data.values():
+            yield from _iter_story_records(value, channel_id)
+    elif isinstance(data, list):
+        for value in data:
+            yield from _iter_story_records(value, channel_id)
+
+def _names_a_channel(data) -> bool:
+    if isinstance(data, dict):
+        return _first_value(data, VOICY_CHANNEL_ID_KEYS) is not None or any(_names_a_channel(value) for value in data.values())
+    if isinstance(data, list):
+        return any(_names_a_channel(value) for value in data)
+    return False
+
+def _channel_story_records(data, channel_id: str) -> list[dict]:
+    """
+    The story records of one channel in a decoded JSON blob.
+
+    Records of another channel (recommendations, related stories) are
+    dropped; so are records without any channel id when the blob names a
+    channel anywhere, since they cannot be told apart.
+    """
+    records = list(_iter_story_records(data))
+    names_a_channel = _names_a_channel(data)
+    return [record for record, record_channel in records
+            if record_channel == channel_id or (record_channel is None and not names_a_channel)]
+
+def _first_value(record: dict, keys: tuple) -> str | None:
+    for key in keys:
+        if record.get(key) not in (None, ""):
+            return str(record[key])
+    return None
+
+def extract_channel_episodes(html: str, voicy_channel_url: str) -> list[dict]:
+    """
+    Lists every episode on a Voicy channel page without a browser.
+
+    Reads the server-rendered episode cards (VOICY_EPISODE_SELECTOR with their
+    title and <time>) and the embedded JSON data blobs, like
+    extract_latest_episode_url_from_html(); stories of other channels on the
+    page (recommendations) are left out.
+
+    Returns:
+        Dicts with 'story_id' (int), 'url', 'title' and 'published' (the
+        page's date string, or None), newest first (by story id). Empty if the
+        page carries no episode data.
+    """
+    channel_id = _channel_id(voicy_channel_url)
+    if not channel_id:
+        return []
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    story_pattern = re.compile(rf"/channel/{channel_id}/(\d+)")
+    episodes = {}
+
+    for element in soup.select(VOICY_EPISODE_SELECTOR):
+        match = story_pattern.search(element.get("href", ""))
+        if not match:
+            continue
+        title_element = element.select_one(VOICY_TITLE_SELECTOR)
+        time_element = element.find("time")
+        episodes[int(match.group(1))] = {
+            "title": (title_element or element).get_text(" ", strip=True),
+            "published": (time_element.get("datetime") or time_element.get_text(strip=True)) if time_element else None,
+        }
+
+    for script in soup.find_all("script", type=["application/json", "application/ld+json"]):
+        try:
+            data = json.loads(script.string or "")
+        except json.JSONDecodeError:
+            continue
+        for record in _channel_story_records(data, channel_id):
+            story_id = int(_first_value(record, VOICY_STORY_ID_KEYS))
+            known = episodes.setdefault(story_id, {"title": None, "published": None})
+            known["title"] = known["title"] or _first_value(record, VOICY_TITLE_KEYS)
+            known["published"] = known["published"] or _first_value(record, VOICY_PUBLISHED_KEYS)
+
+    return [{"story_id": story_id, "url": f"https://voicy.jp/channel/{channel_id}/{story_id}",
+             "title": episode["title"] or "", "published": episode["published"]}
+            for story_id, episode in sorted(episodes.items(), reverse=True)]
+
+def _get_latest_voicy_episode_url_http(voicy_channel_url: str) -> str | None:
+    """Fast path: fetches the channel page with requests and parses it with BeautifulSoup."""
+    response = requests.get(
+        voicy_channel_url,
+        headers={"User-Agent": HTTP_USER_AGENT, "Accept-Language": "ja,en;q=0.8"},
+        timeout=HTTP_TIMEOUT_SECONDS,
+    )
+    response.raise_for_status()
+    return extract_latest_episode_url_from_html(response.text, voicy_channel_url)
+
+def scrape_latest_voicy_episode(voicy_channel_url: str, pool=None) -> ScrapeResult:
+    """
+    Finds the latest Voicy episode URL, trying plain HTTP first and Chrome only as a fallback.
+
+    Args:
+        voicy_channel_url: The URL of the Voicy channel page.
+        pool: Optional browser_pool.BrowserPool used by the browser fallback.
+
+    Returns:
+        A ScrapeResult recording the URL (or None), which path ran last, the
+        total and per-phase time, and the error if nothing was found. This
+        function does not raise, so it is safe to call in-process from the monitor.
+    """
+    started = time.perf_counter()
+    timings = {}
+
+    episode_url = None
+    http_error = None
+    logger.debug(f"HTTP fast path for {voicy_channel_url}")
+    try:
+        episode_url = _get_latest_voicy_episode_url_http(voicy_channel_url)
+        logger.debug(f"HTTP fast path result: {episode_url}")
+        if not episode_url:
+            http_error = "no episode link in server-rendered page"
+    except Exception as e:
+        http_error = str(e)
+        logger.warning(f"HTTP fast path failed for {voicy_channel_url}: {e}")
+    timings["http"] = time.perf_counter() - started
+
+    if episode_url:
+        return _observed(ScrapeResult(episode_url, METHOD_HTTP, time.perf_counter() - started, timings=timings))
+
+    try:
+        episode_url, browser_error = _get_latest_voicy_episode_url_browser(voicy_channel_url, timings, pool)
+    except Exception as e: # e.g. selenium not installed
+        episode_url, browser_error = None, str(e)
+    error = None if episode_url else f"HTTP fast path: {http_error}; browser fallback: {browser_error}"
+    return _observed(ScrapeResult(episode_url, METHOD_BROWSER, time.perf_counter() - started, error, timings))
+
+def _observed(result: ScrapeResult) -> ScrapeResult:
+    """Records the lookup and each of its phases (http, driver_start, page_load, selector_wait) in metrics."""
+    observe("voicy_lookup", result.elapsed_seconds, failed=not result.url, method=result.method)
+    for phase, seconds in result.timings.items():
+        observe("voicy_phase", seconds, phase=phase)
+    return result
 
 def get_latest_voicy_episode_url(voicy_channel_url: str) -> str | None:
     """
@@ -23,109 +320,227 @@ def get_latest_voicy_episode_url(voicy_channel_url: str) -> str | None:
         The URL of the latest episode as a string, or None if an error occurs
         or the episode cannot be found.
     """
+    return scrape_latest_voicy_episode(voicy_channel_url).url
+
+def create_chrome_driver():
+    """
+    Starts a headless Chrome with the project's ChromeDriver setup.
+
+    Also serves as the driver factory for browser_pool.BrowserPool.
+
+    Returns:
+        A selenium webdriver.Chrome instance. The caller owns it and must quit() it.
+
+    Raises:
+        FileNotFoundError: If the ChromeDriver executable does not exist.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
     chrome_options.add_argument("--headless")  # Run in headless mode (no browser UI)
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu") # Optional, sometimes helps in headless
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36")
+    chrome_options.add_argument(f"user-agent={HTTP_USER_AGENT}")
 
-    driver = None # Initialize driver to None
-    # Define log file paths
-    script_dir_for_log = os.path.dirname(os.path.abspath(__file__))
-    project_root_for_log = os.path.dirname(script_dir_for_log)
-    
     # Log path for ChromeDriver service logs
-    chromedriver_service_log_path = os.path.join(project_root_for_log, "chromedriver.log")
-    # Log path for this function's custom internal logs
-    function_internal_log_path = os.path.join(project_root_for_log, "function_internal.log")
-
-    # Open the dedicated log file for this function's custom messages
-    with open(function_internal_log_path, "a", encoding="utf-8") as f_custom_log:
-        print(f"\n--- Logging for get_latest_voicy_episode_url call ({time.strftime('%Y-%m-%d %H:%M:%S')}) --- ", flush=True, file=f_custom_log)
-        print(f"Target Voicy Channel URL: {voicy_channel_url}", flush=True, file=f_custom_log)
-        try:
-            # Configure ChromeDriver path
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            chromedriver_path = os.path.join(script_dir, "drivers", "chromedriver.exe")
-            print(f"DEBUG: ChromeDriver executable path: {chromedriver_path}", flush=True, file=f_custom_log)
-            print(f"DEBUG: ChromeDriver service log output will be configured to: {chromedriver_service_log_path}", flush=True, file=f_custom_log)
-
-            if os.environ.get("GITHUB_ACTIONS") == "true":
-                chromedriver_executable_path = "/usr/local/bin/chromedriver"
-                print(f"INFO: Running in GitHub Actions, using ChromeDriver path: {chromedriver_executable_path}", flush=True, file=f_custom_log)
-                if not os.path.exists(chromedriver_executable_path):
-                    print(f"ERROR: ChromeDriver not found at {chromedriver_executable_path}! Checking /usr/local/bin:", flush=True, file=f_custom_log)
-                    try:
-                        if os.path.exists("/usr/local/bin"):
-                            usr_local_bin_contents = os.listdir("/usr/local/bin")
-                            print(f"Contents of /usr/local/bin: {usr_local_bin_contents}", flush=True, file=f_custom_log)
-                        else:
-                            print("/usr/local/bin directory does not exist.", flush=True, file=f_custom_log)
-                    except Exception as e:
-                        print(f"Could not list /usr/local/bin: {e}", flush=True, file=f_custom_log)
-                service = ChromeService(
-                    executable_path=chromedriver_executable_path,
-                    log_output=chromedriver_service_log_path,
-                    service_args=["--verbose"]
-                )
-            else:
-                # Local setup
-                print(f"INFO: Running locally, expecting ChromeDriver at {chromedriver_path}.", flush=True, file=f_custom_log)
-                if not os.path.exists(chromedriver_path):
-                    error_msg = f"ERROR: ChromeDriver not found at {chromedriver_path}\n"
-                    print(error_msg.strip(), flush=True, file=f_custom_log) # Also print to console for local runs
-                    return None
-                service = ChromeService(
-                    executable_path=chromedriver_path,
-                    log_output=chromedriver_service_log_path, # Service logs to its own file
-                    service_args=["--verbose"]
-                )
-            
-            print("DEBUG: ChromeService object initialized.", flush=True, file=f_custom_log)
-            
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-            print("DEBUG: webdriver.Chrome initialized.", flush=True, file=f_custom_log)
-            
-            print(f"DEBUG: Attempting to driver.get URL: {voicy_channel_url}", flush=True, file=f_custom_log)
-            driver.get(voicy_channel_url)
-            print(f"DEBUG: driver.get call completed for URL: {voicy_channel_url}", flush=True, file=f_custom_log)
-
-            wait = WebDriverWait(driver, 20) 
-            print("DEBUG: WebDriverWait initialized. Waiting for element...", flush=True, file=f_custom_log)
-            latest_episode_element = wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, VOICY_EPISODE_SELECTOR))
-            )
-            print(f"DEBUG: Latest episode element found: {latest_episode_element is not None}", flush=True, file=f_custom_log)
-
-            if latest_episode_element:
-                episode_url = latest_episode_element.get_attribute('href')
-                print(f"DEBUG: Episode URL found: {episode_url}", flush=True, file=f_custom_log)
-                print(f"--- End of get_latest_voicy_episode_url call log (Success) ---", flush=True, file=f_custom_log)
-                return episode_url 
-            else:
-                print(f"DEBUG: Could not find the latest episode element using selector: {VOICY_EPISODE_SELECTOR}", flush=True, file=f_custom_log)
-                print(f"--- End of get_latest_voicy_episode_url call log (Element not found) ---", flush=True, file=f_custom_log)
-                return None
-        except Exception as e:
-            print(f"ERROR: An exception occurred in get_latest_voicy_episode_url: {e}", flush=True, file=f_custom_log)
-            # Also print to console for immediate visibility if the tool shows it
-            print(f"ERROR in get_latest_voicy_episode_url (see {function_internal_log_path} for details): {e}", flush=True)
-            print(f"--- End of get_latest_voicy_episode_url call log (Exception) ---", flush=True, file=f_custom_log)
-            return None
-        finally:
-            if driver:
-                print(f"DEBUG: Quitting webdriver.", flush=True, file=f_custom_log)
-                driver.quit()
-                print(f"DEBUG: Webdriver quit.", flush=True, file=f_custom_log)
-            else:
-                print(f"DEBUG: No webdriver instance to quit (driver was None or not initialized).", flush=True, file=f_custom_log)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    chromedriver_service_log_path = os.path.join(os.path.dirname(script_dir), "chromedriver.log")
+
+    # Configure ChromeDriver path
+    chromedriver_path = os.path.join(script_dir, "drivers", "chromedriver.exe")
+    logger.debug(f"ChromeDriver executable path: {chromedriver_path}")
+    logger.debug(f"ChromeDriver service log output will be configured to: {chromedriver_service_log_path}")
+
+    if os.environ.get("GITHUB_ACTIONS") == "true":
+        chromedriver_executable_path = "/usr/local/bin/chromedriver"
+        logger.info(f"Running in GitHub Actions, using ChromeDriver path: {chromedriver_executable_path}")
+        if not os.path.exists(chromedriver_executable_path):
+            logger.error(f"ChromeDriver not found at {chromedriver_executable_path}! Checking /usr/local/bin:")
+            try:
+                if os.path.exists("/usr/local/bin"):
+                    usr_local_bin_contents = os.listdir("/usr/local/bin")
+                    logger.debug(f"Contents of /usr/local/bin: {usr_local_bin_contents}")
+                else:
+                    logger.debug("/usr/local/bin directory does not exist.")
+            except Exception as e:
+                logger.debug(f"Could not list /usr/local/bin: {e}")
+    else:
+        # Local setup
+        chromedriver_executable_path = chromedriver_path
+        logger.info(f"Running locally, expecting ChromeDriver at {chromedriver_path}.")
+        if not os.path.exists(chromedriver_path):
+            logger.error(f"ChromeDriver not found at {chromedriver_path}")
+            raise FileNotFoundError(f"ChromeDriver not found at {chromedriver_path}")
+
+    service = ChromeService(
+        executable_path=chromedriver_executable_path,
+        log_output=chromedriver_service_log_path, # Service logs to its own file
+        service_args=["--verbose"] if CHROMEDRIVER_VERBOSE else []
+    )
+    logger.debug("ChromeService object initialized.")
+
+    driver = webdriver.Chrome(service=service, options=chrome_options)
+    logger.debug("webdriver.Chrome initialized.")
+    return driver
+
+def _read_latest_episode_url(driver, voicy_channel_url: str, timings: dict) -> tuple[str | None, str | None]:
+    """Loads the channel page in the driver's current tab and reads the first episode link of this channel."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+
+    logger.debug(f"Attempting to driver.get URL: {voicy_channel_url}")
+    phase_started = time.perf_counter()
+    driver.get(voicy_channel_url)
+    timings["page_load"] = time.perf_counter() - phase_started
+    logger.debug(f"driver.get call completed for URL: {voicy_channel_url}")
+
+    def channel_episode_url(current_driver):
+        # Same filter as the HTTP fast path: a recommended card of another channel may render first.
+        hrefs = [element.get_attribute('href') for element in current_driver.find_elements(By.CSS_SELECTOR, VOICY_EPISODE_SELECTOR)]
+        return _first_channel_episode_url(hrefs, voicy_channel_url)
+
+    # Cards are re-rendered while the page hydrates; a stale one is simply read again on the next try.
+    wait = WebDriverWait(driver, 20, ignored_exceptions=(StaleElementReferenceException,))
+    logger.debug("WebDriverWait initialized. Waiting for an episode link of this channel...")
+    phase_started = time.perf_counter()
+    try:
+        episode_url = wait.until(channel_episode_url)
+    except TimeoutException:
+        timings["selector_wait"] = time.perf_counter() - phase_started
+        if driver.find_elements(By.CSS_SELECTOR, VOICY_EPISODE_SELECTOR):
+            logger.debug(f"Only other channels' episodes matched selector: {VOICY_EPISODE_SELECTOR}")
+            return None, f"no {VOICY_EPISODE_SELECTOR} link of this channel"
+        logger.debug(f"Could not find the latest episode element using selector: {VOICY_EPISODE_SELECTOR}")
+        return None, f"no element matched {VOICY_EPISODE_SELECTOR}"
+    timings["selector_wait"] = time.perf_counter() - phase_started
+    logger.debug(f"Episode URL found: {episode_url}")
+    return episode_url, None
+
+def _get_latest_voicy_episode_url_browser(voicy_channel_url: str, timings: dict | None = None, pool=None) -> tuple[str | None, str | None]:
+    """
+    Browser fallback: loads the channel page in headless Chrome and waits for the episode link.
+
+    Args:
+        voicy_channel_url: The URL of the Voicy channel page.
+        timings: Optional dict that receives 'driver_start', 'page_load' and
+                 'selector_wait' durations in seconds.
+        pool: Optional browser_pool.BrowserPool. When given, the page is opened
+              in a tab of a warm pooled driver instead of a fresh Chrome.
+
+    Returns:
+        A (url, error) tuple: the URL of the latest episode and None, or None
+        and a description of what went wrong.
+    """
+    if timings is None:
+        timings = {}
+    driver = None # Initialize driver to None
+    logger.debug(f"Browser fallback for Voicy channel URL: {voicy_channel_url}")
+    try:
+        if pool is not None:
+            phase_started = time.perf_counter()
+            with pool.tab() as pooled_driver:
+                timings["driver_start"] = time.perf_counter() - phase_started
+                logger.debug("Using a tab of a pooled webdriver.")
+                episode_url, error = _read_latest_episode_url(pooled_driver, voicy_channel_url, timings)
+        else:
+            phase_started = time.perf_counter()
+            driver = create_chrome_driver()
+            timings["driver_start"] = time.perf_counter() - phase_started
+            episode_url, error = _read_latest_episode_url(driver, voicy_channel_url, timings)
+        logger.debug(f"Browser fallback finished ({'Success' if episode_url else 'Element not found'}).")
+        return episode_url, error
+    except FileNotFoundError as e:
+        return None, str(e)
+    except Exception as e:
+        logger.error(f"An exception occurred in the voicy_scraper browser fallback: {e}", exc_info=True)
+        return None, str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__
+    finally:
+        if driver:
+            logger.debug("Quitting webdriver.")
+            driver.quit()
+
+def scrape_many_voicy_channels(voicy_channel_urls: list[str], pool=None, max_workers: int | None = None) -> dict:
+    """
+    Looks up the latest episode of many channels, sharing one warm browser pool for fallbacks.
+
+    Args:
+        voicy_channel_urls: Channel page URLs.
+        pool: Optional browser_pool.BrowserPool. If omitted, one is created for
+              this call (Chrome only starts if a channel needs the fallback)
+              and closed afterwards.
+        max_workers: Concurrent lookups. Defaults to the pool's driver count.
+
+    Returns:
+        A dict mapping each channel URL to its ScrapeResult.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from browser_pool import BrowserPool
+
+    owns_pool = pool is None
+    if owns_pool:
+        pool = BrowserPool(driver_factory=create_chrome_driver)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers or pool.size) as executor:
+            results = executor.map(lambda url: scrape_latest_voicy_episode(url, pool=pool), voicy_channel_urls)
+            return dict(zip(voicy_channel_urls, results))
+    finally:
+        if owns_pool:
+            pool.close()
 
 if __name__ == '__main__':
+    from log_setup import configure_logging
+    configure_logging()
+    fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixtures", "voicy")
+
+    # Offline self-check of the HTTP fast path against the saved pages: python src/voicy_scraper.py --self-check
+    if "--self-check" in sys.argv[1:]:
+        own_channel_url = "https://voicy.jp/channel/821320"
+        expected_latest = {
+            "channel_ssr.html": "https://voicy.jp/channel/821320/6768811",
+            "channel_next_data.html": "https://voicy.jp/channel/821320/6768811",
+            "channel_client_only.html": None,
+            # A foreign card comes first and the JSON recommends other channels' newer stories.
+            "channel_recommendations.html": "https://voicy.jp/channel/821320/6768811",
+        }
+        for fixture_name, expected_url in expected_latest.items():
+            with open(os.path.join(fixtures_dir, fixture_name), "r", encoding="utf-8") as f_fixture:
+                fixture_url = extract_latest_episode_url_from_html(f_fixture.read(), own_channel_url)
+            assert fixture_url == expected_url, (fixture_name, fixture_url)
+        with open(os.path.join(fixtures_dir, "channel_recommendations.html"), "r", encoding="utf-8") as f_fixture:
+            recommendation_episodes = extract_channel_episodes(f_fixture.read(), own_channel_url)
+        assert [e["story_id"] for e in recommendation_episodes] == [6768811, 6751234, 6733001], recommendation_episodes
+        assert all(e["url"].startswith(own_channel_url + "/") for e in recommendation_episodes), recommendation_episodes
+        # The browser fallback reads the rendered cards through the same filter.
+        rendered_hrefs = ["https://voicy.jp/channel/999/7000001", None, "https://voicy.jp/channel/821320/6768811"]
+        assert _first_channel_episode_url(rendered_hrefs, own_channel_url) == "https://voicy.jp/channel/821320/6768811"
+        assert _first_channel_episode_url(rendered_hrefs[:1], own_channel_url) is None
+        assert _first_channel_episode_url(["/channel/999/7000001"], "https://voicy.jp/") == "https://voicy.jp/channel/999/7000001"
+        # Without any channel id in the blob the stories cannot be told apart, so they all count.
+        bare_html = '<script type="application/json">{"stories":[{"StoryId":5},{"StoryId":9}]}</script>'
+        assert extract_latest_episode_url_from_html(bare_html, own_channel_url) == "https://voicy.jp/channel/821320/9"
+        print("--- voicy_scraper.py self-check passed ---")
+        raise SystemExit(0)
+
+    # Offline check of the HTTP fast path against one saved page, e.g.
+    # TEST_VOICY_HTML_FIXTURE=fixtures/voicy/channel_ssr.html python src/voicy_scraper.py
+    test_html_fixture = os.getenv("TEST_VOICY_HTML_FIXTURE")
+    if test_html_fixture:
+        fixture_channel_url = os.getenv("TEST_VOICY_CHANNEL_URL", "https://voicy.jp/channel/821320")
+        with open(test_html_fixture, "r", encoding="utf-8") as f_fixture:
+            fixture_url = extract_latest_episode_url_from_html(f_fixture.read(), fixture_channel_url)
+        print(f"Fixture {test_html_fixture}: {fixture_url}", flush=True)
+        if fixture_url:
+            print(f"VOICY_EPISODE_URL:{fixture_url}")
+        raise SystemExit(0 if fixture_url else 1)
+
     scraper_output_log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper_run_log.txt")
     with open(scraper_output_log_path, "w", encoding="utf-8") as f_scraper_out:
         print("--- Running voicy_scraper.py test ---", flush=True, file=f_scraper_out)
-        
+
         test_voicy_channel_url = os.getenv("TEST_VOICY_CHANNEL_URL", "https://voicy.jp/channel/1343")
 
         if test_voicy_channel_url == "https://voicy.jp/channel/1343" and not os.getenv("TEST_VOICY_CHANNEL_URL"):
@@ -138,13 +553,17 @@ if __name__ == '__main__':
         print(f"Attempting to fetch the latest episode URL from: {test_voicy_channel_url}", flush=True, file=f_scraper_out)
         print("DEBUG: Checkpoint 2 - After attempting to print fetch message, before calling function", flush=True, file=f_scraper_out)
         
-        latest_url = get_latest_voicy_episode_url(test_voicy_channel_url)
-        print(f"DEBUG: Checkpoint 3 - Returned from get_latest_voicy_episode_url. latest_url type: {type(latest_url)}, value: '{latest_url}'", flush=True, file=f_scraper_out)
+        scrape_result = scrape_latest_voicy_episode(test_voicy_channel_url)
+        latest_url = scrape_result.url
+        print(f"DEBUG: Checkpoint 3 - Returned from scrape_latest_voicy_episode. latest_url type: {type(latest_url)}, value: '{latest_url}'", flush=True, file=f_scraper_out)
+        print(f"DEBUG: Path used: {scrape_result.method}, elapsed: {scrape_result.elapsed_seconds:.2f}s", flush=True, file=f_scraper_out)
 
+        # Print the structured result to standard output for rss_monitor.py's subprocess mode
+        print(f"{SCRAPE_RESULT_STDOUT_PREFIX}{json.dumps(scrape_result.to_dict(), ensure_ascii=False)}")
         if latest_url:
             print(f"\nSuccessfully fetched latest Voicy episode URL:", flush=True, file=f_scraper_out)
             print(f"  {latest_url}", flush=True, file=f_scraper_out)
-            # Print the URL to standard output for rss_monitor.py to capture
+            # Print the URL to standard output for older callers that grep for it
             print(f"VOICY_EPISODE_URL:{latest_url}")
         else:
             print(f"\nFailed to fetch the latest Voicy episode URL.", flush=True, file=f_scraper_out)
@@ -0,0 +1,433 @@
+import os
+import json
+import random
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from webhook_sender import JSON_HEADERS, WEBHOOK_TIMEOUT_SECONDS
+from metrics import span
+
+# Durable outbox for webhook deliveries.
+# Events are written to a SQLite table first and delivered afterwards, so a
+# failed POST is retried on a later pass instead of being lost. Delivery
+# reuses one keep-alive requests.Session, fans out across webhook URLs on a
+# small thread pool (events for the same URL stay in order), retries with
+# exponential backoff plus jitter, honours Retry-After on 429/503, and can
+# send several events for the same URL as one JSON array when the receiver
+# accepts arrays.
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTBOX_PATH = os.environ.get(
+    "WEBHOOK_OUTBOX_PATH", os.path.join(PROJECT_ROOT, "data", "webhook_outbox.sqlite3")
+)
+MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE_SECONDS = float(os.environ.get("WEBHOOK_BACKOFF_BASE", "2"))
+BACKOFF_MAX_SECONDS = float(os.environ.get("WEBHOOK_BACKOFF_MAX", "600"))
+MAX_BATCH_SIZE = int(os.environ.get("WEBHOOK_BATCH_SIZE", "20"))
+MAX_DELIVERY_WORKERS = 8
+
+# Message statuses
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_DEAD = "dead"        # Gave up: permanent 4xx or MAX_ATTEMPTS reached
+
+# 408/425/429 and server errors are worth retrying; other 4xx will not get better.
+RETRYABLE_STATUS_CODES = {408, 425, 429}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    webhook_url TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    ref TEXT,
+    batch INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_ref ON outbox (webhook_url, ref);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+"""
+
+logger = logging.getLogger(__name__)
+
+def parse_retry_after(value: str | None, now: float | None = None) -> float | None:
+    """Returns the Retry-After header (delta-seconds or HTTP-date) as seconds from now, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, retry_at - (time.time() if now is None else now))
+
+def backoff_delay(attempts: int, base: float = BACKOFF_BASE_SECONDS, cap: float = BACKOFF_MAX_SECONDS) -> float:
+    """Exponential backoff with jitter: a random delay in [d/2, d] where d = base * 2^(attempts-1), capped."""
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class WebhookOutbox:
+    """
+    SQLite-backed queue of webhook events waiting to be delivered.
+
+    Usage:
+        with WebhookOutbox() as outbox:
+            outbox.enqueue(webhook_url, build_payload(voicy_url), ref="feed guid")
+            WebhookDeliverer(outbox).drain(budget_seconds=60)
+    """
+
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def enqueue(self, webhook_url: str, payload, ref: str | None = None, batch: bool = False) -> bool:
+        """
+        Stores one event for delivery.
+
+        Args:
+            webhook_url: Where to POST the payload.
+            payload: JSON-serialisable body (one event).
+            ref: Optional caller reference, e.g. the episode it belongs to. An
+                 event with the same (webhook_url, ref) is only queued once.
+            batch: True if the receiver accepts a JSON array of events, so
+                   this event may be sent together with others for the same URL.
+
+        Returns:
+            True if the event was queued, False if it was already in the outbox.
+        """
+        now = time.time()
+        with self._lock:
+            # Not due before the events queued ahead of it for the same URL (they may be backed off).
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (webhook_url, payload, ref, batch, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, MAX(?, COALESCE((SELECT MAX(next_attempt_at) FROM outbox "
+                "WHERE webhook_url = ? AND status = ?), 0)), ?)",
+                (webhook_url, json.dumps(payload, ensure_ascii=False), ref, int(batch), STATUS_PENDING,
+                 now, webhook_url, STATUS_PENDING, now),
+            )
+        return cursor.rowcount == 1
+
+    def due(self, now: float | None = None, limit: int = 1000) -> list[dict]:
+        """Returns pending events whose next attempt is due, oldest first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM outbox WHERE status = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (STATUS_PENDING, now, limit),
+            ).fetchall()
+        return [dict(row, payload=json.loads(row["payload"])) for row in rows]
+
+    def next_attempt_at(self) -> float | None:
+        """Epoch time of the earliest pending attempt, or None if nothing is pending."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) AS next_at FROM outbox WHERE status = ?", (STATUS_PENDING,)
+            ).fetchone()
+        return row["next_at"]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (STATUS_PENDING,)).fetchone()[0]
+
+    def mark_sent(self, ids: list[int]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, sent_at = ?, last_error = NULL WHERE id = ?",
+                [(STATUS_SENT, now, message_id) for message_id in ids],
+            )
+
+    def mark_failed(self, ids: list[int], error: str, retry_at: float | None):
+        """Records a failed attempt; retry_at=None gives up on the events."""
+        status = STATUS_PENDING if retry_at is not None else STATUS_DEAD
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = COALESCE(?, next_attempt_at), "
+                "last_error = ? WHERE id = ?",
+                [(status, retry_at, error, message_id) for message_id in ids],
+            )
+
+    def defer(self, webhook_url: str, retry_at: float) -> int:
+        """Moves every pending event of a URL to retry_at at the earliest, without counting an attempt."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET next_attempt_at = ? WHERE webhook_url = ? AND status = ? AND next_attempt_at < ?",
+                (retry_at, webhook_url, STATUS_PENDING, retry_at),
+            )
+        return cursor.rowcount
+
+    def purge_sent(self, older_than_seconds: float = 30 * 24 * 3600) -> int:
+        """Deletes delivered events older than the given age so the file stays small."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM outbox WHERE status = ? AND sent_at < ?", (STATUS_SENT, time.time() - older_than_seconds)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        """Checkpoints the WAL into the main file (so it can be copied or committed) and closes."""
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _new_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(JSON_HEADERS)
+    return session
+
+class WebhookDeliverer:
+    """
+    Delivers due outbox events over one shared keep-alive session.
+
+    Each call to deliver_due() makes at most one attempt per due event (or
+    batch of events); failed events are rescheduled in the outbox.
+    """
+
+    def __init__(self, outbox: WebhookOutbox, session: requests.Session | None = None,
+                 max_attempts: int = MAX_ATTEMPTS, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_workers: int = MAX_DELIVERY_WORKERS, timeout: float = WEBHOOK_TIMEOUT_SECONDS):
+        self.outbox = outbox
+        self.max_workers = max(1, max_workers)
+        self.session = session or _new_session(self.max_workers)
+        self.max_attempts = max(1, max_attempts)
+        self.max_batch_size = max(1, max_batch_size)
+        self.timeout = timeout
+        self.stats = {"requests": 0, "sent": 0, "retried": 0, "dead": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _post(self, webhook_url: str, body) -> tuple[bool, bool, str | None, float | None]:
+        """
+        POSTs one body.
+
+        Returns:
+            (delivered, retryable, error, retry_after_seconds)
+        """
+        self._count("requests")
+        with span("webhook_post", batch=isinstance(body, list)) as post_span:
+            try:
+                response = self.session.post(webhook_url, data=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+                                             timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                post_span.fail()
+                return False, True, str(e) or type(e).__name__, None
+            if not 200 <= response.status_code < 300:
+                post_span.fail()
+        if 200 <= response.status_code < 300:
+            return True, False, None, None
+        retryable = response.status_code in RETRYABLE_STATUS_CODES or response.status_code >= 500
+        return (False, retryable, f"HTTP {response.status_code}",
+                parse_retry_after(response.headers.get("Retry-After")))
+
+    def _deliver_group(self, messages: list[dict]) -> list[dict]:
+        """Delivers the due events of one webhook URL in order. Stops at the first retryable failure."""
+        webhook_url = messages[0]["webhook_url"]
+        # Consecutive batchable events are sent together; the rest one by one.
+        groups = []
+        for message in messages:
+            if (message["batch"] and groups and groups[-1][0]["batch"]
+                    and len(groups[-1]) < self.max_batch_size):
+                groups[-1].append(message)
+            else:
+                groups.append([message])
+
+        results = []
+        for index, group in enumerate(groups):
+            ids = [message["id"] for message in group]
+            body = [message["payload"] for message in group] if group[0]["batch"] else group[0]["payload"]
+            delivered, retryable, error, retry_after = self._post(webhook_url, body)
+            if delivered:
+                self.outbox.mark_sent(ids)
+                self._count("sent", len(group))
+                results.extend(dict(message, status=STATUS_SENT, error=None) for message in group)
+                continue
+
+            attempts = max(message["attempts"] for message in group) + 1
+            if retryable and attempts < self.max_attempts:
+                delay = max(backoff_delay(attempts), retry_after or 0)
+                retry_at = time.time() + delay
+                self.outbox.mark_failed(ids, error, retry_at)
+                # The rest of the URL's queue waits as well, so it stays in order and the backoff holds.
+                self.outbox.defer(webhook_url, retry_at)
+                self._count("retried", len(group))
+                logger.warning(f"Webhook delivery to {webhook_url} failed ({error}); "
+                               f"retrying {len(group)} event(s) in {delay:.1f}s (attempt {attempts}/{self.max_attempts}).")
+                results.extend(dict(message, status=STATUS_PENDING, error=error) for message in group)
+                if index + 1 < len(groups):
+                    rest = [message for later in groups[index + 1:] for message in later]
+                    results.extend(dict(message, status=STATUS_PENDING, error=None) for message in rest)
+                break
+            self.outbox.mark_failed(ids, error, None)
+            self._count("dead", len(group))
+            logger.error(f"Giving up on {len(group)} webhook event(s) for {webhook_url} after {attempts} attempt(s): {error}")
+            results.extend(dict(message, status=STATUS_DEAD, error=error) for message in group)
+        return results
+
+    def deliver_due(self) -> list[dict]:
+        """
+        Makes one delivery attempt for every due event, fanning out across webhook URLs.
+
+        Returns:
+            The attempted events (outbox rows) with their new 'status' and 'error'.
+        """
+        by_url = {}
+        for message in self.outbox.due():
+            by_url.setdefault(message["webhook_url"], []).append(message)
+        if not by_url:
+            return []
+        if len(by_url) == 1:
+            return self._deliver_group(next(iter(by_url.values())))
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(by_url))) as executor:
+            grouped = executor.map(self._deliver_group, by_url.values())
+            return [result for results in grouped for result in results]
+
+    def drain(self, budget_seconds: float = 0.0) -> list[dict]:
+        """
+        Delivers due events, then keeps retrying while the next retry falls within budget_seconds.
+
+        With budget_seconds=0 only one pass is made; anything still pending
+        stays in the outbox for the next call.
+
+        Returns:
+            Every attempted event with its final status in this call (the last
+            result per event id).
+        """
+        deadline = time.time() + budget_seconds
+        latest = {}
+        while True:
+            for result in self.deliver_due():
+                latest[result["id"]] = result
+            next_at = self.outbox.next_attempt_at()
+            if next_at is None or next_at > deadline:
+                break
+            time.sleep(max(0.0, next_at - time.time()))
+        return list(latest.values())
+
+    def close(self):
+        self.session.close()
+
+if __name__ == '__main__':
+    # Self-check against a local stand-in webhook that rate-limits, fails and accepts batches.
+    # Run with: python src/webhook_outbox.py
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from log_setup import configure_logging
+    configure_logging(log_file=None)
+
+    class StandInWebhookHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep-alive, like Make.com
+        received = []                 # (path, parsed body)
+        flaky_calls = 0
+        down_calls = 0                # POSTs to /down, which answers 503 while down is set
+        down = True
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/rate-limited" and StandInWebhookHandler.flaky_calls == 0:
+                StandInWebhookHandler.flaky_calls += 1
+                self._reply(429, {"Retry-After": "1"})
+                return
+            if self.path == "/down":
+                StandInWebhookHandler.down_calls += 1
+                if StandInWebhookHandler.down:
+                    self._reply(503, {"Retry-After": "1"})
+                    return
+            if self.path == "/gone":
+                self._reply(410)
+                return
+            StandInWebhookHandler.received.append((self.path, body))
+            self._reply(200)
+
+        def _reply(self, status: int, headers: dict | None = None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInWebhookHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with WebhookOutbox(os.path.join(tmp_dir, "outbox.sqlite3")) as test_outbox:
+            for i in range(5):
+                test_outbox.enqueue(f"{base_url}/batch", {"voicy_episode_url": f"https://voicy.jp/e/{i}"},
+                                    ref=f"batch-{i}", batch=True)
+            assert not test_outbox.enqueue(f"{base_url}/batch", {"duplicate": True}, ref="batch-0", batch=True)
+            test_outbox.enqueue(f"{base_url}/rate-limited", {"voicy_episode_url": "https://voicy.jp/e/rl"}, ref="rl")
+            test_outbox.enqueue(f"{base_url}/gone", {"voicy_episode_url": "https://voicy.jp/e/gone"}, ref="gone")
+
+            deliverer = WebhookDeliverer(test_outbox)
+            started = time.perf_counter()
+            final = {result["ref"]: result["status"] for result in deliverer.drain(budget_seconds=5)}
+            deliverer.close()
+            print(f"Drained in {time.perf_counter() - started:.2f}s: {deliverer.stats}")
+
+            assert final["rl"] == STATUS_SENT            # Retried after Retry-After
+            assert final["gone"] == STATUS_DEAD          # 410 is not retried
+            assert all(final[f"batch-{i}"] == STATUS_SENT for i in range(5))
+            batches = [body for path, body in StandInWebhookHandler.received if path == "/batch"]
+            assert batches == [[{"voicy_episode_url": f"https://voicy.jp/e/{i}"} for i in range(5)]]
+            assert test_outbox.pending_count() == 0
+
+            # A failing receiver gets one POST per pass; its whole queue (and events queued later) waits for the retry.
+            for i in range(5):
+                test_outbox.enqueue(f"{base_url}/down", {"n": i}, ref=f"down-{i}")
+            deliverer = WebhookDeliverer(test_outbox)
+            deliverer.drain(0)
+            assert StandInWebhookHandler.down_calls == 1 and deliverer.stats["retried"] == 1, deliverer.stats
+            assert test_outbox.next_attempt_at() >= time.time() + 0.5 and not test_outbox.due()
+            test_outbox.enqueue(f"{base_url}/down", {"n": 5}, ref="down-5")
+            assert not test_outbox.due()
+            deliverer.drain(0)
+            assert StandInWebhookHandler.down_calls == 1
+            StandInWebhookHandler.down = False
+            final = {result["ref"]: result["status"] for result in deliverer.drain(budget_seconds=5)}
+            deliverer.close()
+            assert all(final[f"down-{i}"] == STATUS_SENT for i in range(6)), final
+            assert [body["n"] for path, body in StandInWebhookHandler.received if path == "/down"] == list(range(6))
+            attempts = test_outbox._conn.execute("SELECT ref, attempts FROM outbox WHERE ref LIKE 'down-%'").fetchall()
+            assert {row["ref"]: row["attempts"] for row in attempts} == {"down-0": 2, **{f"down-{i}": 1 for i in range(1, 6)}}
+
+    server.shutdown()
+    print("--- webhook_outbox.py self-check passed ---")
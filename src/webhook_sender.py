@@ -3,24 +3,37 @@ import json
 import logging
 import os
 import time
+from metrics import span
 
-# Determine project root to place log file at the project root
-PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-LOG_FILE_PATH = os.path.join(PROJECT_ROOT, 'webhook_sender_log.txt')
+# Logging is configured by the entry point (see log_setup); importing this module does not touch the root logger.
+logger = logging.getLogger(__name__)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE_PATH, encoding='utf-8'),
-        logging.StreamHandler()  # Also print to console
-    ]
-)
+WEBHOOK_TIMEOUT_SECONDS = 30
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+_session = None # Shared requests.Session (keep-alive), created on first use
+
+def get_session() -> requests.Session:
+    """Returns a module-wide requests.Session so repeated webhook calls reuse connections."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers.update(JSON_HEADERS)
+    return _session
+
+def build_payload(voicy_episode_url: str) -> dict:
+    """Builds the JSON body Make.com expects for one Voicy episode."""
+    return {
+        "voicy_episode_url": voicy_episode_url, # Key changed to match expected format
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime())
+    }
 
 def send_to_make_webhook(webhook_url: str, voicy_episode_url: str) -> bool:
     """
-    Sends the Voicy episode URL to the specified Make.com webhook URL.
+    Sends the Voicy episode URL to the specified Make.com webhook URL (one attempt, no retry).
+
+    rss_monitor goes through webhook_outbox instead, which retries; this is
+    kept for one-off sends and the test mode below.
 
     Args:
         webhook_url: The Webhook URL from Make.com.
@@ -30,53 +43,50 @@ def send_to_make_webhook(webhook_url: str, voicy_episode_url: str) -> bool:
         True if the request was successful (2xx status code), False otherwise.
     """
     if not webhook_url:
-        logging.error("Webhook URL is not provided. Cannot send data.")
+        logger.error("Webhook URL is not provided. Cannot send data.")
         return False
     if not voicy_episode_url:
-        logging.error("Voicy episode URL is not provided. Cannot send data.")
+        logger.error("Voicy episode URL is not provided. Cannot send data.")
         return False
 
-    payload = {
-        "voicy_episode_url": voicy_episode_url, # Key changed to match expected format
-        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime())
-    }
-
-    headers = {
-        "Content-Type": "application/json"
-    }
+    payload = build_payload(voicy_episode_url)
 
-    logging.info(f"Sending Voicy URL to Make.com webhook: {webhook_url}")
-    logging.info(f"Payload: {json.dumps(payload)}")
+    logger.info(f"Sending Voicy URL to Make.com webhook: {webhook_url}")
+    logger.info(f"Payload: {json.dumps(payload)}")
 
     try:
-        response = requests.post(webhook_url, data=json.dumps(payload), headers=headers, timeout=30)
-        response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-        logging.info(f"Successfully sent data to webhook. Status code: {response.status_code}")
+        with span("webhook_send"):
+            response = get_session().post(webhook_url, data=json.dumps(payload), headers=JSON_HEADERS,
+                                          timeout=WEBHOOK_TIMEOUT_SECONDS)
+            response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
+        logger.info(f"Successfully sent data to webhook. Status code: {response.status_code}")
         # logging.debug(f"Response from webhook: {response.text}") # Uncomment for more details if needed
         return True
     except requests.exceptions.RequestException as e:
-        logging.error(f"Failed to send data to webhook: {e}")
+        logger.error(f"Failed to send data to webhook: {e}")
         return False
 
 if __name__ == '__main__':
+    from log_setup import configure_logging
+    configure_logging()
     # Example usage (for testing purposes)
     # You would typically get these from environment variables or arguments
     test_webhook_url = os.environ.get("TEST_MAKE_WEBHOOK_URL") # Replace with your actual Make.com webhook URL for testing
     test_voicy_url = os.getenv("TEST_VOICY_EPISODE_URL", "https://voicy.jp/channel/000/default_test_episode") # Default test URL if env var not set
 
     if test_webhook_url:
-        logging.info("--- Running webhook_sender.py in test mode ---")
-        logging.info(f"Attempting to use Make.com Webhook URL from TEST_MAKE_WEBHOOK_URL: {test_webhook_url}")
+        logger.info("--- Running webhook_sender.py in test mode ---")
+        logger.info(f"Attempting to use Make.com Webhook URL from TEST_MAKE_WEBHOOK_URL: {test_webhook_url}")
         if os.getenv("TEST_VOICY_EPISODE_URL"):
-            logging.info(f"Using Voicy Episode URL from TEST_VOICY_EPISODE_URL: {test_voicy_url}")
+            logger.info(f"Using Voicy Episode URL from TEST_VOICY_EPISODE_URL: {test_voicy_url}")
         else:
-            logging.info(f"TEST_VOICY_EPISODE_URL not set, using default test Voicy URL: {test_voicy_url}")
+            logger.info(f"TEST_VOICY_EPISODE_URL not set, using default test Voicy URL: {test_voicy_url}")
         
         success = send_to_make_webhook(test_webhook_url, test_voicy_url)
         if success:
-            logging.info("Test data sent successfully.")
+            logger.info("Test data sent successfully.")
         else:
-            logging.error("Failed to send test data.")
-        logging.info("--- Finished webhook_sender.py test mode ---")
+            logger.error("Failed to send test data.")
+        logger.info("--- Finished webhook_sender.py test mode ---")
     else:
-        logging.info("TEST_MAKE_WEBHOOK_URL environment variable is not set. Skipping test run in __main__.")
+        logger.info("TEST_MAKE_WEBHOOK_URL environment variable is not set. Skipping test run in __main__.")
@@ -0,0 +1,412 @@
+import os
+import time
+import socket
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+# Leases that let several monitor / pipeline workers share the feeds and the
+# episodes between them without doing anything twice.
+# A lease is a named, expiring claim ("feed:<rss url>", "episode:<feed>
+# <guid>", "outbox") held by one worker id. Workers heartbeat; a heartbeat
+# also renews every lease the worker holds, so a crashed worker's leases
+# simply expire and another worker takes them over. Each time a lease
+# changes hands its token grows (a fencing token for logs and checks).
+# Feeds are spread over the live workers by rendezvous hashing: every worker
+# computes the same owner for a feed from the list of live workers, so adding
+# a node moves only its share of the feeds.
+# The default store is a SQLite file (workers on one host, or on a shared
+# volume); WORKER_LEASES=redis://host:6379/0 uses Redis for workers on
+# different hosts (needs the redis package).
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LEASE_PATH = os.path.join(PROJECT_ROOT, "data", "worker_leases.sqlite3")
+# Where leases live: a SQLite path or a redis:// URL. Empty: no coordination (a single worker).
+WORKER_LEASES = os.environ.get("WORKER_LEASES", "")
+# Seconds a lease or a worker stays alive without a heartbeat
+LEASE_TTL_SECONDS = float(os.environ.get("WORKER_LEASE_TTL", "90"))
+# Name of this worker in the lease table (default: host name and process id)
+WORKER_ID = os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+# Key prefix of the Redis store, so several deployments can share one Redis
+REDIS_KEY_PREFIX = os.environ.get("WORKER_LEASES_PREFIX", "standfm-voicy:")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name       TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    token      INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id  TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+"""
+
+logger = logging.getLogger(__name__)
+
+class SQLiteLeaseStore:
+    """
+    Lease table in a SQLite file; every change is one IMMEDIATE transaction, so processes sharing the file agree.
+
+    Usage:
+        with SQLiteLeaseStore(path) as store:
+            token = store.acquire("feed:...", "worker-1", ttl_seconds=90)
+    """
+
+    def __init__(self, path: str = DEFAULT_LEASE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def _write(self, statements: list[tuple[str, tuple]]):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def acquire(self, name: str, owner: str, ttl_seconds: float) -> int | None:
+        """Takes (or extends) the lease if it is free, expired or already ours. Returns its token, or None if someone else holds it."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO leases (name, owner, token, expires_at) VALUES (?, ?, 1, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET "
+                    "token = CASE WHEN leases.owner = excluded.owner THEN leases.token ELSE leases.token + 1 END, "
+                    "owner = excluded.owner, expires_at = excluded.expires_at "
+                    "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+                    (name, owner, now + ttl_seconds, now),
+                )
+                row = self._conn.execute("SELECT owner, token FROM leases WHERE name = ?", (name,)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row["token"] if row["owner"] == owner else None
+
+    def renew(self, names: list[str], owner: str, ttl_seconds: float) -> set[str]:
+        """Extends the leases still held by owner. Returns the names renewed (the others were taken over)."""
+        if not names:
+            return set()
+        placeholders = ",".join("?" * len(names))
+        self._write([(f"UPDATE leases SET expires_at = ? WHERE owner = ? AND name IN ({placeholders})",
+                      (time.time() + ttl_seconds, owner, *names))])
+        with self._lock:
+            rows = self._conn.execute(f"SELECT name FROM leases WHERE owner = ? AND name IN ({placeholders})",
+                                      (owner, *names)).fetchall()
+        return {row["name"] for row in rows}
+
+    def release(self, names: list[str], owner: str):
+        """Gives up leases held by owner (leases held by others are left alone); the row stays so the token keeps growing."""
+        if names:
+            self._write([(f"UPDATE leases SET expires_at = 0 WHERE owner = ? AND name IN ({','.join('?' * len(names))})",
+                          (owner, *names))])
+
+    def owner(self, name: str) -> str | None:
+        """Current holder of an unexpired lease, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT owner FROM leases WHERE name = ? AND expires_at > ?",
+                                     (name, time.time())).fetchone()
+        return row["owner"] if row else None
+
+    def heartbeat(self, worker_id: str, ttl_seconds: float):
+        self._write([("INSERT INTO workers (worker_id, expires_at) VALUES (?, ?) "
+                      "ON CONFLICT (worker_id) DO UPDATE SET expires_at = excluded.expires_at",
+                      (worker_id, time.time() + ttl_seconds))])
+
+    def remove_worker(self, worker_id: str):
+        self._write([("DELETE FROM workers WHERE worker_id = ?", (worker_id,))])
+
+    def live_workers(self) -> list[str]:
+        """Worker ids with an unexpired heartbeat, sorted."""
+        with self._lock:
+            rows = self._conn.execute("SELECT worker_id FROM workers WHERE expires_at > ? ORDER BY worker_id",
+                                      (time.time(),)).fetchall()
+        return [row["worker_id"] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# KEYS: lease, token counter. ARGV: owner, ttl in ms. Returns the token, or nil if held by another worker.
+_REDIS_ACQUIRE = """
+local current = redis.call('GET', KEYS[1])
+if current and current ~= ARGV[1] then return nil end
+if not current then redis.call('INCR', KEYS[2]) end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return tonumber(redis.call('GET', KEYS[2]))
+"""
+# KEYS: lease. ARGV: owner, ttl in ms (renew) or nothing (release).
+_REDIS_RENEW = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+_REDIS_RELEASE = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+return redis.call('DEL', KEYS[1])
+"""
+
+class RedisLeaseStore:
+    """
+    The same lease operations on Redis (SET PX plus compare-and-set scripts), for workers on several hosts.
+
+    Needs the redis package; the lease's own expiry is kept by Redis, worker
+    heartbeats in a sorted set scored by expiry time.
+    """
+
+    def __init__(self, url: str, prefix: str = REDIS_KEY_PREFIX):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("A redis:// WORKER_LEASES needs the redis package (pip install redis).") from e
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._acquire = self._redis.register_script(_REDIS_ACQUIRE)
+        self._renew = self._redis.register_script(_REDIS_RENEW)
+        self._release = self._redis.register_script(_REDIS_RELEASE)
+
+    def _key(self, kind: str, name: str = "") -> str:
+        return f"{self._prefix}{kind}:{name}"
+
+    def acquire(self, name: str, owner: str, ttl_seconds: float) -> int | None:
+        token = self._acquire(keys=[self._key("lease", name), self._key("token", name)], args=[owner, int(ttl_seconds * 1000)])
+        return int(token) if token is not None else None
+
+    def renew(self, names: list[str], owner: str, ttl_seconds: float) -> set[str]:
+        return {name for name in names if self._renew(keys=[self._key("lease", name)], args=[owner, int(ttl_seconds * 1000)])}
+
+    def release(self, names: list[str], owner: str):
+        for name in names:
+            self._release(keys=[self._key("lease", name)], args=[owner])
+
+    def owner(self, name: str) -> str | None:
+        return self._redis.get(self._key("lease", name))
+
+    def heartbeat(self, worker_id: str, ttl_seconds: float):
+        self._redis.zadd(self._key("workers"), {worker_id: time.time() + ttl_seconds})
+
+    def remove_worker(self, worker_id: str):
+        self._redis.zrem(self._key("workers"), worker_id)
+
+    def live_workers(self) -> list[str]:
+        self._redis.zremrangebyscore(self._key("workers"), "-inf", time.time())
+        return sorted(self._redis.zrange(self._key("workers"), 0, -1))
+
+    def close(self):
+        self._redis.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_lease_store(spec: str = WORKER_LEASES):
+    """Opens the store named by spec: a redis:// (or rediss://) URL, otherwise a SQLite path ('1' = DEFAULT_LEASE_PATH)."""
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisLeaseStore(spec)
+    return SQLiteLeaseStore(DEFAULT_LEASE_PATH if spec in ("", "1") else spec)
+
+def rendezvous_owner(key: str, workers: list[str]) -> str | None:
+    """The worker a key belongs to (highest random weight hashing): stable, and only 1/N of the keys move when a worker joins or leaves."""
+    if not workers:
+        return None
+    return max(workers, key=lambda worker: hashlib.sha1(f"{worker}\0{key}".encode("utf-8")).digest())
+
+class WorkerCoordinator:
+    """
+    One worker's view of the leases: heartbeats in the background, its share of the feeds, and one-off job claims.
+
+    Usage:
+        with WorkerCoordinator(open_lease_store()) as coordinator:
+            for name in coordinator.claim_share(feed_names):
+                ...                         # only this worker polls these feeds
+            if coordinator.claim("outbox"):
+                ...                         # only one worker drains the outbox
+    """
+
+    def __init__(self, store, worker_id: str = WORKER_ID, ttl_seconds: float = LEASE_TTL_SECONDS):
+        self.store = store
+        self.worker_id = worker_id
+        self.ttl_seconds = ttl_seconds
+        self._held = {}  # lease name -> token
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.store.heartbeat(worker_id, ttl_seconds)
+        self._thread = threading.Thread(target=self._heartbeat_loop, name="worker-heartbeat", daemon=True)
+        self._thread.start()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.ttl_seconds / 3):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.warning(f"Heartbeat of {self.worker_id} failed: {e}")
+
+    def heartbeat(self):
+        """Marks this worker alive and renews its leases; leases taken over meanwhile are dropped (and logged)."""
+        self.store.heartbeat(self.worker_id, self.ttl_seconds)
+        with self._lock:
+            names = list(self._held)
+        kept = self.store.renew(names, self.worker_id, self.ttl_seconds)
+        lost = [name for name in names if name not in kept]
+        if lost:
+            with self._lock:
+                for name in lost:
+                    self._held.pop(name, None)
+            logger.warning(f"{self.worker_id} lost its lease on {', '.join(lost)}.")
+
+    def holds(self, name: str) -> bool:
+        with self._lock:
+            return name in self._held
+
+    def claim(self, name: str) -> bool:
+        """Takes a lease for this worker if nobody else holds it; it is renewed by the heartbeat until released."""
+        token = self.store.acquire(name, self.worker_id, self.ttl_seconds)
+        if token is None:
+            return False
+        with self._lock:
+            if self._held.get(name) != token:
+                logger.debug(f"{self.worker_id} holds {name} (token {token}).")
+            self._held[name] = token
+        return True
+
+    def release(self, *names: str):
+        with self._lock:
+            for name in names:
+                self._held.pop(name, None)
+        self.store.release(list(names), self.worker_id)
+
+    @contextmanager
+    def holding(self, name: str, wait_seconds: float = 30.0, poll_seconds: float = 0.1):
+        """Holds a lease for the duration of a block (a lock across workers). Raises TimeoutError if it stays taken."""
+        deadline = time.monotonic() + wait_seconds
+        while not self.claim(name):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{name} is held by {self.store.owner(name)}")
+            time.sleep(poll_seconds)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    def claim_share(self, names: list[str], prefix: str = "") -> list[str]:
+        """
+        Returns the names (e.g. feed URLs) this worker should handle now and holds the lease of.
+
+        Each name belongs to one live worker (rendezvous_owner()); its lease is
+        taken here, and released when the name has moved to another worker
+        (one joined). A name whose owner is not running is picked up once its
+        lease expires and the owner drops out of the live workers.
+        """
+        self.store.heartbeat(self.worker_id, self.ttl_seconds)
+        workers = self.store.live_workers()
+        if self.worker_id not in workers:
+            workers.append(self.worker_id)
+        mine, handed_over = [], []
+        for name in names:
+            lease = prefix + name
+            if rendezvous_owner(name, workers) == self.worker_id:
+                if self.claim(lease):
+                    mine.append(name)
+            elif self.holds(lease):
+                handed_over.append(lease)
+        if handed_over:
+            self.release(*handed_over)
+            logger.info(f"{self.worker_id} handed over {len(handed_over)} lease(s) to other workers.")
+        return mine
+
+    def close(self):
+        """Stops heartbeating and releases every lease, so other workers take over right away."""
+        self._stop.set()
+        self._thread.join()
+        with self._lock:
+            names = list(self._held)
+            self._held.clear()
+        try:
+            self.store.release(names, self.worker_id)
+            self.store.remove_worker(self.worker_id)
+        except Exception as e:
+            logger.warning(f"Could not release the leases of {self.worker_id}: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+if __name__ == "__main__":
+    # Self-check with three workers sharing one SQLite file: python src/worker_leases.py
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "leases.sqlite3")
+        feeds = [f"https://example.com/rss/{i}" for i in range(30)]
+        stores = [SQLiteLeaseStore(path) for _ in range(3)]
+        a, b = WorkerCoordinator(stores[0], "a", ttl_seconds=0.6), WorkerCoordinator(stores[1], "b", ttl_seconds=0.6)
+        share_a, share_b = a.claim_share(feeds, "feed:"), b.claim_share(feeds, "feed:")
+        assert not set(share_a) & set(share_b) and sorted(share_a + share_b) == sorted(feeds), (share_a, share_b)
+        assert 5 <= len(share_a) <= 25, len(share_a)
+
+        # A third worker joins: it takes only its own share, and the others hand exactly that over.
+        c = WorkerCoordinator(stores[2], "c", ttl_seconds=0.6)
+        share_c = c.claim_share(feeds, "feed:")
+        assert not share_c, "the old owners still hold the leases"
+        share_a2, share_b2 = a.claim_share(feeds, "feed:"), b.claim_share(feeds, "feed:")
+        share_c = c.claim_share(feeds, "feed:")
+        assert sorted(share_a2 + share_b2 + share_c) == sorted(feeds) and share_c
+        assert set(share_a2) <= set(share_a) and set(share_b2) <= set(share_b)
+
+        # One-off jobs: only one worker gets a lease; the token grows when it changes hands.
+        assert a.claim("outbox") and not b.claim("outbox")
+        first_token = stores[0].acquire("outbox", "a", 0.6)
+        a.release("outbox")
+        assert b.claim("outbox") and stores[1].acquire("outbox", "b", 0.6) == first_token + 1
+        with a.holding("state-file", wait_seconds=1):
+            try:
+                with b.holding("state-file", wait_seconds=0.2):
+                    raise AssertionError("two workers held the same lease")
+            except TimeoutError:
+                pass
+
+        # Heartbeats keep leases alive past their TTL...
+        time.sleep(1.0)
+        assert stores[2].owner("feed:" + share_a2[0]) == "a"
+        # ... and a worker that dies without releasing loses them after the TTL.
+        a._stop.set()
+        a._thread.join()
+        time.sleep(1.0)
+        assert "a" not in stores[1].live_workers()
+        share_b3, share_c3 = b.claim_share(feeds, "feed:"), c.claim_share(feeds, "feed:")
+        assert sorted(share_b3 + share_c3) == sorted(feeds), (share_b3, share_c3)
+        b.close()
+        c.close()
+        assert stores[2].live_workers() == [] and stores[2].owner("outbox") is None
+        for store in stores:
+            store.close()
+    assert rendezvous_owner("x", []) is None
+    print("--- worker_leases.py self-check passed ---")